@@ -1,8 +1,83 @@
 # -*- coding: utf-8 -*-
 # Author: Umesh Mohan (moh@nume.sh)
+# Everything is imported when first used (PEP 562), to keep importing this
+# package fast: the pdfrw names exported here (as with "from pdfrw import *")
+# and the names below.
 
-from pdfrw import *
+import importlib
 
-from .pdfstream import PdfStream
-from .pdf_special_dicts import PdfXObjectForm
-from ._misc import PdfTM, mm2pt, pt2mm, newPdfPage
+_lazy_names = {
+    'PdfStream': 'pdfstream',
+    'PdfNumberFormat': 'pdfnumber',
+    'compressStream': 'pdfcompress',
+    'compressDocumentStreams': 'pdfcompress',
+    'optimizeStream': 'pdfoptimize',
+    'PdfXObjectForm': 'pdf_special_dicts',
+    'PdfXObjectImage': 'pdf_special_dicts',
+    'PdfFormRegistry': 'pdfregistry',
+    'PdfResourcePool': 'pdfresources',
+    'extGState': 'pdfresources',
+    'formFingerprint': 'pdfregistry',
+    'buildPages': 'pdfparallel',
+    'pageFromContent': 'pdfparallel',
+    'PdfStreamingWriter': 'pdfwriter',
+    'PdfContentCache': 'pdfcache',
+    'parseContentStream': 'pdfparse',
+    'iterContentStream': 'pdfparse',
+    'pdfStreamFromContent': 'pdfparse',
+    'contentStreamBytes': 'pdfparse',
+    'PdfStreamObserver': 'pdfinstrument',
+    'InstrumentationReport': 'pdfinstrument',
+    'instrument': 'pdfinstrument',
+    'uninstrument': 'pdfinstrument',
+    'BoundingBoxTracker': 'pdfbbox',
+    'cubicBounds': 'pdfbbox',
+    'reducePolyline': 'pdfdecimate',
+    'decimateRDP': 'pdfdecimate',
+    'decimateMinMax': 'pdfdecimate',
+    'cullPolyline': 'pdfdecimate',
+    'FontMetrics': 'pdftext',
+    'FontMetricsCache': 'pdftext',
+    'fontMetrics': 'pdftext',
+    'standardFont': 'pdftext',
+    'escapeString': 'pdftext',
+    'encodeText': 'pdftext',
+    'pageForm': 'pdfimpose',
+    'placementTM': 'pdfimpose',
+    'gridCells': 'pdfimpose',
+    'bookletOrder': 'pdfimpose',
+    'imposePages': 'pdfimpose',
+    'stampPage': 'pdfimpose',
+    'stampPages': 'pdfimpose',
+    'PdfTM': '_misc',
+    'mm2pt': '_misc',
+    'pt2mm': '_misc',
+    'newPdfPage': '_misc',
+    'transformPoints': '_misc',
+}
+
+_pdfrw_names = ['PdfWriter', 'PdfReader', 'PdfObject', 'PdfName', 'PdfArray',
+                'PdfTokens', 'PdfParseError', 'PdfDict', 'IndirectPdfDict',
+                'PdfString', 'PageMerge']
+
+_submodules = set(_lazy_names.values()) | {'arc2cubic', 'benchmarks'}
+
+__all__ = _pdfrw_names + list(_lazy_names.keys())
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(importlib.import_module('.' + _lazy_names[name], \
+                                                __name__), name)
+    elif name in _pdfrw_names:
+        value = getattr(importlib.import_module('pdfrw'), name)
+    elif name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError('module ' + repr(__name__) + \
+                             ' has no attribute ' + repr(name))
+    # Found directly from now on
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Modules imported when first used, to keep importing this package fast
+
+import importlib
+import sys
+
+
+class LazyModule:
+    '''Stands for the module name, imported when one of its attributes is
+first used'''
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(importlib.import_module(self._name), attribute)
+        # Found directly from now on
+        setattr(self, attribute, value)
+        return value
+
+    def __repr__(self):
+        return '<lazily imported module ' + repr(self._name) + '>'
+
+def isNumpyArray(value):
+    '''isinstance(value, numpy.ndarray), without importing numpy (if it is not
+imported yet, value is not an array)'''
+    return 'numpy' in sys.modules and \
+           isinstance(value, sys.modules['numpy'].ndarray)
+
+numpy = LazyModule('numpy')
+pdfrw = LazyModule('pdfrw')
@@ -2,10 +2,9 @@
 # Author: Umesh Mohan (moh@nume.sh)
 
 from collections import namedtuple
-from numpy import matmul
 from math import sin, cos, tan
 
-import pdfrw
+from ._lazy import numpy, pdfrw
 
 def mm2pt(mm):
     return (mm / 25.4) * 72
@@ -46,6 +45,8 @@ def newTM(a=1, b=0, c=0, d=1, e=0, f=0):
 class PdfTM:
     '''PDF transformation matrix
 From PDF 1.7 file format specification section 4.2.2 and 4.2.3'''
+    __slots__ = ('tm',)
+
     def __init__(self, *tm):
         '''pdf_tm = PdfTM()
 pdf_tm = PdfTM(a,b,c,d,e,f)'''
@@ -55,45 +56,88 @@ pdf_tm = PdfTM(a,b,c,d,e,f)'''
             assert len(tm) == 6, \
                 'Transformation Matrix needs six parameters. Got '+ str(len(tm))
             self.tm = PDFTransformationMatrix(*tm)
+    def compose(self, a, b, c, d, e, f):
+        '''In place self = self * PdfTM(a,b,c,d,e,f)'''
+        aL, bL, cL, dL, eL, fL = self.tm
+        self.tm = PDFTransformationMatrix(aL * a + bL * c, aL * b + bL * d,
+                                          cL * a + dL * c, cL * b + dL * d,
+                                          eL * a + fL * c + e,
+                                          eL * b + fL * d + f)
+        return self
     def translate(self, tx, ty):
-        translate_matrix = PdfTM(*newTM(e=tx, f=ty))
-        self.tm = (self * translate_matrix).tm
+        a, b, c, d, e, f = self.tm
+        self.tm = PDFTransformationMatrix(a, b, c, d, e + tx, f + ty)
         return self
     def scale(self, sx, sy):
-        scale_matrix = PdfTM(*newTM(a=sx, d=sy))
-        self.tm = (self * scale_matrix).tm
+        a, b, c, d, e, f = self.tm
+        self.tm = PDFTransformationMatrix(a * sx, b * sy, c * sx, d * sy,
+                                          e * sx, f * sy)
         return self
     def rotate(self, theta, x0=0, y0=0):
+        cos_theta, sin_theta = cos(theta), sin(theta)
         self.translate(x0, y0)
-        rotate_matrix = PdfTM(*newTM(a=cos(theta), b=sin(theta), \
-                                   c=-sin(theta), d=cos(theta)))
-        self.tm = (self * rotate_matrix).tm
+        self.compose(cos_theta, sin_theta, -sin_theta, cos_theta, 0, 0)
         self.translate(-x0, -y0)
         return self
     def skew(self, alpha, beta):
         '''Skew x axis by alpha and y axis by beta'''
-        skew_matrix - PdfTM(*newTM(b=tan(alpha), c=tan(beta)))
-        self.tm = (self * skew_matrix).tm
-        return self
+        return self.compose(1, tan(alpha), tan(beta), 1, 0, 0)
+    def transformPoints(self, points):
+        '''points transformed by this matrix; points is an array of shape
+(..., 2)'''
+        return transformPoints(points, self)
     def __repr__(self):
         return self.__str__()
     def __str__(self):
         return ' '.join(['{:.4f}'.format(i) for i in self.tm])
     def __mul__(mL, mR):
-        mR_array = [[mR.tm.a, mR.tm.b, 0],\
-                    [mR.tm.c, mR.tm.d, 0],\
-                    [mR.tm.e, mR.tm.f, 1]]
-        mL_array = [[mL.tm.a, mL.tm.b, 0],\
-                    [mL.tm.c, mL.tm.d, 0],\
-                    [mL.tm.e, mL.tm.f, 1]]
-        [[a,b,g],[c,d,h],[e,f,i]] = matmul(mL_array, mR_array)
-        assert g==0 and h==0 and i==1, 'mL: ' + str(mL) + '\nm0: ' + str(mR) + \
-                                       '\ng=' + str(g) + ', h=' + str(g) + \
-                                       ', i=' + str(g)
-        return PdfTM(a,b,c,d,e,f)
+        return PdfTM(*mL.tm).compose(*mR.tm)
+    def __imul__(mL, mR):
+        return mL.compose(*mR.tm)
+
+def transformPoints(points, tm):
+    '''points, an array of shape (..., 2), transformed by tm: a PdfTM, six
+numbers or an array of shape (..., 6) of matrices broadcast against the points
+(e.g. shape (n, 6) for a matrix for each of n points, or (n, 1, 6) to
+transform m points of shape (m, 2) by each of n matrices).'''
+    points = numpy.asarray(points, dtype=float)
+    if isinstance(tm, PdfTM):
+        tm = tm.tm
+    elif len(tm) > 0 and isinstance(tm[0], PdfTM):
+        tm = [tm_.tm for tm_ in tm]
+    tm = numpy.asarray(tm, dtype=float)
+    a, b, c, d, e, f = [tm[..., i, None] for i in range(6)]
+    x, y = points[..., 0, None], points[..., 1, None]
+    return numpy.concatenate([a * x + c * y + e, b * x + d * y + f], axis=-1)
 
 def newPdfPage(size=[0, 0,  mm2pt(210), mm2pt(297)]):
     page = pdfrw.PdfDict()
-    page.Type = '/Page'
+    page.Type = pdfrw.PdfName('Page')
     page.MediaBox = size
     return page
+
+# Prefix of automatic resource names, by resource type
+resource_name_prefix = {'XObject': 'X', 'Font': 'F', 'ExtGState': 'GS',
+                        'ColorSpace': 'CS', 'Pattern': 'P', 'Shading': 'Sh',
+                        'Properties': 'MC'}
+
+def addResources(pdf_dict, resources):
+    '''Add resources ({resource type: {name: object}}, e.g. from
+PdfStream.resources) to the Resources of pdf_dict (a page or form XObject)'''
+    for resource_type, named_resources in resources.items():
+        if len(named_resources) == 0:
+            continue
+        if pdf_dict.Resources is None:
+            pdf_dict.Resources = pdfrw.PdfDict()
+        resource_type = pdfrw.PdfName(resource_type.lstrip('/'))
+        if pdf_dict.Resources[resource_type] is None:
+            pdf_dict.Resources[resource_type] = pdfrw.PdfDict()
+        type_resources = pdf_dict.Resources[resource_type]
+        for name, resource in named_resources.items():
+            name = pdfrw.PdfName(name.lstrip('/'))
+            if type_resources[name] is not None and \
+               type_resources[name] is not resource:
+                raise ValueError('Another resource is already named ' + \
+                                 name + ' in ' + resource_type)
+            type_resources[name] = resource
+    return pdf_dict
@@ -6,9 +6,11 @@
 # circular arcs and vice versa", Aleksas Riškus, 2006: used with correction 
 # in function smallArc
 
-from math import sin, cos, acos, pi, sqrt, fabs
-from numpy import dot, array
-from numpy.linalg import norm
+# The scalar functions use math only; numpy is imported when an array
+# version is first used
+
+from math import sin, cos, acos, pi, sqrt, fabs, ceil
+from ._lazy import numpy
 
 def angleBetween(u, v):
     # F.6.5 - Step 4
@@ -16,19 +18,17 @@ def angleBetween(u, v):
         sign = -1
     else:
         sign = 1
-    return sign * acos(dot(u, v) / (norm(u) * norm(v)))
+    cos_angle = (u[0]*v[0] + u[1]*v[1]) / \
+                (sqrt(u[0]*u[0] + u[1]*u[1]) * sqrt(v[0]*v[0] + v[1]*v[1]))
+    return sign * acos(max(-1, min(1, cos_angle)))
 
 def arcCenterToEndpoint(cx, cy, rx, ry, phi, theta_1, delta_theta):
     # F.6.4
-    cos_phi = cos(phi)
-    sin_phi = sin(phi)
-    rotation_matrix = [[cos_phi, -sin_phi], [sin_phi, cos_phi]]
-
-    x1, y1 = dot(rotation_matrix, [rx * cos(theta_1), ry * sin(theta_1)]) + \
-             [cx, cy]
-    x2, y2 = dot(rotation_matrix, \
-                 [rx * cos(theta_1 + delta_theta), \
-                  ry * sin(theta_1 + delta_theta)]) + [cx, cy]
+    x1, y1 = translate(*rotate(rx * cos(theta_1), ry * sin(theta_1), phi), \
+                       cx, cy)
+    x2, y2 = translate(*rotate(rx * cos(theta_1 + delta_theta), \
+                               ry * sin(theta_1 + delta_theta), phi), \
+                       cx, cy)
 
     large_arc = fabs(delta_theta) > pi
     sweep = delta_theta > 0
@@ -37,10 +37,7 @@ def arcCenterToEndpoint(cx, cy, rx, ry, phi, theta_1, delta_theta):
 
 def arcEndpointToCenter(x1, y1, x2, y2, rx, ry, phi, large_arc, sweep):
     # F.6.5 - Step 1
-    cos_phi, sin_phi = cos(phi), sin(phi)
-    rotation_matrix     = [[cos_phi,  sin_phi], [-sin_phi, cos_phi]]
-    rotation_matrix_neg = [[cos_phi, -sin_phi], [ sin_phi, cos_phi]]
-    x1p, y1p = dot(rotation_matrix, [(x1-x2)/2, (y1-y2)/2])
+    x1p, y1p = rotate((x1-x2)/2, (y1-y2)/2, -phi)
 
     # F.6.6 Correction of out-of-range radii
     assert (rx != 0 and ry != 0), \
@@ -48,22 +45,25 @@ def arcEndpointToCenter(x1, y1, x2, y2, rx, ry, phi, large_arc, sweep):
     rx, ry = fabs(rx), fabs(ry)
     lambda_ = ((x1p ** 2) / (rx ** 2)) + ((y1p ** 2) / (ry ** 2))
     if lambda_ > 1:
-        rx, ry = sqrt(lambda_) * array([rx, ry])
+        rx, ry = sqrt(lambda_) * rx, sqrt(lambda_) * ry
 
     # F.6.5 - Step 2
-    radicand = (((rx * ry) ** 2) - ((rx * y1p) ** 2) - ((ry * x1p) ** 2)) / \
-               (((rx * y1p) ** 2) + ((ry * x1p) ** 2))
+    # With scaled up radii (F.6.6.3) the center is exactly the midpoint
+    radicand = 0
+    if lambda_ <= 1:
+        radicand = (((rx*ry) ** 2) - ((rx*y1p) ** 2) - ((ry*x1p) ** 2)) / \
+                   (((rx * y1p) ** 2) + ((ry * x1p) ** 2))
     if radicand < 0:
         radicand = 0
     if large_arc == sweep:
         sign = -1
     else:
         sign = 1
-    cxp, cyp = sign * sqrt(radicand) * array([rx * y1p / ry, -ry * x1p / rx])
+    coefficient = sign * sqrt(radicand)
+    cxp, cyp = coefficient * (rx * y1p / ry), coefficient * (-ry * x1p / rx)
 
     # F.6.5 - Step 3
-    cx, cy = dot(rotation_matrix_neg, [cxp, cyp]) + \
-             [(x1 + x2) / 2, (y1 + y2) / 2]
+    cx, cy = translate(*rotate(cxp, cyp, phi), (x1 + x2) / 2, (y1 + y2) / 2)
 
     # F.6.5 - Step 4
     theta_1 = angleBetween([1,0], [(x1p - cxp) / rx, (y1p - cyp) / ry])
@@ -90,27 +90,78 @@ def smallArc(theta, delta_theta):
     y3 = y4 - k2 * x4
     return x1, y1, x2, y2, x3, y3, x4, y4
 
+def smallArcError(delta_theta):
+    # Largest distance from the unit circle of the cubic from smallArc, which
+    # for a circular arc is the usual k = 4/3 tan(delta_theta / 4) cubic
+    # (Riškus 2006 - Section 3)
+    quarter_angle = fabs(delta_theta) / 4
+    return 2 * (sin(quarter_angle) ** 6) / (27 * (cos(quarter_angle) ** 2))
+
+# Largest angle of a segment when the number of segments is chosen from a
+# tolerance, to stay well clear of smallArc's singularity at pi
+max_adaptive_segment_angle = 2 * pi / 3
+
+def toleranceInPoints(tolerance, dpi=None):
+    '''tolerance in points (user space units), or in device pixels if dpi is
+given'''
+    if dpi is None:
+        return tolerance
+    return tolerance * 72 / dpi
+
+def adaptiveSegmentCount(delta_theta, radius, tolerance):
+    '''(n_segments, as_lines) for an arc of delta_theta and the given radius
+to be within tolerance: as few cubic segments as possible, or straight line
+segments (chords) if that takes no more segments'''
+    assert tolerance > 0, 'tolerance should be positive. Got ' + str(tolerance)
+    abs_delta_theta = fabs(delta_theta)
+    n_min = max(1, ceil(abs_delta_theta / max_adaptive_segment_angle))
+    n_cubic = n_min
+    while radius * smallArcError(abs_delta_theta / n_cubic) > tolerance:
+        n_cubic += 1
+    n_lines = n_min
+    if tolerance < radius:
+        # Sagitta of a chord over angle alpha: radius * (1 - cos(alpha / 2))
+        n_lines = max(n_min, ceil(abs_delta_theta / \
+                                  (2 * acos(1 - tolerance / radius))))
+    if n_lines <= n_cubic:
+        return n_lines, True
+    return n_cubic, False
+
 def scale(x, y, sx, sy):
     return x * sx, y * sy
 
 def rotate(x, y, theta):
     cos_theta, sin_theta = cos(theta), sin(theta)
-    rotation_matrix = [[cos_theta,  -sin_theta], [sin_theta, cos_theta]]
-    xp, yp = dot(rotation_matrix, [x, y])
-    return xp, yp
+    return cos_theta * x - sin_theta * y, sin_theta * x + cos_theta * y
 
 def translate(x, y, dx, dy):
     return x + dx, y + dy
 
-def arcCenterToCubic(cx, cy, rx, ry, theta_1, delta_theta, x_axis_rotation=0):
-    n_segments = 1
-    while n_segments * pi / 2 < fabs(delta_theta):
-        n_segments += 1
+def arcCenterToCubic(cx, cy, rx, ry, theta_1, delta_theta, x_axis_rotation=0, \
+                     tolerance=None, dpi=None):
+    '''Cubic segments [p0, p1, p2, p3] of the arc. Without tolerance the arc
+is split in pieces of at most pi / 2. With tolerance (in points, or in device
+pixels at dpi) the number of segments is the least that keeps within it, and
+segments may be straight lines [p0, p3].'''
+    as_lines = False
+    if tolerance is None:
+        n_segments = 1
+        while n_segments * pi / 2 < fabs(delta_theta):
+            n_segments += 1
+    else:
+        n_segments, as_lines = adaptiveSegmentCount(\
+            delta_theta, max(fabs(rx), fabs(ry)), \
+            toleranceInPoints(tolerance, dpi))
     small_arc_delta_theta = delta_theta / n_segments
     cubic = []
     theta = theta_1
     for _ in range(n_segments):
-        small_arc = iter(smallArc(theta, small_arc_delta_theta))
+        if as_lines:
+            small_arc = iter([cos(theta), sin(theta), \
+                              cos(theta + small_arc_delta_theta), \
+                              sin(theta + small_arc_delta_theta)])
+        else:
+            small_arc = iter(smallArc(theta, small_arc_delta_theta))
         cubic.append([translate(*rotate(*scale(*xy, rx, ry), \
                                         x_axis_rotation), cx, cy) \
                       for xy in zip(small_arc, small_arc)])
@@ -118,38 +169,218 @@ def arcCenterToCubic(cx, cy, rx, ry, theta_1, delta_theta, x_axis_rotation=0):
     return cubic
 
 def arcEndpointToCubic(x0, y0, x3, y3, rx, ry, \
-                       x_axis_rotation=0, large_arc=True, sweep=True):
+                       x_axis_rotation=0, large_arc=True, sweep=True, \
+                       tolerance=None, dpi=None):
     cx, cy, rx, ry, _, theta_1, delta_theta = \
         arcEndpointToCenter(x0, y0, x3, y3, rx, ry, \
                             x_axis_rotation, large_arc, sweep)
     cubic = arcCenterToCubic(cx, cy, rx, ry, theta_1, delta_theta, \
-                             x_axis_rotation=x_axis_rotation)
+                             x_axis_rotation=x_axis_rotation, \
+                             tolerance=tolerance, dpi=dpi)
     return cubic
 
-def ellipseToCubic(cx, cy, rx, ry, x_axis_rotation=0):
+def ellipseToCubic(cx, cy, rx, ry, x_axis_rotation=0, tolerance=None, dpi=None):
     cubic = arcCenterToCubic(cx, cy, rx, ry, 0, 2 * pi, \
-                             x_axis_rotation=x_axis_rotation)
+                             x_axis_rotation=x_axis_rotation, \
+                             tolerance=tolerance, dpi=dpi)
     cubic[-1][-1] = cubic[0][0]
     return cubic
 
-def circleToCubic(cx, cy, r):
-    return ellipseToCubic(cx, cy, r, r)
+def circleToCubic(cx, cy, r, tolerance=None, dpi=None):
+    return ellipseToCubic(cx, cy, r, r, tolerance=tolerance, dpi=dpi)
+
+# Array versions of the above: every parameter may be a scalar or an array
+# (broadcast against each other), one shape per element. Each returns
+# (cubic, n_segments): cubic has shape (total number of segments, 4, 2) with
+# the segments of all shapes in order, n_segments the segment count per shape.
+# Straight line segments (see arcCenterToCubic) have p1 == p0 and p2 == p3.
+
+def _broadcastToArrays(*values):
+    return [value.ravel() for value in numpy.broadcast_arrays(\
+                *[numpy.asarray(value, dtype=float) for value in values])]
+
+def angleBetweenArray(ux, uy, vx, vy):
+    # F.6.5 - Step 4
+    sign = numpy.where(ux * vy - uy * vx < 0, -1, 1)
+    cos_angle = (ux * vx + uy * vy) / \
+                (numpy.sqrt(ux * ux + uy * uy) * numpy.sqrt(vx * vx + vy * vy))
+    return sign * numpy.arccos(numpy.clip(cos_angle, -1, 1))
+
+def arcEndpointToCenterArray(x1, y1, x2, y2, rx, ry, phi, large_arc, sweep):
+    x1, y1, x2, y2, rx, ry, phi, large_arc, sweep = \
+        _broadcastToArrays(x1, y1, x2, y2, rx, ry, phi, large_arc, sweep)
+    large_arc, sweep = large_arc != 0, sweep != 0
+    # F.6.5 - Step 1
+    cos_phi, sin_phi = numpy.cos(phi), numpy.sin(phi)
+    dx, dy = (x1 - x2) / 2, (y1 - y2) / 2
+    x1p = cos_phi * dx + sin_phi * dy
+    y1p = -sin_phi * dx + cos_phi * dy
+
+    # F.6.6 Correction of out-of-range radii
+    assert numpy.all(rx != 0) and numpy.all(ry != 0), \
+        'Use a "line to" command instead of arc with zero x and y radii.'
+    rx, ry = numpy.fabs(rx), numpy.fabs(ry)
+    lambda_ = ((x1p ** 2) / (rx ** 2)) + ((y1p ** 2) / (ry ** 2))
+    radii_scale = numpy.where(lambda_ > 1, numpy.sqrt(lambda_), 1)
+    rx, ry = rx * radii_scale, ry * radii_scale
+
+    # F.6.5 - Step 2
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        radicand = (((rx * ry) ** 2) - ((rx * y1p) ** 2) - \
+                    ((ry * x1p) ** 2)) / \
+                   (((rx * y1p) ** 2) + ((ry * x1p) ** 2))
+    radicand = numpy.where((radicand < 0) | (lambda_ > 1), 0, radicand)
+    coefficient = numpy.where(large_arc == sweep, -1, 1) * numpy.sqrt(radicand)
+    cxp = coefficient * (rx * y1p / ry)
+    cyp = coefficient * (-ry * x1p / rx)
+
+    # F.6.5 - Step 3
+    cx = cos_phi * cxp - sin_phi * cyp + (x1 + x2) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (y1 + y2) / 2
+
+    # F.6.5 - Step 4
+    ux, uy = (x1p - cxp) / rx, (y1p - cyp) / ry
+    vx, vy = (-x1p - cxp) / rx, (-y1p - cyp) / ry
+    theta_1 = angleBetweenArray(1, 0, ux, uy)
+    delta_theta = angleBetweenArray(ux, uy, vx, vy)
+    delta_theta = numpy.where(~sweep & (delta_theta > 0), \
+                              delta_theta - 2 * pi, delta_theta)
+    delta_theta = numpy.where(sweep & (delta_theta < 0), \
+                              delta_theta + 2 * pi, delta_theta)
+
+    return cx, cy, rx, ry, phi, theta_1, delta_theta
+
+def smallArcArray(theta, delta_theta):
+    # Riškus 2006 - Section 3 (equation sets 8 and 9), see smallArc
+    # Returns an array of shape (..., 4, 2)
+    x1, y1 = numpy.cos(theta), numpy.sin(theta)
+    x4, y4 = numpy.cos(theta + delta_theta), numpy.sin(theta + delta_theta)
+    q1 = (x1 ** 2) + (y1 ** 2)
+    q2 = q1 + (x1 * x4) + (y1 * y4)
+    k2 = (4.0/3.0) * (numpy.sqrt(2 * q1 * q2) - q2) / (x1 * y4 - y1 * x4)
+    x2 = x1 - k2 * y1
+    y2 = y1 + k2 * x1
+    x3 = x4 + k2 * y4
+    y3 = y4 - k2 * x4
+    return numpy.stack([numpy.stack([x1, y1], axis=-1),
+                        numpy.stack([x2, y2], axis=-1),
+                        numpy.stack([x3, y3], axis=-1),
+                        numpy.stack([x4, y4], axis=-1)], axis=-2)
+
+def arcSegmentCount(delta_theta):
+    '''Number of segments used by arcCenterToCubic: smallest n >= 1 with
+n * pi / 2 >= |delta_theta|'''
+    abs_delta_theta = numpy.fabs(delta_theta)
+    n_segments = numpy.maximum(numpy.ceil(abs_delta_theta / (pi / 2)), 1)
+    # Guard against rounding in the division at exact multiples of pi / 2
+    n_segments = numpy.where(n_segments * pi / 2 < abs_delta_theta, \
+                             n_segments + 1, n_segments)
+    n_segments = numpy.where((n_segments > 1) & \
+                             ((n_segments - 1) * pi / 2 >= abs_delta_theta), \
+                             n_segments - 1, n_segments)
+    return n_segments.astype(int)
+
+def adaptiveSegmentCountArray(delta_theta, radius, tolerance):
+    '''Array version of adaptiveSegmentCount'''
+    abs_delta_theta, radius, tolerance = \
+        _broadcastToArrays(numpy.fabs(delta_theta), radius, tolerance)
+    assert numpy.all(tolerance > 0), 'tolerance should be positive'
+    n_min = numpy.maximum(1, numpy.ceil(abs_delta_theta / \
+                                        max_adaptive_segment_angle))
+    n_cubic = n_min.copy()
+    while True:
+        quarter_angle = abs_delta_theta / n_cubic / 4
+        too_coarse = radius * 2 * (numpy.sin(quarter_angle) ** 6) / \
+                     (27 * (numpy.cos(quarter_angle) ** 2)) > tolerance
+        if not numpy.any(too_coarse):
+            break
+        n_cubic += too_coarse
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        n_lines = numpy.ceil(abs_delta_theta / \
+                             (2 * numpy.arccos(1 - tolerance / radius)))
+    n_lines = numpy.where(tolerance < radius, \
+                          numpy.maximum(n_min, n_lines), n_min)
+    as_lines = n_lines <= n_cubic
+    return numpy.where(as_lines, n_lines, n_cubic).astype(int), as_lines
+
+def arcCenterToCubicArray(cx, cy, rx, ry, theta_1, delta_theta, \
+                          x_axis_rotation=0, tolerance=None, dpi=None):
+    cx, cy, rx, ry, theta_1, delta_theta, x_axis_rotation = \
+        _broadcastToArrays(cx, cy, rx, ry, theta_1, delta_theta, \
+                           x_axis_rotation)
+    if tolerance is None:
+        n_segments = arcSegmentCount(delta_theta)
+        as_lines = numpy.zeros(len(n_segments), dtype=bool)
+    else:
+        n_segments, as_lines = adaptiveSegmentCountArray(\
+            delta_theta, numpy.maximum(numpy.fabs(rx), numpy.fabs(ry)), \
+            toleranceInPoints(numpy.asarray(tolerance, dtype=float), \
+                              None if dpi is None else \
+                              numpy.asarray(dpi, dtype=float)))
+    shape_index = numpy.repeat(numpy.arange(len(n_segments)), n_segments)
+    first_segment = numpy.cumsum(n_segments) - n_segments
+    segment_number = numpy.arange(len(shape_index)) - \
+                     first_segment[shape_index]
+    small_arc_delta_theta = (delta_theta / n_segments)[shape_index]
+    cubic = smallArcArray(theta_1[shape_index] + \
+                          segment_number * small_arc_delta_theta, \
+                          small_arc_delta_theta)
+    is_line = as_lines[shape_index]
+    cubic[is_line, 1] = cubic[is_line, 0]
+    cubic[is_line, 2] = cubic[is_line, 3]
+    # scale, rotate and translate all points at once
+    x = cubic[..., 0] * rx[shape_index, None]
+    y = cubic[..., 1] * ry[shape_index, None]
+    cos_theta = numpy.cos(x_axis_rotation)[shape_index, None]
+    sin_theta = numpy.sin(x_axis_rotation)[shape_index, None]
+    cubic[..., 0] = cos_theta * x - sin_theta * y + cx[shape_index, None]
+    cubic[..., 1] = sin_theta * x + cos_theta * y + cy[shape_index, None]
+    return cubic, n_segments
+
+def arcEndpointToCubicArray(x0, y0, x3, y3, rx, ry, \
+                            x_axis_rotation=0, large_arc=True, sweep=True, \
+                            tolerance=None, dpi=None):
+    cx, cy, rx, ry, x_axis_rotation, theta_1, delta_theta = \
+        arcEndpointToCenterArray(x0, y0, x3, y3, rx, ry, \
+                                 x_axis_rotation, large_arc, sweep)
+    return arcCenterToCubicArray(cx, cy, rx, ry, theta_1, delta_theta, \
+                                 x_axis_rotation=x_axis_rotation, \
+                                 tolerance=tolerance, dpi=dpi)
+
+def ellipseToCubicArray(cx, cy, rx, ry, x_axis_rotation=0, \
+                        tolerance=None, dpi=None):
+    cubic, n_segments = arcCenterToCubicArray(cx, cy, rx, ry, 0, 2 * pi, \
+                                              x_axis_rotation=x_axis_rotation, \
+                                              tolerance=tolerance, dpi=dpi)
+    last_segment = numpy.cumsum(n_segments) - 1
+    is_line = numpy.all(cubic[last_segment, 2] == cubic[last_segment, 3], \
+                        axis=-1)
+    cubic[last_segment, -1] = cubic[last_segment - n_segments + 1, 0]
+    cubic[last_segment[is_line], 2] = cubic[last_segment[is_line], 3]
+    return cubic, n_segments
+
+def circleToCubicArray(cx, cy, r, tolerance=None, dpi=None):
+    return ellipseToCubicArray(cx, cy, r, r, tolerance=tolerance, dpi=dpi)
 
 custom_path_operator = {
     'Arc': {'allowed': ['PathObject'],
             'to_cubic_function': arcEndpointToCubic,
+            'to_cubic_array_function': arcEndpointToCubicArray,
             'send_last_point_to_function': True,
             'prepend_move_to': False},
     'ArcCenter': {'allowed': ['PageDescriptionLevel', 'PathObject'],
                   'to_cubic_function': arcCenterToCubic,
+                  'to_cubic_array_function': arcCenterToCubicArray,
                   'send_last_point_to_function': False,
                   'prepend_move_to': True},
     'Ellipse': {'allowed': ['PageDescriptionLevel', 'PathObject'],
                 'to_cubic_function': ellipseToCubic,
+                'to_cubic_array_function': ellipseToCubicArray,
                 'send_last_point_to_function': False,
                 'prepend_move_to': True},
     'Circle': {'allowed': ['PageDescriptionLevel', 'PathObject'],
                'to_cubic_function': circleToCubic,
+               'to_cubic_array_function': circleToCubicArray,
                'send_last_point_to_function': False,
                'prepend_move_to': True},
 }
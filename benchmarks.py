@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Benchmarks of the hot paths, on synthetic workloads (no network, no files
+# other than the ones asked for)
+#
+# python -m <package>.benchmarks                      run all, print results
+# python -m <package>.benchmarks --save base.json     also save them
+# python -m <package>.benchmarks --compare base.json  report regressions
+#                                                     (exit status 1 if any)
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from math import pi
+
+import numpy
+import pdfrw
+
+from .pdfstream import PdfStream
+from .pdf_special_dicts import PdfXObjectForm
+from ._misc import PdfTM, newPdfPage
+
+
+def _randomState():
+    # Same workloads on every run
+    return numpy.random.RandomState(0)
+
+def _pathOperators(n):
+    xy = (_randomState().rand(n, 2) * 500).tolist()
+    def run():
+        stream = PdfStream()
+        stream.append('m', *xy[0])
+        for x, y in xy[1:]:
+            stream.append('l', x, y)
+        stream.append('S')
+    return run
+
+def _curveOperators(n):
+    xy = (_randomState().rand(n, 6) * 500).tolist()
+    def run():
+        stream = PdfStream()
+        stream.append('m', 0, 0)
+        for xy_ in xy:
+            stream.append('c', *xy_)
+        stream.append('S')
+    return run
+
+def _colorOperators(n):
+    rgb = _randomState().rand(n, 3).tolist()
+    def run():
+        stream = PdfStream()
+        for rgb_ in rgb:
+            stream.append('rg', *rgb_)
+            stream.append('RG', *rgb_)
+    return run
+
+def _graphicsStateOperators(n):
+    def run():
+        stream = PdfStream()
+        for i in range(n):
+            stream.append('q')
+            stream.append('w', 0.5)
+            stream.append('cm', 1, 0, 0, 1, i, i)
+            stream.append('Q')
+    return run
+
+def _textOperators(n):
+    def run():
+        stream = PdfStream()
+        for i in range(n):
+            stream.append('BT')
+            stream.append('Tf', '/F1', 10)
+            stream.append('Td', 72, 800 - i % 700)
+            stream.append('Tj', 'The quick brown fox jumps over the lazy dog')
+            stream.append('ET')
+    return run
+
+def _textRuns(n):
+    words = ['word' + str(i) for i in range(n)]
+    paragraphs = [' '.join(words[i:i + 100]) for i in range(0, n, 100)]
+    def run():
+        stream = PdfStream()
+        for i, paragraph in enumerate(paragraphs):
+            stream.appendText(paragraph, 50, 800 - i % 700, 'Helvetica', 9, \
+                              width=500)
+    return run
+
+_custom_path_parameters = {
+    'Arc': lambda xy, r: (xy[0], xy[1], r, r / 2, 0.3, True, True),
+    'ArcCenter': lambda xy, r: (xy[0], xy[1], r, r / 2, 0.5, 4.5, 0.3),
+    'Ellipse': lambda xy, r: (xy[0], xy[1], r, r / 2, 0.3),
+    'Circle': lambda xy, r: (xy[0], xy[1], r),
+}
+
+def _customPath(path_type, n):
+    random_state = _randomState()
+    parameters = [_custom_path_parameters[path_type](xy, r) for xy, r in \
+                  zip((random_state.rand(n, 2) * 500).tolist(), \
+                      (random_state.rand(n) * 50 + 1).tolist())]
+    def run():
+        stream = PdfStream()
+        stream.append('m', 0, 0)
+        for parameters_ in parameters:
+            stream.appendCustomPath(path_type, *parameters_)
+        stream.append('f')
+    return run
+
+def _multipleOperations(n):
+    random_state = _randomState()
+    xy = (random_state.rand(n, 2) * 500).tolist()
+    r = (random_state.rand(n) * 10 + 1).tolist()
+    operations = []
+    for xy_, r_ in zip(xy, r):
+        operations += [('rg', [0.2, 0.4, 0.6]), ('Circle', [*xy_, r_]), 'f']
+    def run():
+        PdfStream().append_multiple_operations(operations)
+    return run
+
+def _decimatedPolyline(n):
+    # A random walk time series, partly off the page
+    random_state = _randomState()
+    xy = numpy.stack([numpy.linspace(0, 700, n), \
+                      400 + numpy.cumsum(random_state.randn(n)) * 0.5], axis=1)
+    def run():
+        stream = PdfStream()
+        if stream.appendPolyline(xy, tolerance=0.5, dpi=300, \
+                                 clip_box=[0, 0, 595, 842]) > 0:
+            stream.append('S')
+    return run
+
+def _tmComposition(n):
+    angles = (_randomState().rand(n) * 2 * pi).tolist()
+    def run():
+        tm = PdfTM()
+        for angle in angles:
+            tm.translate(1, 2).rotate(angle).scale(1.001, 0.999)
+            tm *= PdfTM(1, 0, 0, 1, 3, 4)
+    return run
+
+def _formUpdateStream(n):
+    xy = (_randomState().rand(n, 2) * 100).tolist()
+    def run():
+        form = PdfXObjectForm(b_box=[0, 0, 100, 100])
+        for x, y in xy:
+            form.update_stream([('m', [x, y]), ('l', [y, x]), 'S'])
+        form.stream
+    return run
+
+def _densePlotPage(stream, random_state, n):
+    # Scatter plot markers and a long polyline
+    xy = random_state.rand(n, 2) * 500 + 50
+    stream.append('rg', 0.1, 0.3, 0.8)
+    stream.appendCustomPaths('Circle', xy[:, 0], xy[:, 1], 1.5)
+    stream.append('f')
+    stream.append('w', 0.5)
+    stream.append('m', 50, 50)
+    stream.appendArray('l', numpy.cumsum(random_state.rand(n, 2), axis=0))
+    stream.append('S')
+
+def _textPage(stream, random_state, n):
+    stream.append('BT')
+    stream.append('Tf', '/F1', 9)
+    stream.append('TL', 11)
+    stream.append('Td', 50, 800)
+    for i in range(n):
+        stream.append('Tj', 'Line ' + str(i) + \
+                            ' of a text heavy page, with some numbers: ' + \
+                            str(random_state.rand()))
+        stream.append('T*')
+    stream.append('ET')
+
+def _documentWrite(page_type, n_pages, n):
+    def run():
+        random_state = _randomState()
+        writer = pdfrw.PdfWriter()
+        font = pdfrw.PdfDict(Type=pdfrw.PdfName('Font'), \
+                             Subtype=pdfrw.PdfName('Type1'), \
+                             BaseFont=pdfrw.PdfName('Helvetica'))
+        marker = PdfXObjectForm(b_box=[-5, -5, 5, 5], \
+                                stream_commands=[('Circle', [0, 0, 4]), 'f'])
+        for _ in range(n_pages):
+            page = newPdfPage()
+            stream = PdfStream()
+            page.Resources = pdfrw.PdfDict()
+            if page_type == 'dense plot':
+                _densePlotPage(stream, random_state, n)
+            elif page_type == 'text':
+                _textPage(stream, random_state, n)
+                page.Resources.Font = pdfrw.PdfDict(F1=font)
+            elif page_type == 'many forms':
+                page.Resources.XObject = pdfrw.PdfDict(M=marker)
+                for x, y in (random_state.rand(n, 2) * 500).tolist():
+                    stream.append('q')
+                    stream.append('cm', 1, 0, 0, 1, x, y)
+                    stream.append('Do', '/M')
+                    stream.append('Q')
+            page.Contents = stream.toPdfDict()
+            writer.addpage(page)
+        writer.write(io.BytesIO())
+    return run
+
+def _packageImport():
+    # Import of this package in a new interpreter: includes the startup of
+    # the interpreter, measured alone by 'python startup'
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(\
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] + \
+        os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    def run():
+        subprocess.run([sys.executable, '-c', 'import ' + __package__], \
+                       env=environment, check=True)
+    return run
+
+def _pythonStartup():
+    def run():
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return run
+
+# name: (function making the workload, number of operations in a run)
+benchmarks = dict([
+    ('append path operators', (lambda: _pathOperators(20000), 20000)),
+    ('append curve operators', (lambda: _curveOperators(20000), 20000)),
+    ('append color operators', (lambda: _colorOperators(10000), 20000)),
+    ('append graphics state operators', \
+        (lambda: _graphicsStateOperators(5000), 20000)),
+    ('append text operators', (lambda: _textOperators(4000), 20000)),
+    ('appendText paragraphs', (lambda: _textRuns(20000), 20000))] + \
+    [('appendCustomPath ' + path_type, \
+      ((lambda path_type=path_type: _customPath(path_type, 2000)), 2000)) \
+     for path_type in ['Arc', 'ArcCenter', 'Ellipse', 'Circle']] + [
+    ('append_multiple_operations', (lambda: _multipleOperations(3000), 9000)),
+    ('appendPolyline decimated', \
+        (lambda: _decimatedPolyline(200000), 200000)),
+    ('PdfTM composition', (lambda: _tmComposition(20000), 20000)),
+    ('PdfXObjectForm.update_stream', (lambda: _formUpdateStream(2000), 2000)),
+    ('write dense plot document', \
+        (lambda: _documentWrite('dense plot', 5, 5000), 5)),
+    ('write text document', (lambda: _documentWrite('text', 20, 70), 20)),
+    ('write many forms document', \
+        (lambda: _documentWrite('many forms', 20, 500), 20)),
+    ('python startup', (_pythonStartup, 1)),
+    ('import package', (_packageImport, 1)),
+])
+
+def runBenchmark(name, repeat=5):
+    '''{'ops_per_second': ..., 'peak_memory': ...} for the benchmark name:
+operations per second of the fastest of repeat runs, and peak memory
+allocated (in bytes, from tracemalloc) during one more run'''
+    make_workload, n_operations = benchmarks[name]
+    run = make_workload()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'ops_per_second': n_operations / min(times), \
+            'peak_memory': peak_memory}
+
+def runBenchmarks(names=None, repeat=5, report=None):
+    '''Results of runBenchmark for each of names (all by default), calling
+report(name, result) after each one'''
+    results = {}
+    for name in (benchmarks.keys() if names is None else names):
+        results[name] = runBenchmark(name, repeat)
+        if report is not None:
+            report(name, results[name])
+    return results
+
+def compareResults(results, baseline, threshold=0.1):
+    '''[(name, change in ops/sec, change in peak memory)] of the benchmarks
+that are more than threshold (a fraction) slower, or use more than threshold
+more memory, than in baseline'''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        speed_change = result['ops_per_second'] / \
+                       baseline[name]['ops_per_second'] - 1
+        memory_change = result['peak_memory'] / \
+                        max(baseline[name]['peak_memory'], 1) - 1
+        if speed_change < -threshold or memory_change > threshold:
+            regressions.append((name, speed_change, memory_change))
+    return regressions
+
+def _formatResult(name, result):
+    return '{:40s} {:14,.0f} ops/s {:10,.0f} KiB peak'.format(\
+        name, result['ops_per_second'], result['peak_memory'] / 1024)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of PdfStream, ' + \
+        'arc2cubic, PdfTM and PdfXObjectForm')
+    parser.add_argument('names', nargs='*', help='benchmarks to run ' + \
+                        '(all by default): ' + ', '.join(benchmarks.keys()))
+    parser.add_argument('--repeat', type=int, default=5, \
+                        help='runs of each benchmark, the fastest is kept')
+    parser.add_argument('--save', metavar='FILE', \
+                        help='save the results as JSON, as a baseline')
+    parser.add_argument('--compare', metavar='FILE', \
+                        help='compare with a baseline saved with --save')
+    parser.add_argument('--threshold', type=float, default=0.1, \
+                        help='fraction slower (or more memory) than the ' + \
+                             'baseline counted as a regression')
+    arguments = parser.parse_args(argv)
+    for name in arguments.names:
+        if name not in benchmarks:
+            parser.error('Unknown benchmark: ' + name)
+
+    results = runBenchmarks(arguments.names or None, arguments.repeat, \
+                            lambda name, result: \
+                                print(_formatResult(name, result), flush=True))
+    if arguments.save is not None:
+        with open(arguments.save, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), \
+                       'numpy': numpy.__version__, \
+                       'results': results}, baseline_file, indent=1)
+    if arguments.compare is not None:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compareResults(results, baseline, arguments.threshold)
+        for name, speed_change, memory_change in regressions:
+            print('Regression: {:40s} {:+.1%} ops/s {:+.1%} peak memory'\
+                  .format(name, speed_change, memory_change))
+        if len(regressions) > 0:
+            return 1
+        print('No regressions against ' + arguments.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
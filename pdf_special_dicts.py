@@ -7,8 +7,14 @@ Description:
 @author: Umesh Mohan (moh@nume.sh) 
 '''
 
+import hashlib
+
 import pdfrw
+from ._lazy import numpy
 from .pdfstream import PdfStream
+from .pdfcompress import flateCompress, flateCompressBuffers
+from .pdfoptimize import optimizeStream
+from .pdfbbox import unbounded_operators
 
 
 class PdfXObjectForm(pdfrw.PdfDict):
@@ -18,25 +24,39 @@ class PdfXObjectForm(pdfrw.PdfDict):
                  stream_commands=[],
                  resources={},
                  name=None,
+                 number_format=None,
+                 compress_level=None,
+                 optimize=False,
+                 resource_pool=None,
                  **kwargs):
         super(PdfXObjectForm, self).__init__(*args, **kwargs)
         self.Type = pdfrw.PdfName('XObject')
         self.Subtype = pdfrw.PdfName('Form')
-        self.BBox = b_box
+        self.private.auto_b_box = b_box == 'auto'
+        if not self.auto_b_box:
+            self.BBox = b_box
         if matrix != [1, 0, 0, 1, 0, 0]:
             self.Matrix = matrix
         self.private.stream_commands = []
+        self.private.pdf_stream = PdfStream(number_format=number_format, \
+                                            track_bbox=self.auto_b_box, \
+                                            resource_pool=resource_pool)
+        self.private.stream_is_outdated = False
+        self.private.stream_is_set = False
+        self.private.compress_level = compress_level
+        self.private.optimize = optimize
+        if compress_level is not None:
+            self.Filter = pdfrw.PdfName('FlateDecode')
+        for resource_type, resource_dict in resources.items():
+            for resource_name, resource_ref in resource_dict.items():
+                self.pdf_stream.useResource(resource_type, resource_ref, \
+                                            resource_name)
         self.update_stream(stream_commands)
-        if len(resources.items()) > 0:
-            self.Resources = pdfrw.PdfDict()
-            for resource_type, resource_dict in resources.items():
-                self.Resources[pdfrw.PdfName(resource_type)] = pdfrw.PdfDict()
-                for resource_name, resource_ref in resource_dict.items():
-                    self.Resources[pdfrw.PdfName(resource_type)][pdfrw.PdfName(resource_name)] = resource_ref
         if name is not None:
             self.Name = pdfrw.PdfName(name)
 
     def update_stream(self, stream_commands):
+        normalized_commands = []
         for stream_command in stream_commands:
             if type(stream_command) is str:
                 stream_command = (stream_command, [])
@@ -47,7 +67,223 @@ class PdfXObjectForm(pdfrw.PdfDict):
                     stream_command = (stream_command[0], [*stream_command[1:]])
                 if type(stream_command[1]) is not list:
                     stream_command = (stream_command[0], [stream_command[1]])
+            normalized_commands.append(stream_command)
+        if self.auto_b_box:
+            # Checked before anything is appended
+            for operator, _ in normalized_commands:
+                if operator in unbounded_operators:
+                    raise ValueError('The bounding box of text and ' + \
+                                     'shadings is not tracked: give b_box ' + \
+                                     "instead of 'auto'. Painted with: " + \
+                                     operator)
+        for stream_command in normalized_commands:
+            self.pdf_stream.append_multiple_operations([stream_command])
             self.stream_commands.append(stream_command)
-        stream = PdfStream()
-        stream.append_multiple_operations(self.stream_commands)
-        self.stream = str(stream)
\ No newline at end of file
+        self.pdf_stream.addResourcesTo(self)
+        if self.auto_b_box:
+            # b_box='auto': the bounding box of what is painted so far
+            self.BBox = self.pdf_stream.bbox or [0, 0, 0, 0]
+        if self.stream_is_set:
+            # The stream set (e.g. compressed by compressDocumentStreams) is
+            # replaced by the one from stream_commands, and so is its Filter
+            self.Filter = None if self.compress_level is None else \
+                          pdfrw.PdfName('FlateDecode')
+        self.private.stream_is_outdated = True
+        self.private.stream_is_set = False
+
+    def _serializeStream(self):
+        # Content stream, serialized from pdf_stream (without redundant
+        # operators if optimize, Flate compressed if compress_level is not
+        # None) when it or the entries are read after update_stream
+        if self.stream_is_outdated:
+            self.private.stream_is_outdated = False
+            pdf_stream = self.pdf_stream
+            if self.optimize:
+                pdf_stream, _ = optimizeStream(pdf_stream)
+            stream = str(pdf_stream)
+            if self.compress_level is not None:
+                stream = flateCompress(stream, self.compress_level)
+            # Also sets Length
+            pdfrw.PdfDict.__setattr__(self, 'stream', stream)
+
+    @property
+    def stream(self):
+        '''Content stream, serialized from pdf_stream only when it (or an
+entry, e.g. Length, which pdfrw.PdfWriter reads first) is read after
+update_stream'''
+        self._serializeStream()
+        return vars(self).get('stream')
+
+    def iteritems(self, *args, **kwargs):
+        self._serializeStream()
+        return super(PdfXObjectForm, self).iteritems(*args, **kwargs)
+
+    def get(self, key, *args, **kwargs):
+        if key == '/Length':
+            self._serializeStream()
+        return super(PdfXObjectForm, self).get(key, *args, **kwargs)
+
+    def __setattr__(self, name, value):
+        if name == 'stream':
+            # An explicitly set stream replaces the one from stream_commands
+            self.private.stream_is_outdated = False
+            self.private.stream_is_set = True
+        super(PdfXObjectForm, self).__setattr__(name, value)
+
+_image_color_spaces = {1: 'DeviceGray', 3: 'DeviceRGB', 4: 'DeviceCMYK'}
+# PNG predictors (PDF 1.7 section 3.3.3): filter type byte of each row, and
+# Predictor in DecodeParms
+_image_predictors = {'sub': (1, 11), 'up': (2, 12)}
+# Rows of an image compressed at a time
+image_chunk_size = 1 << 20
+
+
+class PdfXObjectImage(pdfrw.PdfDict):
+    '''Image XObject of pixels, a NumPy array of shape (height, width) or
+(height, width, 1, 3 or 4) for DeviceGray, DeviceRGB or DeviceCMYK (unless
+color_space is given), of uint8 or uint16 (8 or 16 bits per component).
+alpha: array of shape (height, width) of the same dtype, as the SMask
+predictor: PNG predictor ('sub', 'up' or None) applied before compression
+compress_level: Flate compression level (None for none)
+The stream is made from the buffers of the arrays (without copying them
+other than to big-endian for 16 bits) only when it or the entries are read
+(e.g. by pdfrw.PdfWriter), in chunks of about image_chunk_size bytes: pixels and alpha
+should not be changed afterwards. Images with the same pixels and parameters
+have the same content_fingerprint, which PdfFormRegistry uses to register
+them once. Placed with PdfStream.appendImage.'''
+
+    def __init__(self, *args,
+                 pixels=None,
+                 alpha=None,
+                 color_space=None,
+                 predictor='up',
+                 compress_level=6,
+                 interpolate=False,
+                 name=None,
+                 **kwargs):
+        super(PdfXObjectImage, self).__init__(*args, **kwargs)
+        if pixels is None:
+            # A copy of an image (e.g. by pdfrw), with its stream
+            return
+        pixels = numpy.asarray(pixels)
+        if pixels.dtype not in [numpy.uint8, numpy.uint16]:
+            raise ValueError('Image pixels should be uint8 or uint16. Got ' + \
+                             str(pixels.dtype))
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        if pixels.ndim != 3:
+            raise ValueError('Image pixels should be of shape (height, ' + \
+                             'width) or (height, width, channels). Got ' + \
+                             str(pixels.shape))
+        if color_space is None:
+            if pixels.shape[2] not in _image_color_spaces:
+                raise ValueError('No color space for ' + \
+                                 str(pixels.shape[2]) + ' channels')
+            color_space = _image_color_spaces[pixels.shape[2]]
+        if predictor is not None and predictor not in _image_predictors:
+            raise NotImplementedError('PNG predictor: ' + str(predictor) + \
+                                      ' is not implemented')
+        height, width, n_channels = pixels.shape
+        self.Type = pdfrw.PdfName('XObject')
+        self.Subtype = pdfrw.PdfName('Image')
+        self.Width = width
+        self.Height = height
+        self.ColorSpace = pdfrw.PdfName(color_space)
+        self.BitsPerComponent = 8 * pixels.dtype.itemsize
+        if interpolate:
+            self.Interpolate = pdfrw.PdfObject('true')
+        if compress_level is not None:
+            self.Filter = pdfrw.PdfName('FlateDecode')
+            if predictor is not None:
+                self.DecodeParms = pdfrw.PdfDict(\
+                    Predictor=_image_predictors[predictor][1], \
+                    Colors=n_channels, \
+                    BitsPerComponent=self.BitsPerComponent, Columns=width)
+        if alpha is not None:
+            alpha = numpy.asarray(alpha)
+            if alpha.shape != (height, width):
+                raise ValueError('Image alpha should be of shape ' + \
+                                 str((height, width)) + '. Got ' + \
+                                 str(alpha.shape))
+            self.SMask = PdfXObjectImage(pixels=alpha.astype(pixels.dtype, \
+                                                            copy=False), \
+                                         predictor=predictor, \
+                                         compress_level=compress_level, \
+                                         interpolate=interpolate)
+        if name is not None:
+            self.Name = pdfrw.PdfName(name)
+        # Big-endian samples, one row of bytes per image row
+        pixels = numpy.ascontiguousarray(pixels.astype(\
+            pixels.dtype.newbyteorder('>'), copy=False))
+        self.private.pixel_rows = pixels.reshape(height, -1).view(numpy.uint8)
+        self.private.bytes_per_pixel = n_channels * pixels.dtype.itemsize
+        self.private.predictor = predictor
+        self.private.compress_level = compress_level
+        self.private.stream_is_outdated = True
+        fingerprint = hashlib.sha256(repr((pixels.shape, \
+            self.BitsPerComponent, color_space, predictor, compress_level, \
+            interpolate, self.SMask and self.SMask.content_fingerprint))\
+            .encode('utf-8'))
+        fingerprint.update(memoryview(self.pixel_rows))
+        self.private.content_fingerprint = fingerprint.hexdigest()
+
+    def _chunks(self):
+        # Buffers of the stream, of about image_chunk_size bytes each
+        rows = self.pixel_rows
+        n_rows = max(1, image_chunk_size // max(rows.shape[1], 1))
+        previous_row = numpy.zeros((1, rows.shape[1]), dtype=numpy.uint8)
+        bytes_per_pixel = self.bytes_per_pixel
+        for start in range(0, len(rows), n_rows):
+            chunk = rows[start:start + n_rows]
+            if self.predictor is None or self.compress_level is None:
+                yield memoryview(chunk).cast('B')
+                continue
+            filtered = numpy.empty((len(chunk), rows.shape[1] + 1), \
+                                   dtype=numpy.uint8)
+            filtered[:, 0] = _image_predictors[self.predictor][0]
+            if self.predictor == 'sub':
+                filtered[:, 1:bytes_per_pixel + 1] = chunk[:, :bytes_per_pixel]
+                numpy.subtract(chunk[:, bytes_per_pixel:], \
+                               chunk[:, :-bytes_per_pixel], \
+                               out=filtered[:, bytes_per_pixel + 1:])
+            else:
+                numpy.subtract(chunk[:1], previous_row, out=filtered[:1, 1:])
+                numpy.subtract(chunk[1:], chunk[:-1], out=filtered[1:, 1:])
+                previous_row = chunk[-1:]
+            yield memoryview(filtered).cast('B')
+
+    def _makeStream(self):
+        # Image data, made from pixels when it or the entries are read
+        if self.stream_is_outdated:
+            self.private.stream_is_outdated = False
+            if self.compress_level is None:
+                stream = ''.join(str(chunk, 'latin-1') \
+                                 for chunk in self._chunks())
+            else:
+                stream = flateCompressBuffers(self._chunks(), \
+                                              self.compress_level)
+            # Also sets Length
+            pdfrw.PdfDict.__setattr__(self, 'stream', stream)
+
+    @property
+    def stream(self):
+        '''Image data, made from pixels (see PdfXObjectImage) only when it
+(or an entry, e.g. Length, which pdfrw.PdfWriter reads first) is read'''
+        self._makeStream()
+        return vars(self).get('stream')
+
+    def iteritems(self, *args, **kwargs):
+        self._makeStream()
+        return super(PdfXObjectImage, self).iteritems(*args, **kwargs)
+
+    def get(self, key, *args, **kwargs):
+        if key == '/Length':
+            self._makeStream()
+        return super(PdfXObjectImage, self).get(key, *args, **kwargs)
+
+    def __setattr__(self, name, value):
+        if name == 'stream':
+            # An explicitly set stream replaces the one from pixels
+            self.private.stream_is_outdated = False
+            self.private.content_fingerprint = None
+        super(PdfXObjectImage, self).__setattr__(name, value)
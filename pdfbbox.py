@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Bounding box of what a content stream paints, kept up to date as it is
+# appended to
+# From PDF 1.7 file format specification sections 4.2.3, 4.3, 4.4 and 4.9
+
+from math import sqrt
+
+from ._lazy import numpy
+
+
+def _cubicExtremaT(p0, p1, p2, p3):
+    # Parameters t in (0, 1) where the derivative of one coordinate of a
+    # cubic Bezier curve is zero
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    if a == 0:
+        roots = [] if b == 0 else [-c / b]
+    else:
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            return []
+        root = sqrt(discriminant)
+        roots = [(-b + root) / (2 * a), (-b - root) / (2 * a)]
+    return [t for t in roots if 0 < t < 1]
+
+def _cubicPoint(p0, p1, p2, p3, t):
+    s = 1 - t
+    return s * s * s * p0 + 3 * s * s * t * p1 + 3 * s * t * t * p2 + \
+           t * t * t * p3
+
+def cubicBounds(x0, y0, x1, y1, x2, y2, x3, y3):
+    '''Tight [x_min, y_min, x_max, y_max] of a cubic Bezier curve'''
+    xs = [x0, x3] + [_cubicPoint(x0, x1, x2, x3, t) \
+                     for t in _cubicExtremaT(x0, x1, x2, x3)]
+    ys = [y0, y3] + [_cubicPoint(y0, y1, y2, y3, t) \
+                     for t in _cubicExtremaT(y0, y1, y2, y3)]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+def cubicBoundsArray(cubic):
+    '''Tight bounds of many cubic Bezier curves: cubic has shape (n, 4, 2),
+returns an array of shape (n, 4) of [x_min, y_min, x_max, y_max]'''
+    cubic = numpy.asarray(cubic, dtype=float)
+    p0, p1, p2, p3 = [cubic[:, i, :] for i in range(4)]
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        root = numpy.sqrt(b * b - 4 * a * c)
+        is_quadratic = a != 0
+        t = numpy.stack([numpy.where(is_quadratic, (-b + root) / (2 * a), \
+                                     -c / b), \
+                         numpy.where(is_quadratic, (-b - root) / (2 * a), \
+                                     numpy.nan)])
+    # Extrema outside (0, 1) (or none) are replaced by the end points
+    t = numpy.where((t > 0) & (t < 1), t, 0)
+    s = 1 - t
+    extrema = s * s * s * p0 + 3 * s * s * t * p1 + 3 * s * t * t * p2 + \
+              t * t * t * p3
+    points = numpy.concatenate([p0[None], p3[None], extrema])
+    return numpy.concatenate([points.min(axis=0), points.max(axis=0)], axis=1)
+
+def composeTM(m, tm):
+    '''m x tm, both (a, b, c, d, e, f): the new CTM after "m cm"'''
+    a, b, c, d, e, f = m
+    a_, b_, c_, d_, e_, f_ = tm
+    return (a * a_ + b * c_, a * b_ + b * d_, c * a_ + d * c_, \
+            c * b_ + d * d_, e * a_ + f * c_ + e_, e * b_ + f * d_ + f_)
+
+def _maxScale(tm):
+    # Largest singular value of the linear part of tm: how much a length can
+    # be stretched by it at most
+    a, b, c, d = tm[:4]
+    p = a * a + b * b + c * c + d * d
+    q = (a * a + b * b - c * c - d * d) ** 2 + 4 * (a * c + b * d) ** 2
+    return sqrt((p + sqrt(q)) / 2)
+
+def _union(bounds, other):
+    if bounds is None:
+        return other
+    if other is None:
+        return bounds
+    return [min(bounds[0], other[0]), min(bounds[1], other[1]), \
+            max(bounds[2], other[2]), max(bounds[3], other[3])]
+
+_stroking_operators = ['S', 's', 'B', 'B*', 'b', 'b*']
+_painting_operators = _stroking_operators + ['f', 'F', 'f*', 'n']
+# Operators painting text or shadings, whose bounds are not tracked
+unbounded_operators = ['Tj', 'TJ', "'", '"', 'sh']
+# Line cap style of projecting square caps, line join style of miter joins
+_square_cap = 2
+_miter_join = 0
+
+class BoundingBoxTracker:
+    '''Bounding box of the paths painted by a content stream, in the space of
+the stream (before any "cm" in it), with strokes widened by as much as their
+line width, caps and joins can reach, and of the forms and images it draws
+(their BBox or unit square). Text and shadings are not included: the
+operators painting them (see unbounded_operators) are kept in
+unbounded_painted. Used by PdfStream(track_bbox=True).'''
+
+    def __init__(self):
+        self.bbox = None
+        self.unbounded_painted = set()
+        self.ctm = (1, 0, 0, 1, 0, 0)
+        self.line_width = 1
+        self.line_cap = 0
+        self.line_join = 0
+        self.miter_limit = 10
+        self._saved_states = []
+        self._path_bounds = None
+        self._current_point = None
+        self._subpath_start = None
+
+    def _transform(self, x, y):
+        a, b, c, d, e, f = self.ctm
+        return a * x + c * y + e, b * x + d * y + f
+
+    def _addPoints(self, *points):
+        xs, ys = zip(*[self._transform(x, y) for x, y in points])
+        self._path_bounds = _union(self._path_bounds, \
+                                   [min(xs), min(ys), max(xs), max(ys)])
+
+    def _addCubic(self, p1, p2, p3):
+        points = [self._transform(*p) \
+                  for p in [self._current_point, p1, p2, p3]]
+        self._path_bounds = _union(self._path_bounds, \
+                                   cubicBounds(*[v for p in points for v in p]))
+        self._current_point = p3
+
+    def _strokeReach(self):
+        # How far a stroke can reach from its path: half the line width, up
+        # to miter_limit times that at miter joins and sqrt(2) times that at
+        # the corners of projecting square caps
+        factor = 1
+        if self.line_join == _miter_join:
+            factor = max(factor, self.miter_limit)
+        if self.line_cap == _square_cap:
+            factor = max(factor, sqrt(2))
+        return factor * self.line_width / 2
+
+    def _paint(self, operator):
+        if self._path_bounds is not None and operator != 'n':
+            bounds = self._path_bounds
+            if operator in _stroking_operators:
+                half_width = self._strokeReach() * _maxScale(self.ctm)
+                bounds = [bounds[0] - half_width, bounds[1] - half_width, \
+                          bounds[2] + half_width, bounds[3] + half_width]
+            self.bbox = _union(self.bbox, bounds)
+        self._path_bounds = None
+        self._current_point = None
+
+    def _addFormOrImage(self, xobject):
+        if xobject is None:
+            return
+        if xobject.Subtype == '/Image':
+            x_min, y_min, x_max, y_max = 0, 0, 1, 1
+            tm = self.ctm
+        elif xobject.BBox is not None:
+            x_min, y_min, x_max, y_max = [float(v) for v in xobject.BBox]
+            tm = self.ctm if xobject.Matrix is None else \
+                 composeTM([float(v) for v in xobject.Matrix], self.ctm)
+        else:
+            return
+        ctm, self.ctm = self.ctm, tm
+        self._addPoints((x_min, y_min), (x_max, y_min), \
+                        (x_max, y_max), (x_min, y_max))
+        self.ctm = ctm
+        self.bbox = _union(self.bbox, self._path_bounds)
+        self._path_bounds = None
+
+    def update(self, operator, operands, resources={}):
+        '''Account for operator with operands, just appended. resources: the
+resources of the stream by type and name (to find the XObjects of "Do" and
+ExtGStates of "gs")'''
+        if operator in ['m', 'l']:
+            self._addPoints(operands)
+            self._current_point = tuple(operands)
+            if operator == 'm':
+                self._subpath_start = self._current_point
+        elif operator == 'c':
+            self._addCubic(operands[0:2], operands[2:4], operands[4:6])
+        elif operator == 'v':
+            self._addCubic(self._current_point, operands[0:2], operands[2:4])
+        elif operator == 'y':
+            self._addCubic(operands[0:2], operands[2:4], operands[2:4])
+        elif operator == 're':
+            x, y, width, height = operands
+            self._addPoints((x, y), (x + width, y), (x + width, y + height), \
+                            (x, y + height))
+            self._current_point = self._subpath_start = (x, y)
+        elif operator == 'h':
+            self._current_point = self._subpath_start
+        elif operator in _painting_operators:
+            self._paint(operator)
+        elif operator == 'q':
+            self._saved_states.append((self.ctm, self.line_width, \
+                                       self.line_cap, self.line_join, \
+                                       self.miter_limit))
+        elif operator == 'Q':
+            if len(self._saved_states) > 0:
+                self.ctm, self.line_width, self.line_cap, self.line_join, \
+                    self.miter_limit = self._saved_states.pop()
+        elif operator == 'cm':
+            self.ctm = composeTM(operands, self.ctm)
+        elif operator == 'w':
+            self.line_width = operands[0]
+        elif operator == 'J':
+            self.line_cap = operands[0]
+        elif operator == 'j':
+            self.line_join = operands[0]
+        elif operator == 'M':
+            self.miter_limit = operands[0]
+        elif operator == 'gs':
+            ext_g_state = resources.get('ExtGState', {})\
+                          .get(operands[0].lstrip('/'))
+            for key, name in [('LW', 'line_width'), ('LC', 'line_cap'), \
+                              ('LJ', 'line_join'), ('ML', 'miter_limit')]:
+                if ext_g_state is not None and \
+                   ext_g_state.get('/' + key) is not None:
+                    setattr(self, name, float(ext_g_state['/' + key]))
+        elif operator in unbounded_operators:
+            self.unbounded_painted.add(operator)
+        elif operator == 'Do':
+            self._addFormOrImage(resources.get('XObject', {})\
+                                 .get(operands[0].lstrip('/')))
+        elif operator == 'BI':
+            self._addPoints((0, 0), (1, 0), (1, 1), (0, 1))
+            self.bbox = _union(self.bbox, self._path_bounds)
+            self._path_bounds = None
+
+    def _transformArray(self, points):
+        a, b, c, d, e, f = self.ctm
+        x, y = points[..., 0], points[..., 1]
+        return numpy.stack([a * x + c * y + e, b * x + d * y + f], axis=-1)
+
+    def _addBounds(self, bounds):
+        # bounds: array of shape (n, 4) in device space
+        self._path_bounds = _union(self._path_bounds, \
+                                   bounds[:, :2].min(axis=0).tolist() + \
+                                   bounds[:, 2:].max(axis=0).tolist())
+
+    def updateCubics(self, cubic, subpath_start=None):
+        '''Account for path segments of shape (n, 4, 2) just appended (e.g.
+custom paths), straight lines having p1 == p0 and p2 == p3'''
+        if len(cubic) == 0:
+            return
+        self._addBounds(cubicBoundsArray(self._transformArray(cubic)))
+        self._current_point = tuple(cubic[-1, 3].tolist())
+        if subpath_start is not None:
+            self._subpath_start = tuple(subpath_start)
+
+    def updateArray(self, operator, operands, resources={}):
+        '''update for operator appended once for each row of operands'''
+        operands = numpy.asarray(operands, dtype=float)
+        if len(operands) == 0:
+            return
+        if operator in ['m', 'l']:
+            self._addBounds(numpy.tile(self._transformArray(operands), 2))
+            self._current_point = tuple(operands[-1].tolist())
+            if operator == 'm':
+                self._subpath_start = self._current_point
+        elif operator in ['c', 'v', 'y']:
+            end_points = operands[:, -2:]
+            start_points = numpy.concatenate([[self._current_point], \
+                                              end_points[:-1]])
+            if operator == 'c':
+                p1, p2 = operands[:, 0:2], operands[:, 2:4]
+            elif operator == 'v':
+                p1, p2 = start_points, operands[:, 0:2]
+            else:
+                p1, p2 = operands[:, 0:2], end_points
+            self.updateCubics(numpy.stack([start_points, p1, p2, \
+                                           end_points], axis=1))
+        elif operator == 're':
+            x, y, width, height = operands.T
+            corners = numpy.stack([numpy.stack([x, y], axis=-1), \
+                                   numpy.stack([x + width, y + height], \
+                                               axis=-1), \
+                                   numpy.stack([x + width, y], axis=-1), \
+                                   numpy.stack([x, y + height], axis=-1)], \
+                                  axis=1)
+            corners = self._transformArray(corners)
+            self._addBounds(numpy.concatenate([corners.min(axis=1), \
+                                               corners.max(axis=1)], axis=1))
+            self._current_point = self._subpath_start = \
+                tuple(operands[-1, :2].tolist())
+        else:
+            for row in operands.tolist():
+                self.update(operator, row, resources)
+
+    def updateInstances(self, b_box, tm):
+        '''Account for a form with b_box drawn with each of the matrices tm,
+of shape (n, 6) (form matrix included)'''
+        x_min, y_min, x_max, y_max = [float(v) for v in b_box]
+        corners = numpy.array([[x_min, y_min], [x_max, y_min], \
+                               [x_max, y_max], [x_min, y_max]])
+        a, b, c, d, e, f = [tm[:, i, None] for i in range(6)]
+        x, y = corners[:, 0], corners[:, 1]
+        corners = self._transformArray(numpy.stack([a * x + c * y + e, \
+                                                    b * x + d * y + f], \
+                                                   axis=-1))
+        self._addBounds(numpy.concatenate([corners.min(axis=1), \
+                                           corners.max(axis=1)], axis=1))
+        self.bbox = _union(self.bbox, self._path_bounds)
+        self._path_bounds = None
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# On-disk cache of serialized (and compressed) content streams, by a hash of
+# the operations they are made from, shared by runs and processes
+
+import hashlib
+import numbers
+import os
+import tempfile
+
+from ._lazy import numpy, pdfrw, isNumpyArray
+
+from .pdfstream import PdfStream
+from .pdfnumber import default_number_format
+from .pdfcompress import flateCompress
+from .arc2cubic import custom_path_operator
+
+
+# Part of every key: changing how streams are made invalidates the cache
+cache_format_version = 2
+_file_suffix = '.pdfcontent'
+
+
+def _normalized(value):
+    # Hashable, canonical form of an operand
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, numbers.Real):
+        return float(value)
+    if isNumpyArray(value):
+        return ('array', value.shape, str(value.dtype), \
+                hashlib.sha256(numpy.ascontiguousarray(value)).hexdigest())
+    if isinstance(value, pdfrw.PdfDict):
+        raise ValueError('Operations of a cached content stream should ' + \
+                         'name their resources ("/F1"), not give them')
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((str(key), _normalized(item)) \
+                                     for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalized(item) for item in value)
+    if value is None:
+        return None
+    raise ValueError('Can not hash the operand: ' + repr(value))
+
+def _operands(operation):
+    # Operands of an operation as for PdfStream.append_multiple_operations:
+    # ('m', [x, y]) and ('m', x, y) are the same operation
+    operands = operation[1:]
+    if len(operands) == 1 and isinstance(operands[0], (list, tuple)):
+        operands = operands[0]
+    return tuple(operands)
+
+def _customPaths(path_type, path_parameters):
+    # (path_type, path_parameters, {}) of each custom path, one per element
+    # of array parameters (as appended by PdfStream.appendCustomPaths)
+    if not any(isNumpyArray(parameter) for parameter in path_parameters):
+        return [(path_type, path_parameters, {})]
+    values = [value.ravel().tolist() for value in numpy.broadcast_arrays(\
+                  *[numpy.asarray(parameter) \
+                    for parameter in path_parameters])]
+    return [(path_type, tuple(value[i] for value in values), {}) \
+            for i in range(len(values[0]) if len(values) > 0 else 0)]
+
+def pathOperations(operations):
+    '''Operations (as for PdfStream.append_multiple_operations, or
+PdfStream.commands) as a list of (operator, operands) and, for custom paths,
+(path_type, path_parameters, path_kwargs), one per path. The "c"s and "l"s
+recorded between "Arc:Start" (etc.) and "Arc:End" in PdfStream.commands are
+left out: the parameters of the path are kept.'''
+    path_operations = []
+    path_end = None
+    for operation in operations:
+        if isinstance(operation, str):
+            operation = (operation,)
+        operator = operation[0]
+        if path_end is not None:
+            if operator == path_end:
+                path_end = None
+            continue
+        if operator.endswith(':Start'):
+            # A custom path in PdfStream.commands
+            path_end = operator[:-len('Start')] + 'End'
+            path_type = operator[:-len(':Start')]
+            path_parameters = tuple(operation[1])
+            if custom_path_operator[path_type]\
+               ['send_last_point_to_function']:
+                # The start point, added by PdfStream
+                path_parameters = path_parameters[2:]
+            # Unset keyword arguments are the same as not given
+            path_kwargs = {name: value for name, value in \
+                           (operation[2] if len(operation) > 2 else {})\
+                           .items() if value is not None}
+            path_operations.append((path_type, path_parameters, path_kwargs))
+        elif operator in custom_path_operator:
+            path_operations.extend(_customPaths(operator, \
+                                                _operands(operation)))
+        else:
+            path_operations.append((operator, _operands(operation)))
+    return path_operations
+
+def normalizedOperations(operations):
+    '''pathOperations of operations as a tuple, with the numbers as floats:
+the same for operations and the PdfStream.commands they make'''
+    return tuple(_normalized(operation) \
+                 for operation in pathOperations(operations))
+
+def appendPathOperations(pdf_stream, path_operations):
+    '''Append path_operations (see pathOperations) to pdf_stream'''
+    for operation in path_operations:
+        if len(operation) == 3:
+            path_type, path_parameters, path_kwargs = operation
+            pdf_stream.appendCustomPath(path_type, *path_parameters, \
+                                        **path_kwargs)
+        else:
+            operator, operands = operation
+            pdf_stream.append(operator, *operands)
+
+class PdfContentCache:
+    '''Content streams by the hash of the operations they are made from, as
+files in directory, so that unchanged pages are not made again by later runs
+or by other processes using the same directory.
+contentStream(operations) returns the stream made by
+PdfStream.append_multiple_operations(operations) (or, for the commands of a
+PdfStream, by replaying them, see pathOperations) (Flate compressed if
+compress_level is not None) from the cache, or makes and caches it.
+Operations should give the names of their resources ("/F1"), not the
+resources. The least recently used streams are deleted once the files take
+more than max_size bytes. Files are written to a temporary file first, then
+renamed, so that other processes never read half a stream.
+n_hits, n_misses, n_evictions: statistics of this object'''
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024, \
+                 compress_level=6, number_format=None, validation='strict'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.max_size = max_size
+        self.compress_level = compress_level
+        self.number_format = default_number_format if number_format is None \
+                             else number_format
+        self.validation = validation
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evictions = 0
+        self._size = self.size()
+
+    def key(self, operations):
+        '''Hash of operations (see normalizedOperations) and of what else
+changes the stream'''
+        return hashlib.sha256(repr((cache_format_version, \
+            repr(self.number_format), self.compress_level, self.validation, \
+            normalizedOperations(operations))).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _file_suffix)
+
+    def get(self, key):
+        '''Cached stream (latin-1 str like pdfrw streams) of key, or None'''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                stream = cache_file.read().decode('latin-1')
+        except FileNotFoundError:
+            self.n_misses += 1
+            return None
+        try:
+            # Most recently used
+            os.utime(path)
+        except OSError:
+            pass
+        self.n_hits += 1
+        return stream
+
+    def put(self, key, stream):
+        '''Cache stream (latin-1 str) for key'''
+        data = stream.encode('latin-1')
+        file_descriptor, temporary_path = tempfile.mkstemp(\
+            dir=self.directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+        self._size += len(data)
+        if self._size > self.max_size:
+            self.evict()
+
+    def _files(self):
+        # (modification time, size, path) of the cached streams
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_file_suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Evicted by another process meanwhile
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def size(self):
+        '''Bytes taken by the cached streams (of all processes)'''
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self, max_size=None):
+        '''Delete the least recently used streams until they take at most
+90% of max_size (self.max_size by default) bytes'''
+        max_size = self.max_size if max_size is None else max_size
+        files = sorted(self._files())
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in files:
+            if size <= 0.9 * max_size:
+                break
+            try:
+                os.remove(path)
+                self.n_evictions += 1
+            except OSError:
+                # Evicted by another process meanwhile
+                pass
+            size -= file_size
+        self._size = size
+
+    def clear(self):
+        '''Delete all cached streams'''
+        self.evict(0)
+
+    def contentStream(self, operations, **stream_kwargs):
+        '''Stream made from operations, from the cache if it is there (see
+PdfContentCache). stream_kwargs: other arguments of PdfStream, e.g.
+compact=True (they should not change the stream).'''
+        # Read more than once: once for the key, once to make the stream
+        operations = list(operations)
+        key = self.key(operations)
+        stream = self.get(key)
+        if stream is None:
+            pdf_stream = PdfStream(validation=self.validation, \
+                                   number_format=self.number_format, \
+                                   **stream_kwargs)
+            if any(isinstance(operation, list) for operation in operations):
+                # PdfStream.commands
+                appendPathOperations(pdf_stream, pathOperations(operations))
+            else:
+                pdf_stream.append_multiple_operations(operations)
+            stream = str(pdf_stream)
+            if self.compress_level is not None:
+                stream = flateCompress(stream, self.compress_level)
+            self.put(key, stream)
+        return stream
+
+    def toPdfDict(self, operations, **kwargs):
+        '''pdfrw.PdfDict(**kwargs) with the stream of operations (see
+contentStream), e.g. for page.Contents'''
+        pdf_dict = pdfrw.PdfDict(**kwargs)
+        pdf_dict.stream = self.contentStream(operations)
+        if self.compress_level is not None:
+            pdf_dict.Filter = pdfrw.PdfName('FlateDecode')
+        return pdf_dict
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Flate (zlib) compression of streams
+
+import zlib
+
+from ._lazy import pdfrw
+
+
+def flateCompress(string_, level=6):
+    '''Flate compressed string_, both latin-1 str like pdfrw streams'''
+    return zlib.compress(string_.encode('latin-1'), level).decode('latin-1')
+
+def flateCompressBuffers(buffers, level=6):
+    '''Flate compressed concatenation of buffers (bytes-like objects, e.g.
+memoryviews of arrays, compressed one at a time without joining them), as a
+latin-1 str like pdfrw streams'''
+    compressor = zlib.compressobj(level)
+    chunks = [compressor.compress(buffer_) for buffer_ in buffers]
+    chunks.append(compressor.flush())
+    return str(b''.join(chunks), 'latin-1')
+
+def compressStream(pdf_dict, level=6):
+    '''Compress the stream of pdf_dict, unless it already has a Filter'''
+    if pdf_dict.stream is not None and pdf_dict.Filter is None:
+        pdf_dict.stream = flateCompress(pdf_dict.stream, level)
+        pdf_dict.Filter = pdfrw.PdfName('FlateDecode')
+    return pdf_dict
+
+def streamObjects(objects):
+    '''Every PdfDict with a stream that can be reached from objects (e.g. a
+list of pages), other than through /Parent, once'''
+    visited = set()
+    to_visit = list(objects)
+    while len(to_visit) > 0:
+        obj = to_visit.pop()
+        if id(obj) in visited:
+            continue
+        visited.add(id(obj))
+        if isinstance(obj, pdfrw.PdfDict):
+            if obj.stream is not None:
+                yield obj
+            to_visit.extend(value for key, value in obj.iteritems() \
+                            if key != '/Parent')
+        elif isinstance(obj, list):
+            to_visit.extend(obj)
+
+def compressDocumentStreams(pages, level=6, max_workers=None, executor=None):
+    '''Compress every stream without a Filter used by pages (e.g. page
+contents and forms, from PdfWriter.pagearray), in parallel on a pool of
+max_workers threads, before PdfWriter writes them. executor: a
+concurrent.futures executor to use instead (e.g. a ProcessPoolExecutor).
+Returns the number of streams compressed.'''
+    # Imported here: it takes longer to import than the rest of the package
+    from concurrent.futures import ThreadPoolExecutor
+    stream_dicts = [pdf_dict for pdf_dict in streamObjects(pages) \
+                    if pdf_dict.Filter is None]
+    streams = [pdf_dict.stream.encode('latin-1') for pdf_dict in stream_dicts]
+    levels = [level] * len(streams)
+    if executor is None:
+        with ThreadPoolExecutor(max_workers) as executor:
+            compressed_streams = list(executor.map(zlib.compress, streams, \
+                                                   levels))
+    else:
+        compressed_streams = list(executor.map(zlib.compress, streams, levels))
+    for pdf_dict, compressed_stream in zip(stream_dicts, compressed_streams):
+        pdf_dict.stream = compressed_stream.decode('latin-1')
+        pdf_dict.Filter = pdfrw.PdfName('FlateDecode')
+        if getattr(pdf_dict, 'pdf_stream', None) is not None:
+            # A PdfXObjectForm: also compressed after later update_stream
+            pdf_dict.private.compress_level = level
+    return len(stream_dicts)
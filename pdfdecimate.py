@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Fewer vertices for long polylines (e.g. time series plots) without visible
+# change: decimation within a tolerance, and culling of what is off the page
+
+from ._lazy import numpy
+
+
+def decimateRDP(xy, tolerance):
+    '''Vertices of the polyline xy (shape (n, 2)) kept by Ramer-Douglas-Peucker
+simplification: no point of xy is farther than tolerance from the result.
+All intervals still to split are handled together, in one pass over the
+points for each level of recursion.'''
+    xy = numpy.asarray(xy, dtype=float)
+    n = len(xy)
+    if n < 3:
+        return xy
+    x, y = xy[:, 0], xy[:, 1]
+    keep = numpy.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    starts, ends = numpy.array([0]), numpy.array([n - 1])
+    while len(starts) > 0:
+        n_interior = ends - starts - 1
+        has_interior = n_interior > 0
+        starts, ends = starts[has_interior], ends[has_interior]
+        n_interior = n_interior[has_interior]
+        if len(starts) == 0:
+            break
+        interval = numpy.repeat(numpy.arange(len(starts)), n_interior)
+        index = numpy.arange(n_interior.sum()) - \
+                numpy.repeat(numpy.cumsum(n_interior) - n_interior, \
+                             n_interior) + starts[interval] + 1
+        x0, y0 = x[starts][interval], y[starts][interval]
+        # Distance to the chord as a segment (not as a line), so that no
+        # point is left farther than tolerance
+        chord_x, chord_y = x[ends][interval] - x0, y[ends][interval] - y0
+        offset_x, offset_y = x[index] - x0, y[index] - y0
+        chord_length_2 = chord_x * chord_x + chord_y * chord_y
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t = numpy.clip((offset_x * chord_x + offset_y * chord_y) / \
+                           chord_length_2, 0, 1)
+        t[chord_length_2 == 0] = 0
+        distance = numpy.hypot(offset_x - t * chord_x, offset_y - t * chord_y)
+        # Farthest point of each interval (the first one, if several)
+        first = numpy.cumsum(n_interior) - n_interior
+        max_distance = numpy.maximum.reduceat(distance, first)
+        is_farthest = numpy.nonzero(distance == max_distance[interval])[0]
+        is_farthest = is_farthest[numpy.concatenate(\
+            [[True], interval[is_farthest[1:]] != interval[is_farthest[:-1]]])]
+        farthest = index[is_farthest]
+        split = max_distance > tolerance
+        keep[farthest[split]] = True
+        starts = numpy.concatenate([starts[split], farthest[split]])
+        ends = numpy.concatenate([farthest[split], ends[split]])
+    return xy[keep]
+
+def decimateMinMax(xy, tolerance):
+    '''Vertices of the polyline xy (shape (n, 2), x monotonic, e.g. a time
+series) kept by min/max binning: in each column of width tolerance, the first,
+last, lowest and highest points, in order. What is drawn in each column (a
+device pixel wide, for tolerance of one pixel) stays the same.'''
+    xy = numpy.asarray(xy, dtype=float)
+    if len(xy) < 5:
+        return xy
+    x, y = xy[:, 0], xy[:, 1]
+    column = numpy.floor((x - x[0]) / tolerance)
+    if not (numpy.all(numpy.diff(column) >= 0) or \
+            numpy.all(numpy.diff(column) <= 0)):
+        raise ValueError('decimateMinMax needs monotonic x, ' + \
+                         'use decimateRDP instead')
+    is_first = numpy.concatenate([[True], column[1:] != column[:-1]])
+    is_last = numpy.concatenate([column[1:] != column[:-1], [True]])
+    group = numpy.cumsum(is_first) - 1
+    order = numpy.lexsort((y, group))
+    group_end = numpy.nonzero(is_last)[0]
+    group_start = numpy.nonzero(is_first)[0]
+    keep = is_first | is_last
+    keep[order[group_start]] = True
+    keep[order[group_end]] = True
+    return xy[keep]
+
+def cullPolyline(xy, clip_box, margin=0):
+    '''Subpaths (a list of arrays of shape (m, 2)) of the polyline xy without
+the segments that can not be seen in clip_box ([x_min, y_min, x_max, y_max],
+e.g. the MediaBox of a page) grown by margin (e.g. half the line width).
+A segment is kept if its bounding box meets the box. For stroked paths only:
+the fill of a culled path is not the same.'''
+    xy = numpy.asarray(xy, dtype=float)
+    x_min, y_min, x_max, y_max = [float(value) for value in clip_box]
+    x_min, y_min, x_max, y_max = x_min - margin, y_min - margin, \
+                                 x_max + margin, y_max + margin
+    if len(xy) < 2:
+        is_inside = (xy[:, 0] >= x_min) & (xy[:, 0] <= x_max) & \
+                    (xy[:, 1] >= y_min) & (xy[:, 1] <= y_max)
+        return [xy] if numpy.all(is_inside) and len(xy) > 0 else []
+    x0, y0, x1, y1 = xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1]
+    is_visible = (numpy.maximum(x0, x1) >= x_min) & \
+                 (numpy.minimum(x0, x1) <= x_max) & \
+                 (numpy.maximum(y0, y1) >= y_min) & \
+                 (numpy.minimum(y0, y1) <= y_max)
+    if numpy.all(is_visible):
+        return [xy]
+    # Runs of visible segments, each one a subpath
+    change = numpy.diff(numpy.concatenate([[False], is_visible, [False]]) \
+                        .astype(int))
+    run_starts = numpy.nonzero(change == 1)[0]
+    run_ends = numpy.nonzero(change == -1)[0]
+    return [xy[start:end + 1] for start, end in \
+            zip(run_starts.tolist(), run_ends.tolist())]
+
+def reducePolyline(xy, tolerance=None, clip_box=None, margin=0, \
+                   method='rdp'):
+    '''Subpaths of the polyline xy culled to clip_box (see cullPolyline, if
+clip_box is not None), each decimated within tolerance (if it is not None)
+by method: 'rdp' (decimateRDP) or 'minmax' (decimateMinMax)'''
+    xy = numpy.asarray(xy, dtype=float)
+    subpaths = [xy] if clip_box is None else cullPolyline(xy, clip_box, margin)
+    if tolerance is not None:
+        if method not in decimation_methods:
+            raise NotImplementedError('Polyline decimation method: ' + \
+                                      str(method) + ' is not implemented')
+        subpaths = [decimation_methods[method](subpath, tolerance) \
+                    for subpath in subpaths]
+    return subpaths
+
+decimation_methods = {'rdp': decimateRDP, 'minmax': decimateMinMax}
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Imposition (N-up sheets, booklets) and stamping of existing pages, through
+# form XObjects made once per page from its content streams as they are
+# From PDF 1.7 file format specification sections 3.6.2, 4.2.3 and 4.9
+
+from ._lazy import pdfrw
+
+from .pdfstream import PdfStream
+from .pdfcompress import flateCompress
+from ._misc import PdfTM, mm2pt
+
+
+# Form matrix showing a page upright, for each /Rotate (clockwise degrees)
+_rotate_matrices = {0: (1, 0, 0, 1), 90: (0, -1, 1, 0), 180: (-1, 0, 0, -1),
+                    270: (0, 1, -1, 0)}
+
+def _pageBox(page, box):
+    inheritable = page.inheritable
+    rectangle = inheritable[pdfrw.PdfName(box)] or inheritable.MediaBox
+    return [float(value) for value in rectangle]
+
+def _contentStream(contents):
+    # A content stream dictionary for a form: the stream of contents as it
+    # is (still encoded) if there is one, else the streams joined (decoded to
+    # join them, then compressed again if any was)
+    if isinstance(contents, pdfrw.PdfDict):
+        return contents
+    if len(contents) == 1:
+        return contents[0]
+    streams = [pdfrw.PdfDict(stream) for stream in contents]
+    was_compressed = any(stream.Filter is not None for stream in streams)
+    if was_compressed and not pdfrw.uncompress.uncompress(streams):
+        raise NotImplementedError('Joining content streams with filters: ' + \
+            str(set(str(stream.Filter) for stream in streams)))
+    joined = pdfrw.PdfDict()
+    joined.stream = '\n'.join(stream.stream for stream in streams)
+    if was_compressed:
+        joined.stream = flateCompress(joined.stream)
+        joined.Filter = pdfrw.PdfName('FlateDecode')
+    return joined
+
+def pageForm(page, box='CropBox'):
+    '''Form XObject showing page (e.g. from pdfrw.PdfReader) as it is
+displayed: box (or the MediaBox if it has none) of it, turned by its
+/Rotate. The form has the stream (without decoding it), filters and
+Resources of the page, and is made once for each page object: using it for
+every placement of the page writes the page once.
+form.rectangle: [x_min, y_min, x_max, y_max] of the page, as displayed, in
+the space of the form (after its Matrix)'''
+    form = page.page_form
+    if form is not None and form.box == box:
+        return form
+    contents = _contentStream(page.Contents)
+    form = pdfrw.PdfDict(Type=pdfrw.PdfName('XObject'), \
+                         Subtype=pdfrw.PdfName('Form'), FormType=1)
+    form.stream = contents.stream
+    for key in ['Filter', 'DecodeParms']:
+        if contents[pdfrw.PdfName(key)] is not None:
+            form[pdfrw.PdfName(key)] = contents[pdfrw.PdfName(key)]
+    x_min, y_min, x_max, y_max = _pageBox(page, box)
+    form.BBox = [x_min, y_min, x_max, y_max]
+    form.Resources = page.inheritable.Resources or pdfrw.PdfDict()
+    rotate = int(page.inheritable.Rotate or 0) % 360
+    if rotate not in _rotate_matrices:
+        raise ValueError('Page /Rotate should be a multiple of 90. Got ' + \
+                         str(rotate))
+    a, b, c, d = _rotate_matrices[rotate]
+    if rotate != 0:
+        form.Matrix = [a, b, c, d, 0, 0]
+    xs = [a * x + c * y for x in [x_min, x_max] for y in [y_min, y_max]]
+    ys = [b * x + d * y for x in [x_min, x_max] for y in [y_min, y_max]]
+    form.private.rectangle = [min(xs), min(ys), max(xs), max(ys)]
+    form.private.box = box
+    page.private.page_form = form
+    return form
+
+def _formRectangle(form):
+    if form.rectangle is not None:
+        return form.rectangle
+    # Another form (e.g. a PdfXObjectForm): its BBox, with its Matrix
+    x_min, y_min, x_max, y_max = [float(value) for value in form.BBox]
+    a, b, c, d, e, f = [float(value) for value in \
+                        (form.Matrix or [1, 0, 0, 1, 0, 0])]
+    xs = [a * x + c * y + e for x in [x_min, x_max] for y in [y_min, y_max]]
+    ys = [b * x + d * y + f for x in [x_min, x_max] for y in [y_min, y_max]]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+def placementTM(form, x, y, width, height, rotation=0, scale=None):
+    '''PdfTM placing form (from pageForm, or another form with a BBox) turned
+counterclockwise by rotation (a multiple of 90 degrees) in the rectangle from
+(x, y) of width and height, centered in it, scaled by scale (by default as
+large as fits)'''
+    x_min, y_min, x_max, y_max = _formRectangle(form)
+    rotation = int(rotation) % 360
+    if rotation not in _rotate_matrices:
+        raise ValueError('rotation should be a multiple of 90. Got ' + \
+                         str(rotation))
+    form_width, form_height = x_max - x_min, y_max - y_min
+    if rotation in [90, 270]:
+        form_width, form_height = form_height, form_width
+    if scale is None:
+        scale = min(width / form_width, height / form_height)
+    # The counterclockwise rotation is the clockwise one of 360 - rotation
+    a, b, c, d = _rotate_matrices[(360 - rotation) % 360]
+    return PdfTM().translate(-(x_min + x_max) / 2, -(y_min + y_max) / 2)\
+                  .compose(a, b, c, d, 0, 0).scale(scale, scale)\
+                  .translate(x + width / 2, y + height / 2)
+
+def gridCells(columns, rows, size=[0, 0, mm2pt(210), mm2pt(297)], margin=0, \
+              gap=0):
+    '''(x, y, width, height) of the cells of a grid of columns by rows on a
+page of size (a MediaBox), inside margin, with gap between cells: left to
+right, then top to bottom'''
+    x_min, y_min, x_max, y_max = size
+    width = (x_max - x_min - 2 * margin - (columns - 1) * gap) / columns
+    height = (y_max - y_min - 2 * margin - (rows - 1) * gap) / rows
+    return [(x_min + margin + column * (width + gap), \
+             y_max - margin - height - row * (height + gap), width, height) \
+            for row in range(rows) for column in range(columns)]
+
+def bookletOrder(n_pages):
+    '''Order of the pages (indices, None for a blank page) for a 2-up saddle
+stitched booklet: printed on both sides of sheets, folded and nested, the
+pages read 0, 1, 2, ...'''
+    n_padded = -(-n_pages // 4) * 4
+    order = []
+    for i in range(0, n_padded // 2, 2):
+        order += [n_padded - 1 - i, i, i + 1, n_padded - 2 - i]
+    return [index if index < n_pages else None for index in order]
+
+def imposePages(pages, columns=2, rows=1, size=[0, 0, mm2pt(297), mm2pt(210)], \
+                margin=0, gap=0, rotation=0, box='CropBox', resource_pool=None):
+    '''Sheets (new pages of size) with pages (None for a blank cell) placed
+in a grid (see gridCells), each one fitted in its cell and turned by
+rotation (see placementTM). A generator: the sheets can be written (e.g. by
+PdfStreamingWriter) as they are made. Each page is a form made once (see
+pageForm), and resource_pool (a PdfResourcePool) names the forms the same on
+every sheet.'''
+    cells = gridCells(columns, rows, size, margin, gap)
+    pages = iter(pages)
+    while True:
+        stream = PdfStream(resource_pool=resource_pool)
+        n_placed = 0
+        for cell in cells:
+            try:
+                page = next(pages)
+            except StopIteration:
+                break
+            n_placed += 1
+            if page is None:
+                continue
+            form = pageForm(page, box)
+            stream.append('q')
+            stream.append('cm', *placementTM(form, *cell, rotation).tm)
+            stream.append('Do', form)
+            stream.append('Q')
+        if n_placed == 0:
+            return
+        yield stream.toPdfPage(size)
+        if n_placed < len(cells):
+            return
+
+def _saveStateStream():
+    # Stream saving the graphics state before the content of a stamped page
+    save_state_stream = pdfrw.PdfDict()
+    save_state_stream.stream = 'q'
+    return save_state_stream
+
+def _stampPage(page, stamp, tm, underlay, name, save_state_stream):
+    resources = pdfrw.PdfDict(page.inheritable.Resources or pdfrw.PdfDict())
+    resources.XObject = pdfrw.PdfDict(resources.XObject or pdfrw.PdfDict())
+    if name is None:
+        i = 1
+        while resources.XObject[pdfrw.PdfName('Stamp' + str(i))] is not None:
+            i += 1
+        name = 'Stamp' + str(i)
+    resources.XObject[pdfrw.PdfName(name)] = stamp
+    page.Resources = resources
+    stamp_stream = pdfrw.PdfDict()
+    stamp_stream.stream = ('' if underlay else 'Q ') + 'q ' + \
+        ('' if tm is None else str(tm) + ' cm ') + '/' + name + ' Do Q'
+    contents = page.Contents
+    contents = list(contents) if isinstance(contents, list) else [contents]
+    if underlay:
+        page.Contents = pdfrw.PdfArray([stamp_stream] + contents)
+    else:
+        page.Contents = pdfrw.PdfArray([save_state_stream] + contents + \
+                                       [stamp_stream])
+    return page
+
+def stampPage(page, stamp, tm=None, underlay=False, name=None):
+    '''Draw the form stamp (e.g. a PdfXObjectForm or pageForm of another page)
+over page (under it if underlay), with transformation matrix tm (a PdfTM,
+identity by default; see placementTM), without touching the content of page:
+Contents becomes an array of its streams and one small stream drawing stamp
+(and one saving the graphics state before them, so that it is the same for
+the stamp). page gets its own Resources, with the stamp as name (by default
+Stamp1, Stamp2, ...). Returns page.'''
+    return _stampPage(page, stamp, tm, underlay, name, _saveStateStream())
+
+def stampPages(pages, stamp, tm=None, underlay=False, name=None):
+    '''stampPage for each of pages, as a generator (see imposePages). The
+stream saving the graphics state is one object for all of pages.'''
+    save_state_stream = _saveStateStream()
+    for page in pages:
+        yield _stampPage(page, stamp, tm, underlay, name, save_state_stream)
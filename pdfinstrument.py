@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Optional instrumentation of PdfStream: operator counts, bytes and times
+#
+# PdfStream itself is not changed: instrument replaces the methods and the
+# formatting table of one instance with timed versions, so streams that are
+# not instrumented cost nothing.
+
+import random
+from collections import Counter
+from time import perf_counter
+
+from ._lazy import numpy
+from .pdfstream import CompactCommands
+
+
+class PdfStreamObserver:
+    '''Called by an instrumented PdfStream (see instrument). Subclass it and
+override what is needed.'''
+
+    def operator(self, operator, n_bytes, seconds):
+        '''operator appended, its n_bytes of content (with the line break)
+formatted in seconds'''
+        pass
+
+    def bulkOperators(self, operator, n, n_bytes, seconds):
+        '''n of operator formatted together (appendArray, appendCustomPaths)
+in n_bytes of content, in seconds'''
+        pass
+
+    def customPath(self, path_type, n_paths, seconds):
+        '''n_paths custom paths of path_type converted and appended in
+seconds'''
+        pass
+
+    def transition(self, old_state, new_state):
+        '''Change of state of the stream'''
+        pass
+
+class InstrumentationReport(PdfStreamObserver):
+    '''PdfStreamObserver adding up everything reported to it, e.g. for all
+streams of a document'''
+
+    def __init__(self):
+        self.operator_counts = Counter()
+        self.operator_bytes = Counter()
+        self.operator_seconds = Counter()
+        self.custom_path_counts = Counter()
+        self.custom_path_seconds = Counter()
+        self.transition_counts = Counter()
+
+    def operator(self, operator, n_bytes, seconds):
+        self.operator_counts[operator] += 1
+        self.operator_bytes[operator] += n_bytes
+        self.operator_seconds[operator] += seconds
+
+    def bulkOperators(self, operator, n, n_bytes, seconds):
+        self.operator_counts[operator] += n
+        self.operator_bytes[operator] += n_bytes
+        self.operator_seconds[operator] += seconds
+
+    def customPath(self, path_type, n_paths, seconds):
+        self.custom_path_counts[path_type] += n_paths
+        self.custom_path_seconds[path_type] += seconds
+
+    def transition(self, old_state, new_state):
+        self.transition_counts[(old_state, new_state)] += 1
+
+    def merge(self, other):
+        '''Add the counts of another InstrumentationReport to this one'''
+        for name in ['operator_counts', 'operator_bytes', 'operator_seconds', \
+                     'custom_path_counts', 'custom_path_seconds', \
+                     'transition_counts']:
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def __str__(self):
+        lines = ['{:12s} {:>10s} {:>12s} {:>10s}'.format(\
+                    'operator', 'count', 'bytes', 'seconds')]
+        for operator, n_bytes in self.operator_bytes.most_common():
+            lines.append('{:12s} {:10d} {:12d} {:10.4f}'.format(\
+                operator, self.operator_counts[operator], n_bytes, \
+                self.operator_seconds[operator]))
+        if len(self.custom_path_counts) > 0:
+            lines.append('{:12s} {:>10s} {:>12s} {:>10s}'.format(\
+                'custom path', 'count', '', 'seconds'))
+            for path_type, n_paths in self.custom_path_counts.most_common():
+                lines.append('{:12s} {:10d} {:12s} {:10.4f}'.format(\
+                    path_type, n_paths, '', \
+                    self.custom_path_seconds[path_type]))
+        if len(self.transition_counts) > 0:
+            lines.append('transitions')
+            for (old_state, new_state), n in \
+                    self.transition_counts.most_common():
+                lines.append('  {} -> {}: {}'.format(old_state, new_state, n))
+        return '\n'.join(lines)
+
+def _timedFormatter(observer, operator, format_):
+    def timedFormat(*operator_parameters):
+        start = perf_counter()
+        line = format_(*operator_parameters)
+        observer.operator(operator, len(line) + 1, perf_counter() - start)
+        return line
+    return timedFormat
+
+def _pdfStream(stream):
+    # PdfStream of a PdfXObjectForm
+    return getattr(stream, 'pdf_stream', None) or stream
+
+def isInstrumented(stream):
+    return '_uninstrumented' in vars(_pdfStream(stream))
+
+def instrument(stream, observer=None, rate=1):
+    '''Report what happens in stream (a PdfStream or PdfXObjectForm) to
+observer, a PdfStreamObserver (a new InstrumentationReport by default), and
+return observer. With rate < 1 only that fraction of the streams is
+instrumented (None is returned for the others), to sample in production.
+A compact PdfStream can not be instrumented: its numeric operators are
+formatted in bulk when its content is read.'''
+    stream = _pdfStream(stream)
+    if isInstrumented(stream):
+        raise ValueError('The PdfStream is already instrumented')
+    if isinstance(stream.commands, CompactCommands):
+        raise ValueError('A compact PdfStream can not be instrumented')
+    if rate < 1 and random.random() >= rate:
+        return None
+    if observer is None:
+        observer = InstrumentationReport()
+    append = stream.append
+    append_custom_path = stream.appendCustomPath
+    append_custom_paths = stream.appendCustomPaths
+    format_operations = stream._formatOperations
+    stream._uninstrumented = {'_operator_formatter': \
+                                  stream._operator_formatter}
+
+    def instrumentedAppend(operator, *operator_parameters):
+        old_state = stream.current_state
+        append(operator, *operator_parameters)
+        if stream.current_state != old_state:
+            observer.transition(old_state, stream.current_state)
+
+    def instrumentedAppendCustomPath(path_type, *path_parameters, \
+                                     **path_kwargs):
+        start = perf_counter()
+        append_custom_path(path_type, *path_parameters, **path_kwargs)
+        observer.customPath(path_type, 1, perf_counter() - start)
+
+    def instrumentedAppendCustomPaths(path_type, *path_parameters, \
+                                      **path_kwargs):
+        old_state = stream.current_state
+        start = perf_counter()
+        append_custom_paths(path_type, *path_parameters, **path_kwargs)
+        seconds = perf_counter() - start
+        observer.customPath(path_type, \
+                            numpy.broadcast(*[numpy.asarray(parameter) for \
+                                              parameter in path_parameters]\
+                                            ).size, seconds)
+        if stream.current_state != old_state:
+            observer.transition(old_state, stream.current_state)
+
+    def instrumentedFormatOperations(operators, values, counts):
+        start = perf_counter()
+        lines = format_operations(operators, values, counts)
+        seconds = perf_counter() - start
+        if isinstance(operators, str):
+            operators = [operators] * len(lines)
+        n_bytes = Counter()
+        for operator, line in zip(operators, lines):
+            n_bytes[str(operator)] += len(line) + 1
+        n_operators = Counter(str(operator) for operator in operators)
+        for operator, n in n_operators.items():
+            observer.bulkOperators(operator, n, n_bytes[operator], \
+                                   seconds * n / len(lines))
+        return lines
+
+    stream._operator_formatter = {operator: \
+                                      _timedFormatter(observer, operator, \
+                                                      format_) \
+                                  for operator, format_ in \
+                                  stream._operator_formatter.items()}
+    stream.append = instrumentedAppend
+    stream.appendCustomPath = instrumentedAppendCustomPath
+    stream.appendCustomPaths = instrumentedAppendCustomPaths
+    stream._formatOperations = instrumentedFormatOperations
+    return observer
+
+def uninstrument(stream):
+    '''Stop reporting what happens in stream to its observer'''
+    stream = _pdfStream(stream)
+    if not isInstrumented(stream):
+        return
+    stream._operator_formatter = stream._uninstrumented['_operator_formatter']
+    for name in ['append', 'appendCustomPath', 'appendCustomPaths', \
+                 '_formatOperations', '_uninstrumented']:
+        delattr(stream, name)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Formatting of numbers in content streams
+
+from ._lazy import numpy
+
+
+def stripZeros(string_):
+    '''"1.5000" -> "1.5", "2.0000" -> "2", "-0.0000" -> "0"'''
+    if '.' in string_:
+        string_ = string_.rstrip('0').rstrip('.')
+    if string_ == '-0':
+        string_ = '0'
+    return string_
+
+class PdfNumberFormat:
+    '''Number format shared by all streams of a document
+precision: number of digits after the decimal point (rounded the same way as
+           '{:.4f}'.format for precision 4)
+strip_zeros: drop trailing zeros and the decimal point if nothing is left
+             after it, and write "-0" as "0"'''
+
+    def __init__(self, precision=4, strip_zeros=False):
+        assert type(precision) is int and 0 <= precision <= 15, \
+            'precision should be an int from 0 to 15. Got ' + str(precision)
+        self.precision = precision
+        self.strip_zeros = strip_zeros
+        self._spec = '{:.' + str(precision) + 'f}'
+        self._formatters = {}
+
+    def __repr__(self):
+        return 'PdfNumberFormat(precision=' + str(self.precision) + \
+               ', strip_zeros=' + str(self.strip_zeros) + ')'
+
+    def format(self, x):
+        if self.strip_zeros:
+            return stripZeros(self._spec.format(x))
+        return self._spec.format(x)
+
+    def join(self, values):
+        '''Numbers in values separated by spaces'''
+        return ' '.join([self.format(x) for x in values])
+
+    def formatter(self, n_values):
+        '''Function formatting n_values numbers, separated by spaces'''
+        if n_values not in self._formatters:
+            if self.strip_zeros:
+                spec = self._spec
+                self._formatters[n_values] = lambda *values: \
+                    ' '.join([stripZeros(spec.format(x)) for x in values])
+            else:
+                self._formatters[n_values] = \
+                    ' '.join([self._spec] * n_values).format
+        return self._formatters[n_values]
+
+    def _characters(self, values):
+        '''Array of shape (len(values), width) with the ASCII codes of each
+formatted number, padded with zeros anywhere in the row'''
+        values = numpy.asarray(values, dtype=float).ravel()
+        precision = self.precision
+        scale = 10 ** precision
+        scaled = numpy.fabs(values) * scale
+        # Exact rounding is ambiguous close to ties and there is no integer
+        # arithmetic beyond 2**53: these are formatted by python instead
+        with numpy.errstate(invalid='ignore'):
+            fallback = ~(scaled < 2 ** 52) | \
+                       (numpy.fabs(scaled - numpy.floor(scaled) - 0.5) <= \
+                        numpy.maximum(scaled, 1) * 1e-12)
+        rounded = numpy.floor(numpy.where(fallback, 0, scaled) + 0.5)\
+                  .astype(numpy.int64)
+        negative = numpy.signbit(values)
+        if self.strip_zeros:
+            negative &= rounded != 0
+        max_integer_digits = len(str(int(rounded.max() // scale))) \
+                             if len(values) > 0 else 1
+        width = 1 + max_integer_digits + (precision + 1 if precision else 0)
+        fallback_strings = [self.format(x) for x in values[fallback].tolist()]
+        if len(fallback_strings) > 0:
+            width = max(width, max([len(s) for s in fallback_strings]))
+        characters = numpy.zeros((len(values), width), dtype=numpy.uint8)
+        characters[:, 0] = numpy.where(negative, ord('-'), 0)
+
+        # Digits from the last one: fraction first, then the integer part
+        point = max_integer_digits + 1
+        if precision:
+            characters[:, point] = ord('.')
+            is_trailing_zero = numpy.ones(len(values), dtype=bool)
+            for j in range(point + precision, point, -1):
+                rounded, digit = numpy.divmod(rounded, 10)
+                if self.strip_zeros:
+                    is_trailing_zero &= digit == 0
+                    characters[:, j] = numpy.where(is_trailing_zero, 0, \
+                                                   ord('0') + digit)
+                else:
+                    characters[:, j] = ord('0') + digit
+            if self.strip_zeros:
+                characters[is_trailing_zero, point] = 0
+        rounded, digit = numpy.divmod(rounded, 10)
+        characters[:, point - 1] = ord('0') + digit
+        for k in range(point - 2, 0, -1):
+            has_digit = rounded > 0
+            rounded, digit = numpy.divmod(rounded, 10)
+            characters[:, k] = numpy.where(has_digit, ord('0') + digit, 0)
+
+        if len(fallback_strings) > 0:
+            fallback_characters = numpy.zeros((len(fallback_strings), width), \
+                                              dtype=numpy.uint8)
+            for i, s in enumerate(fallback_strings):
+                fallback_characters[i, :len(s)] = \
+                    numpy.frombuffer(s.encode('ascii'), dtype=numpy.uint8)
+            characters[fallback] = fallback_characters
+        return characters
+
+    def formatArray(self, values, separator=b' '):
+        '''All numbers in values as bytes, separated by separator'''
+        characters = self._characters(values)
+        characters = numpy.hstack([characters, numpy.tile(\
+            numpy.frombuffer(separator, dtype=numpy.uint8), \
+            (len(characters), 1))])
+        characters = characters.ravel()
+        return characters[characters != 0].tobytes()[:-len(separator) or None]
+
+    def formatOperations(self, values, counts, operators):
+        '''Content stream lines as bytes for many operations with numeric
+operands: values has all operands in order, counts the number of operands of
+each operation (at least one) and operators the operator of each operation
+(or one operator for all of them).'''
+        counts = numpy.asarray(counts, dtype=numpy.int64).ravel()
+        assert numpy.all(counts > 0), 'Every operation needs operands'
+        characters = self._characters(values)
+        if isinstance(operators, str):
+            operators = [operators]
+            operator_index = numpy.zeros(len(counts), dtype=numpy.int64)
+        else:
+            operators, operator_index = numpy.unique(numpy.asarray(operators),
+                                                     return_inverse=True)
+            operators = operators.tolist()
+        last_operand = numpy.cumsum(counts) - 1
+        suffix = numpy.zeros((len(characters), \
+                              2 + max([len(o) for o in operators])), \
+                             dtype=numpy.uint8)
+        suffix[:, 0] = ord(' ')
+        for i, operator in enumerate(operators):
+            operator = numpy.frombuffer(operator.encode('latin-1') + b'\n', \
+                                        dtype=numpy.uint8)
+            suffix[last_operand[operator_index == i], 1:1 + len(operator)] = \
+                operator
+        characters = numpy.hstack([characters, suffix]).ravel()
+        return characters[characters != 0].tobytes()[:-1]
+
+default_number_format = PdfNumberFormat()
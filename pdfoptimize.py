@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Removal of redundant graphics state operators from PdfStream
+# From PDF 1.7 file format specification section 4.3 and 5.2
+
+import copy
+from collections import namedtuple
+
+from .pdfstream import PdfStream, pdf_operator, _ContentSink, _NoCommands
+
+# Graphics (and text) state parameter set by each operator. Colour operators
+# setting a colour space and those setting a colour share one parameter, so
+# that only an exact repeat of the last one is redundant.
+state_parameter = {
+    'w': 'line_width', 'J': 'line_cap', 'j': 'line_join',
+    'M': 'miter_limit', 'd': 'dash_pattern', 'ri': 'rendering_intent',
+    'i': 'flatness',
+    'CS': 'stroking_color', 'SC': 'stroking_color', 'SCN': 'stroking_color',
+    'G': 'stroking_color', 'RG': 'stroking_color', 'K': 'stroking_color',
+    'cs': 'nonstroking_color', 'sc': 'nonstroking_color',
+    'scn': 'nonstroking_color', 'g': 'nonstroking_color',
+    'rg': 'nonstroking_color', 'k': 'nonstroking_color',
+    'Tc': 'char_space', 'Tw': 'word_space', 'Tz': 'horizontal_scale',
+    'TL': 'leading', 'Tf': 'font', 'Tr': 'render_mode', 'Ts': 'rise'}
+
+# Parameters also changed by operators that are not in state_parameter
+side_effect_parameters = {'"': ['word_space', 'char_space'],
+                          'TD': ['leading']}
+
+OptimizationReport = namedtuple('OptimizationReport',
+                                'n_operators_removed n_bytes_removed')
+
+def optimizeCommands(commands, content):
+    '''Commands and content lines (content[i] of the i-th PDF operator in
+commands) without operators that do not change the rendered page:
+- state operators setting a parameter to the value it already has
+- identity "cm"
+- q ... Q pairs with only state operators in between
+Returns (commands, content, number of operators removed)'''
+    kept_commands, kept_content = [], []
+    state = {}
+    saved_states = []
+    has_effect = True
+    n_removed = 0
+    i = 0
+    for command in commands:
+        operator = command[0]
+        if operator not in pdf_operator:
+            # Custom path start and end
+            kept_commands.append(command)
+            continue
+        line = content[i]
+        i += 1
+        if operator == 'q':
+            saved_states.append((dict(state), len(kept_commands), \
+                                 len(kept_content), has_effect))
+            has_effect = False
+        elif operator == 'Q' and len(saved_states) > 0:
+            state, n_commands, n_content, parent_has_effect = \
+                saved_states.pop()
+            if not has_effect:
+                n_removed += len(kept_content) - n_content + 1
+                del kept_commands[n_commands:]
+                del kept_content[n_content:]
+                has_effect = parent_has_effect
+                continue
+        elif operator in state_parameter:
+            if state.get(state_parameter[operator]) == line:
+                n_removed += 1
+                continue
+            state[state_parameter[operator]] = line
+        elif operator == 'cm':
+            if tuple(command[1]) == (1, 0, 0, 1, 0, 0):
+                n_removed += 1
+                continue
+        elif operator == 'gs':
+            # Can set any parameter
+            state = {}
+        else:
+            has_effect = True
+            for parameter in side_effect_parameters.get(operator, []):
+                state.pop(parameter, None)
+        kept_commands.append(command)
+        kept_content.append(line)
+    return kept_commands, kept_content, n_removed
+
+def optimizeStream(stream):
+    '''New PdfStream with the content of stream without redundant operators
+(see optimizeCommands), and its resources, resource_pool and bbox_tracker,
+and an OptimizationReport of what was removed. The stream must keep its
+commands (no sink, keep_commands=True).'''
+    if isinstance(stream.content, _ContentSink) or \
+       isinstance(stream.commands, _NoCommands):
+        raise ValueError('Only a PdfStream keeping its content and ' + \
+                         'commands can be optimized')
+    optimized_stream = PdfStream(validation=stream.validation, \
+                                 number_format=stream.number_format, \
+                                 compress_level=stream.compress_level, \
+                                 resource_pool=stream.resource_pool)
+    optimized_stream.commands, optimized_stream.content, n_removed = \
+        optimizeCommands(list(stream.commands), list(stream.content))
+    optimized_stream.current_state = stream.current_state
+    optimized_stream.last_point = stream.last_point
+    # The same resources and bounding box: only redundant operators are left
+    # out
+    optimized_stream.resources = {resource_type: dict(resources) for \
+                                  resource_type, resources in \
+                                  stream.resources.items()}
+    optimized_stream._resource_names = dict(stream._resource_names)
+    optimized_stream.bbox_tracker = copy.deepcopy(stream.bbox_tracker)
+    return optimized_stream, \
+           OptimizationReport(n_removed, \
+                              len(str(stream)) - len(str(optimized_stream)))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Building the content of many pages in parallel, in a pool of processes
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from ._lazy import pdfrw
+
+from .pdfcompress import flateCompress
+from .pdfresources import PdfResourcePool
+from ._misc import mm2pt, newPdfPage, addResources
+
+
+def _picklable(obj):
+    # pdfrw.PdfDict can not be pickled: the resources of a page go back from
+    # the worker processes as ('PdfDict', entries, stream)
+    if isinstance(obj, pdfrw.PdfDict):
+        return ('PdfDict', [(str(key), _picklable(value)) \
+                            for key, value in obj.iteritems()], obj.stream)
+    if isinstance(obj, list):
+        return [_picklable(value) for value in obj]
+    return obj
+
+def _unpickled(obj):
+    # Object of _picklable(obj)
+    if isinstance(obj, tuple) and len(obj) == 3 and obj[0] == 'PdfDict':
+        _, entries, stream = obj
+        pdf_dict = pdfrw.PdfDict()
+        for key, value in entries:
+            pdf_dict[pdfrw.PdfName(key.lstrip('/'))] = _unpickled(value)
+        if stream is not None:
+            pdf_dict.stream = stream
+        return pdf_dict
+    if isinstance(obj, list):
+        return pdfrw.PdfArray([_unpickled(value) for value in obj])
+    return obj
+
+def _pageResources(resources, resource_pool):
+    # Resources of a page from _buildPageContent, equal ones (e.g. the same
+    # font, made again by each process) being one object in resource_pool
+    return {resource_type: {name: resource_pool.intern(\
+                                resource_type, _unpickled(resource))[1] \
+                            for name, resource in named_resources.items()} \
+            for resource_type, named_resources in resources.items()}
+
+def _buildPageContent(build_function, compress_level, argument):
+    # Runs in a worker process: only the serialized stream, the names of the
+    # shared resources used and the resources of the PdfStream itself (see
+    # useResource) go back, PdfStream itself can not be pickled
+    result = build_function(argument)
+    resource_names = None
+    if type(result) is tuple:
+        result, resource_names = result
+    resources = {resource_type: {name: _picklable(resource) for \
+                                 name, resource in named_resources.items()} \
+                 for resource_type, named_resources in \
+                 getattr(result, 'resources', {}).items()}
+    if isinstance(result, bytes):
+        stream = result.decode('latin-1')
+    else:
+        stream = str(result)
+    if compress_level is not None:
+        stream = flateCompress(stream, compress_level)
+    return stream, resource_names, resources
+
+def pageFromContent(stream, resource_names=None, shared_resources={}, \
+                    size=[0, 0, mm2pt(210), mm2pt(297)], compress_level=None, \
+                    resources={}):
+    '''New page with contents stream (already compressed if compress_level is
+not None) and Resources with the objects of shared_resources named in
+resource_names, e.g. {'Font': ['F1'], 'XObject': ['Logo']} (all of
+shared_resources if resource_names is None), and resources, e.g. the
+PdfStream.resources of stream'''
+    page = newPdfPage(size)
+    page.Contents = pdfrw.PdfDict()
+    page.Contents.stream = stream
+    if compress_level is not None:
+        page.Contents.Filter = pdfrw.PdfName('FlateDecode')
+    if resource_names is None:
+        resource_names = {resource_type: list(resources.keys()) for \
+                          resource_type, resources in shared_resources.items()}
+    if len(resource_names) > 0:
+        page.Resources = pdfrw.PdfDict()
+        for resource_type, names in resource_names.items():
+            type_resources = pdfrw.PdfDict()
+            for name in names:
+                try:
+                    type_resources[pdfrw.PdfName(name)] = \
+                        shared_resources[resource_type][name]
+                except KeyError:
+                    raise ValueError('Unknown shared resource: ' + \
+                                     str(resource_type) + ' ' + str(name))
+            page.Resources[pdfrw.PdfName(resource_type)] = type_resources
+    addResources(page, resources)
+    return page
+
+def buildPages(build_function, arguments, shared_resources={}, \
+               size=[0, 0, mm2pt(210), mm2pt(297)], compress_level=None, \
+               max_workers=None, executor=None, chunksize=1, writer=None):
+    '''Pages with contents from build_function(argument) for each argument in
+arguments, built in a pool of max_workers processes, in the order of arguments.
+build_function: a module level function (it is pickled) returning the
+                PdfStream (or its str or bytes) of a page, or a tuple of it and
+                the names of the shared resources it uses (see
+                pageFromContent). The resources of a PdfStream (see useResource, e.g. the fonts
+                of appendText) are added to its page.
+shared_resources: fonts, forms, etc. used by the pages, by resource type and
+                  name, e.g. {'XObject': {'Logo': form}}. They stay in this
+                  process and every page refers to the same objects, so
+                  pdfrw.PdfWriter writes each of them once.
+compress_level: Flate compress the streams in the worker processes
+executor: a concurrent.futures executor to use instead of the process pool
+max_workers=0 builds all pages in this process instead, with the same result.
+writer: pdfrw.PdfWriter to add the pages to, in order'''
+    build_page_content = partial(_buildPageContent, build_function, \
+                                 compress_level)
+    if executor is not None:
+        contents = list(executor.map(build_page_content, arguments, \
+                                     chunksize=chunksize))
+    elif max_workers == 0:
+        contents = list(map(build_page_content, arguments))
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            contents = list(executor.map(build_page_content, arguments, \
+                                         chunksize=chunksize))
+    resource_pool = PdfResourcePool(intern_xobjects=False)
+    pages = [pageFromContent(stream, resource_names, shared_resources, size, \
+                             compress_level, \
+                             _pageResources(resources, resource_pool)) \
+             for stream, resource_names, resources in contents]
+    if writer is not None:
+        for page in pages:
+            writer.addpage(page)
+    return pages
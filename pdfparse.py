@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Parsing of existing content streams into PdfStream commands
+# From PDF 1.7 file format specification sections 3.1, 3.2 and 4.8.6
+
+import re
+import zlib
+
+from ._lazy import pdfrw
+
+from .pdfstream import PdfStream, pdf_operator, pdf_operator_transition
+
+
+_whitespace = rb'\x00\t\n\x0c\r '
+_delimiters = rb'()<>\[\]{}/%'
+_token = re.compile(rb'''
+ (?P<space>(?:[''' + _whitespace + rb''']|%[^\r\n]*)+)
+|(?P<number>[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))
+|(?P<name>/[^''' + _whitespace + _delimiters + rb''']*)
+|(?P<dict_start><<)
+|(?P<dict_end>>>)
+|(?P<hex_string><[^>]*>)
+|(?P<array_start>\[)
+|(?P<array_end>\])
+|(?P<string_start>\()
+|(?P<keyword>[^''' + _whitespace + _delimiters + rb''']+)
+''', re.VERBOSE)
+_string_special = re.compile(rb'\\.|[()]', re.DOTALL)
+_inline_image_end = re.compile(rb'[' + _whitespace + rb']EI(?=[' + \
+                               _whitespace + rb']|$)')
+# After image data of known length
+_inline_image_end_after = re.compile(rb'[' + _whitespace + rb']*EI(?=[' + \
+                                     _whitespace + rb']|$)')
+
+class _NeedMoreData(Exception):
+    # The data ends inside the command being parsed
+    pass
+
+class _Keyword(str):
+    # An operator, or true, false or null
+    pass
+
+def _skipSpace(data, pos, at_end):
+    match = _token.match(data, pos)
+    if match is not None and match.lastgroup == 'space':
+        if match.end() == len(data) and not at_end:
+            raise _NeedMoreData()
+        return match.end()
+    return pos
+
+def _literalStringEnd(data, pos, at_end):
+    # pos is just after the opening parenthesis
+    depth = 1
+    for match in _string_special.finditer(data, pos):
+        character = data[match.start()]
+        if character == ord('('):
+            depth += 1
+        elif character == ord(')'):
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    if at_end:
+        raise ValueError('Unterminated string at ' + str(pos - 1))
+    raise _NeedMoreData()
+
+def _readObject(data, pos, at_end):
+    '''(object, end) for the object at pos (after any whitespace): int, float,
+str for names ("/Name"), strings ("(text)" or "<hex>") and dictionaries (as
+written, "<<...>>"), list for arrays, _Keyword otherwise'''
+    match = _token.match(data, pos)
+    if match is None:
+        if at_end:
+            raise ValueError('Unexpected character at ' + str(pos) + ': ' + \
+                             repr(bytes(data[pos:pos + 1])))
+        raise _NeedMoreData()
+    kind, end = match.lastgroup, match.end()
+    if end == len(data) and not at_end and \
+       kind in ['number', 'name', 'keyword']:
+        # The token might continue in data that is not read yet
+        raise _NeedMoreData()
+    if kind == 'number':
+        number = bytes(data[pos:end])
+        if b'.' in number:
+            return float(number), end
+        return int(number), end
+    if kind in ['name', 'hex_string']:
+        return str(data[pos:end], 'latin-1'), end
+    if kind == 'keyword':
+        return _Keyword(str(data[pos:end], 'latin-1')), end
+    if kind == 'string_start':
+        end = _literalStringEnd(data, end, at_end)
+        return str(data[pos:end], 'latin-1'), end
+    if kind == 'array_start':
+        array = []
+        while True:
+            end = _skipSpace(data, end, at_end)
+            if data[end:end + 1] == b']':
+                return array, end + 1
+            value, end = _readObject(data, end, at_end)
+            array.append(value)
+    if kind == 'dict_start':
+        while True:
+            end = _skipSpace(data, end, at_end)
+            if data[end:end + 2] == b'>>':
+                return str(data[pos:end + 2], 'latin-1'), end + 2
+            _, end = _readObject(data, end, at_end)
+    raise ValueError('Unexpected ' + repr(bytes(data[pos:end])) + ' at ' + \
+                     str(pos))
+
+def _inlineImage(data, pos, at_end):
+    # BI has been read: (image dictionary, image data, end after EI)
+    image_dictionary = {}
+    while True:
+        pos = _skipSpace(data, pos, at_end)
+        key, end = _readObject(data, pos, at_end)
+        if key == 'ID' and isinstance(key, _Keyword):
+            break
+        if not (type(key) is str and key.startswith('/')):
+            raise ValueError('Inline image dictionary key expected at ' + \
+                             str(pos))
+        pos = _skipSpace(data, end, at_end)
+        _, end = _readObject(data, pos, at_end)
+        image_dictionary[key] = str(data[pos:end], 'latin-1')
+        pos = end
+    # A single whitespace character follows ID
+    data_start = end + 1
+    length = image_dictionary.get('/L', image_dictionary.get('/Length'))
+    if length is not None:
+        data_end = data_start + int(length)
+        end_match = _inline_image_end_after.match(data, data_end)
+    else:
+        end_match = _inline_image_end.search(data, data_start)
+        data_end = None if end_match is None else end_match.start()
+    if end_match is None or (end_match.end() == len(data) and not at_end):
+        if at_end:
+            raise ValueError('Inline image without EI at ' + str(data_start))
+        raise _NeedMoreData()
+    return image_dictionary, str(data[data_start:data_end], 'latin-1'), \
+           end_match.end()
+
+def _stringContent(string_):
+    # Text of a string as taken by "Tj" and "TJ": between the parentheses of
+    # a literal string, hex strings written as literal strings
+    if string_.startswith('('):
+        return string_[1:-1]
+    hex_digits = re.sub(r'[^0-9A-Fa-f]', '', string_)
+    if len(hex_digits) % 2 == 1:
+        hex_digits += '0'
+    text = bytes.fromhex(hex_digits).decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(')\
+               .replace(')', '\\)').replace('\r', '\\r')
+
+def _commandOperands(operator, operands):
+    # Operands the way PdfStream.append takes them
+    if operator == 'Tj':
+        return [_stringContent(operands[0])]
+    if operator == 'TJ':
+        return [[_stringContent(value) if type(value) is str else value \
+                 for value in operands[0]]]
+    if operator == 'ri':
+        return [operands[0].lstrip('/')]
+    return operands
+
+def _parseCommand(data, pos, at_end):
+    '''(operator, operands, end) of the command at pos, or None if there is
+nothing but whitespace left'''
+    operands = []
+    while True:
+        pos = _skipSpace(data, pos, at_end)
+        if pos == len(data):
+            if not at_end:
+                raise _NeedMoreData()
+            if len(operands) > 0:
+                raise ValueError('Operands without operator at the end')
+            return None
+        value, end = _readObject(data, pos, at_end)
+        if isinstance(value, _Keyword):
+            if value in ['true', 'false', 'null']:
+                operands.append({'true': True, 'false': False, \
+                                 'null': None}[value])
+            elif value == 'BI':
+                image_dictionary, image_data, end = \
+                    _inlineImage(data, end, at_end)
+                return 'BI', [image_dictionary, image_data], end
+            else:
+                return str(value), _commandOperands(value, operands), end
+        else:
+            operands.append(value)
+        pos = end
+
+def _contentBytes(source):
+    if isinstance(source, str):
+        return source.encode('latin-1')
+    if isinstance(source, pdfrw.PdfDict):
+        return contentStreamBytes(source)
+    return source
+
+def contentStreamBytes(pdf_dict):
+    '''Decoded content stream of a page (all of its Contents) or of a form
+XObject, as bytes'''
+    if pdf_dict.Contents is not None:
+        contents = pdf_dict.Contents
+        if not isinstance(contents, list):
+            contents = [contents]
+        return b'\n'.join(contentStreamBytes(content) for content in contents)
+    stream = (pdf_dict.stream or '').encode('latin-1')
+    filters = pdf_dict.Filter
+    if filters is None:
+        return stream
+    if not isinstance(filters, list):
+        filters = [filters]
+    for filter_ in filters:
+        if filter_ in ['/FlateDecode', '/Fl'] and \
+           pdf_dict.DecodeParms is None:
+            stream = zlib.decompress(stream)
+        else:
+            raise NotImplementedError('Stream filter ' + str(filter_) + \
+                                      ' is not implemented')
+    return stream
+
+def iterContentStream(source, validation='transitions', chunk_size=65536):
+    '''Generator of the [operator, operands] commands of a content stream, the
+way PdfStream.commands has them. source: bytes-like (bytes, bytearray,
+memoryview), latin-1 str, a page or form XObject (pdfrw.PdfDict), or for very
+large streams a binary file (read chunk_size bytes at a time) or an iterable of
+bytes chunks.
+Inline images are ['BI', [image dictionary, image data]] with the image
+dictionary {key: value as written}, e.g. {'/W': '16'}, and image data as a
+latin-1 str (written back by PdfStream as "BI ... ID ... EI").
+validation: "strict" or "transitions" check the operators and state
+transitions (see pdf_operator_state), "off" does not check anything.'''
+    source = _contentBytes(source)
+    if hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), b'')
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        chunks = None
+    else:
+        chunks = iter(source)
+    data = source if chunks is None else b''
+    at_end = chunks is None
+    pos = 0
+    offset = 0
+    state = 'PageDescriptionLevel'
+    compatibility_depth = 0
+    while True:
+        try:
+            command = _parseCommand(data, pos, at_end)
+        except _NeedMoreData:
+            chunk = next(chunks, None)
+            if chunk is None:
+                at_end = True
+            else:
+                offset += pos
+                data = bytes(data[pos:]) + bytes(chunk)
+                pos = 0
+            continue
+        except ValueError as error:
+            if offset == 0:
+                raise
+            raise ValueError(str(error) + ' (offset ' + str(offset) + \
+                             ' in the stream)')
+        if command is None:
+            return
+        operator, operands, pos = command
+        if operator == 'BX':
+            compatibility_depth += 1
+        elif operator == 'EX':
+            compatibility_depth = max(0, compatibility_depth - 1)
+        if validation != 'off':
+            if operator not in pdf_operator:
+                if compatibility_depth == 0:
+                    raise ValueError('Illegal PDF operator: ' + operator)
+            else:
+                try:
+                    state = pdf_operator_transition[(state, operator)]
+                except KeyError:
+                    raise ValueError('The PDF operator ' + operator + \
+                                     ' is not allowed here.')
+        if operator == 'BI':
+            # Inline images are one command, PdfStream has three
+            yield ['BI', [operands[0]]]
+            yield ['ID', [operands[1]]]
+            yield ['EI', []]
+            if validation != 'off':
+                state = pdf_operator_transition[('InLineImageObject', 'EI')]
+        else:
+            yield [operator, operands]
+
+def parseContentStream(source, validation='transitions'):
+    '''All commands of a content stream, see iterContentStream'''
+    return list(iterContentStream(source, validation))
+
+def pdfStreamFromContent(source, validation='transitions', **kwargs):
+    '''PdfStream with the commands of an existing content stream (see
+iterContentStream), e.g. to edit it. kwargs are passed to PdfStream.'''
+    pdf_stream = PdfStream(validation=validation, **kwargs)
+    for operator, operands in iterContentStream(source, validation):
+        pdf_stream.append(operator, *operands)
+    return pdf_stream
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Deduplication of identical form XObjects by a hash of their content
+
+import hashlib
+from collections import OrderedDict
+
+from ._lazy import pdfrw
+
+
+def _canonical(obj):
+    # Stable representation of a PDF object for hashing. Streams and indirect
+    # objects (e.g. fonts and images in Resources) are the same only if they
+    # are the same object: the registry keeps them alive through its forms.
+    if isinstance(obj, pdfrw.PdfDict):
+        if obj.indirect or obj.stream is not None:
+            return ('object', id(obj))
+        return ('dict', tuple(sorted((str(key), _canonical(value)) \
+                                     for key, value in obj.iteritems())))
+    if isinstance(obj, dict):
+        return ('dict', tuple(sorted((str(pdfrw.PdfName(key.lstrip('/'))), \
+                                      _canonical(value)) \
+                                     for key, value in obj.items())))
+    if isinstance(obj, (list, tuple)):
+        return ('array', tuple(_canonical(value) for value in obj))
+    if isinstance(obj, float) and obj.is_integer():
+        # 1.0 and 1 are the same number in a PDF
+        return int(obj)
+    return obj
+
+def formFingerprint(form):
+    '''Hash of the BBox, Matrix, Resources and serialized stream of form. For
+a PdfXObjectForm with a stream from its stream commands, the uncompressed
+content is hashed instead of serializing (and compressing) it. For a
+PdfXObjectImage, its content_fingerprint.'''
+    if getattr(form, 'content_fingerprint', None) is not None:
+        return form.content_fingerprint
+    stream_hash = hashlib.sha256()
+    if getattr(form, 'pdf_stream', None) is not None and \
+       not form.stream_is_set:
+        stream_hash.update(repr((form.compress_level, form.optimize)).encode())
+        stream_hash.update(bytes(form.pdf_stream))
+    else:
+        stream_hash.update(repr(form.Filter).encode())
+        stream_hash.update((form.stream or '').encode('latin-1'))
+    description = repr((_canonical(form.BBox), \
+                        _canonical(form.Matrix or [1, 0, 0, 1, 0, 0]), \
+                        _canonical(form.Resources)))
+    return hashlib.sha256(description.encode('utf-8') + \
+                          stream_hash.digest()).hexdigest()
+
+class PdfFormRegistry:
+    '''Registry of form (and image) XObjects of one document, shared by all
+its pages
+register(form) returns a registered form with the same fingerprint (see
+formFingerprint) if there is one, else registers and returns form: using the
+returned form everywhere makes pdfrw.PdfWriter write identical forms once.
+max_size: number of forms kept, the least recently used one is dropped
+          (None for no limit)
+Registered forms should not be changed afterwards.'''
+
+    def __init__(self, max_size=1024):
+        assert max_size is None or max_size > 0, \
+            'max_size should be positive or None. Got ' + str(max_size)
+        self.max_size = max_size
+        self.forms = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self):
+        return len(self.forms)
+
+    def __contains__(self, form):
+        return formFingerprint(form) in self.forms
+
+    def register(self, form):
+        fingerprint = formFingerprint(form)
+        registered_form = self.forms.get(fingerprint)
+        if registered_form is not None:
+            self.n_hits += 1
+            self.forms.move_to_end(fingerprint)
+            return registered_form
+        self.n_misses += 1
+        form.indirect = True
+        self.forms[fingerprint] = form
+        if self.max_size is not None and len(self.forms) > self.max_size:
+            self.forms.popitem(last=False)
+        return form
+
+    def clear(self):
+        self.forms.clear()
+        self.n_hits = 0
+        self.n_misses = 0
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Resources (fonts, graphics states, patterns, XObjects, ...) of a document,
+# shared by all its pages and forms, each one under one short name
+# From PDF 1.7 file format specification sections 3.7.2 and 4.3.4
+
+from ._lazy import pdfrw
+
+from .pdfregistry import _canonical, formFingerprint
+from ._misc import resource_name_prefix
+
+
+def extGState(stroke_alpha=None, fill_alpha=None, blend_mode=None, \
+              line_width=None, **entries):
+    '''Graphics state parameter dictionary (for "gs") with the given constant
+alpha of stroking (CA) and other (ca) operations, blend mode (BM, e.g.
+'Multiply'), line width (LW) and other entries (by their PDF key)'''
+    ext_g_state = pdfrw.PdfDict(Type=pdfrw.PdfName('ExtGState'))
+    if stroke_alpha is not None:
+        ext_g_state.CA = stroke_alpha
+    if fill_alpha is not None:
+        ext_g_state.ca = fill_alpha
+    if blend_mode is not None:
+        ext_g_state.BM = pdfrw.PdfName(blend_mode.lstrip('/'))
+    if line_width is not None:
+        ext_g_state.LW = line_width
+    for key, value in entries.items():
+        ext_g_state[pdfrw.PdfName(key)] = value
+    return ext_g_state
+
+class PdfResourcePool:
+    '''Resources of one document by type and name, e.g. {'Font': {'F1':
+font}}, shared by the PdfStreams of all its pages and forms (see
+PdfStream(resource_pool=...)) so that each resource has one name and one
+object everywhere.
+intern(resource_type, resource) returns the name and object of an equal
+resource already in the pool, or adds resource under a new short name.
+Dictionaries (fonts, graphics states, patterns without streams, ...) are
+equal if their contents are. Objects with streams or already indirect are
+equal only to themselves, except XObjects if intern_xobjects: forms and
+images with the same content (see formFingerprint) are then one object.
+Interned objects should not be changed afterwards.'''
+
+    def __init__(self, intern_xobjects=True):
+        self.intern_xobjects = intern_xobjects
+        self.resources = {}
+        self.n_hits = 0
+        self.n_misses = 0
+        self._names = {}
+        self._ids = {}
+        self._counters = {}
+
+    def __len__(self):
+        return sum(len(resources) for resources in self.resources.values())
+
+    def _key(self, resource_type, resource):
+        if resource_type == 'XObject':
+            if self.intern_xobjects and isinstance(resource, pdfrw.PdfDict):
+                return ('xobject', formFingerprint(resource))
+            # Without serializing the stream of a form to compare it
+            return ('object', id(resource))
+        return _canonical(resource)
+
+    def intern(self, resource_type, resource):
+        '''(name, object) of resource in the pool, see PdfResourcePool'''
+        id_key = (resource_type, id(resource))
+        if id_key in self._ids:
+            self.n_hits += 1
+            name = self._ids[id_key]
+            return name, self.resources[resource_type][name]
+        value_key = (resource_type, self._key(resource_type, resource))
+        name = self._names.get(value_key)
+        resources = self.resources.setdefault(resource_type, {})
+        if name is not None:
+            self.n_hits += 1
+        else:
+            self.n_misses += 1
+            name = self.newName(resource_type)
+            if isinstance(resource, pdfrw.PdfDict):
+                # Written once by pdfrw.PdfWriter, however many pages use it
+                resource.indirect = True
+            resources[name] = resource
+            self._names[value_key] = name
+        # Only for the object in the pool: it is kept alive, so its id stays
+        # its own (equal ones are found by value)
+        self._ids[(resource_type, id(resources[name]))] = name
+        return name, resources[name]
+
+    def newName(self, resource_type):
+        '''New name for a resource of resource_type, e.g. 'GS3' for
+'ExtGState' (see _misc.resource_name_prefix)'''
+        resources = self.resources.setdefault(resource_type, {})
+        prefix = resource_name_prefix.get(resource_type, 'R')
+        i = self._counters.get(resource_type, 0) + 1
+        while prefix + str(i) in resources:
+            i += 1
+        self._counters[resource_type] = i
+        return prefix + str(i)
+
+    def clear(self):
+        self.resources.clear()
+        self._names.clear()
+        self._ids.clear()
+        self._counters.clear()
+        self.n_hits = 0
+        self.n_misses = 0
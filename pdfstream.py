@@ -3,20 +3,32 @@
 # From PDF 1.7 file format specification
 
 from ._misc import raiseValueError, raiseNotImplementedError,\
-                  isWithinLimits
+                  isWithinLimits, resource_name_prefix, addResources, \
+                  mm2pt, newPdfPage
 from .arc2cubic import arcCenterToCubic, arcEndpointToCubic, \
-                      ellipseToCubic, circleToCubic, custom_path_operator
+                      ellipseToCubic, circleToCubic, custom_path_operator, \
+                      toleranceInPoints
+from .pdfnumber import PdfNumberFormat, default_number_format
+from .pdfcompress import flateCompress
+from .pdfbbox import BoundingBoxTracker
+from .pdfdecimate import reducePolyline
+from .pdftext import fontMetrics, standardFont, escapeString, encodeText
+from .pdfresources import PdfResourcePool, extGState
+from ._lazy import pdfrw, numpy, isNumpyArray, LazyModule
+import zlib
 import math
+from array import array
 
+inspect = LazyModule('inspect')
 
-def _setColorNamedToString(x):
+
+def _colorCount(x):
+    return len(x) - 1 if type(x[-1]) is str else len(x)
+
+def _setColorNamedToString(x, join_numbers):
     if type(x[-1]) is str:
-        string_ = ' '.join(['{:.4f}'.format(i) for i in x[:-1]]) +  ' ' + x[-1]
-        n_color = len(x) - 1
-    else:
-        string_ = ' '.join(['{:.4f}'.format(i) for i in x])
-        n_color = len(x)
-    return string_, n_color
+        return join_numbers(x[:-1]) +  ' ' + x[-1]
+    return join_numbers(x)
 
 general_graphics_state_operators = ['w', 'J', 'j', 'M', 'd', 'ri', 'i', 'gs']
 special_graphics_state_operators = ['q', 'Q', 'cm']
@@ -33,6 +45,10 @@ color_operators = ['CS', 'cs', 'SC', 'SCN', 'sc', 'scn', \
 shading_patterns_operators = ['sh']
 inline_images_operators = ['BI', 'ID', 'EI']
 xobjects_operators = ['Do']
+# Operators with the name of a resource as first operand, by resource type:
+# PdfStream.append takes the resource itself too (see useResource)
+resource_operators = {'gs': 'ExtGState', 'Tf': 'Font', 'Do': 'XObject',
+                      'sh': 'Shading', 'CS': 'ColorSpace', 'cs': 'ColorSpace'}
 marked_content_operators = ['MP', 'DP', 'BMC', 'BDC', 'EMC']
 compatibility_operators = ['BX', 'EX']
 
@@ -81,8 +97,8 @@ pdf_operator_state = {
         'start': ['m', 're'],
         'end': dict({operator: 'PageDescriptionLevel' \
                         for operator in path_painting_operators},
-                    **{'W': 'clipping_paths_operators',
-                       'W*': 'clipping_paths_operators'}),
+                    **{'W': 'ClippingPathObject',
+                       'W*': 'ClippingPathObject'}),
         'allowed': path_construction_operators
     },
     'ClippingPathObject': {
@@ -93,43 +109,37 @@ pdf_operator_state = {
     }
 }
 
-pdf_operator = {
+def pdfOperatorTable(number_format=default_number_format, check_values=True):
+    '''Formatting function of each PDF operator, formatting numbers with
+number_format. Without checks on operator parameter values if check_values is
+False.'''
+    n = number_format.join
+    n1, n2, n3, n4, n6 = [number_format.formatter(i) for i in [1, 2, 3, 4, 6]]
+    kerning = PdfNumberFormat(2, number_format.strip_zeros).format
+    operators = {
     # General graphics state
-    'w'  : lambda line_width: '{:.4f} w'.format(line_width),
-    'J'  : lambda line_cap: '{:d} J'.format(line_cap) \
-                            if line_cap in [0,1,2] else \
-                            raiseValueError('"line cap"', line_cap),
-    'j'  : lambda line_join: '{:d} j'.format(line_join) \
-                             if line_join in [0,1,2] else \
-                             raiseValueError('"line join"', line_join),
-    'M'  : lambda miter_limit: '{:.4f} M'.format(miter_limit),
-    'd'  : lambda dash_array, dash_phase: '[' + ' '.join(['{:.4f}'.format(i) \
-                                          for i in dash_array]) + \
-                                          '] {:.4f} d'.format(dash_phase),
-    'ri' : lambda intent: intent + ' ri' if intent in \
-                          ['AbsoluteColorimetric', 'RelativeColorimetric', \
-                           'Saturation', 'Perceptual'] \
-                          else raiseValueError('"rendering intent"', intent),
-    'i'  : lambda flatness: '{:d} i'.format(flatness) \
-                            if flatness in range(101) else \
-                            raiseValueError('"flatness"', flatness),
+    'w'  : lambda line_width: n1(line_width) + ' w',
+    'J'  : lambda line_cap: '{:d} J'.format(line_cap),
+    'j'  : lambda line_join: '{:d} j'.format(line_join),
+    'M'  : lambda miter_limit: n1(miter_limit) + ' M',
+    'd'  : lambda dash_array, dash_phase: '[' + n(dash_array) + '] ' + \
+                                          n1(dash_phase) + ' d',
+    'ri' : lambda intent: intent + ' ri',
+    'i'  : lambda flatness: '{:d} i'.format(flatness),
     'gs' : lambda graphics_state_parameter_dictionary: \
                 graphics_state_parameter_dictionary + ' gs',
     # Special graphics state
     'q'  : lambda : 'q',
     'Q'  : lambda : 'Q',
-    'cm' : lambda a, b, c, d, e, f: \
-                (('{:.4f} ' * 6) + 'cm').format(a, b, c, d, e, f),
+    'cm' : lambda a, b, c, d, e, f: n6(a, b, c, d, e, f) + ' cm',
     # Path construction
-    'm'  : lambda x, y: '{:.4f} {:.4f} m'.format(x, y),
-    'l'  : lambda x, y: '{:.4f} {:.4f} l'.format(x, y),
-    'c'  : lambda x1, y1, x2, y2, x3, y3: \
-                (('{:.4f} ' * 6) + 'c').format(x1, y1, x2, y2, x3, y3),
-    'v'  : lambda x2, y2, x3, y3: (('{:.4f} ' * 4)+'v').format(x2, y2, x3, y3),
-    'y'  : lambda x1, y1, x3, y3: (('{:.4f} ' * 4)+'y').format(x1, y1, x3, y3),
+    'm'  : lambda x, y: n2(x, y) + ' m',
+    'l'  : lambda x, y: n2(x, y) + ' l',
+    'c'  : lambda x1, y1, x2, y2, x3, y3: n6(x1, y1, x2, y2, x3, y3) + ' c',
+    'v'  : lambda x2, y2, x3, y3: n4(x2, y2, x3, y3) + ' v',
+    'y'  : lambda x1, y1, x3, y3: n4(x1, y1, x3, y3) + ' y',
     'h'  : lambda : 'h',
-    're' : lambda x, y, width, height: \
-                (('{:.4f} ' * 4) + 're').format(x, y, width, height),
+    're' : lambda x, y, width, height: n4(x, y, width, height) + ' re',
     # Path painting
     'S'  : lambda : 'S',
     's'  : lambda : 's',
@@ -148,82 +158,54 @@ pdf_operator = {
     'BT' : lambda : 'BT',
     'ET' : lambda : 'ET',
     # Text state
-    'Tc' : lambda char_space: '{:.4f} Tc'.format(char_space),
-    'Tw' : lambda word_space: '{:.4f} Tw'.format(word_space),
-    'Tz' : lambda scale: '{:.4f} Tz'.format(scale),
-    'TL' : lambda leading: '{:.4f} TL'.format(leading),
-    'Tf' : lambda font_name, font_size: font_name + ' {:.4f} Tf'.format(font_size),
-    'Tr' : lambda text_rendering_mode: '{:d} Tr'.format(text_rendering_mode) \
-                                       if text_rendering_mode in range(8) else\
-                                       raiseValueError('"text rendering mode"',
-                                                       text_rendering_mode),
-    'Ts' : lambda rise: '{:.4f} Ts'.format(rise),
+    'Tc' : lambda char_space: n1(char_space) + ' Tc',
+    'Tw' : lambda word_space: n1(word_space) + ' Tw',
+    'Tz' : lambda scale: n1(scale) + ' Tz',
+    'TL' : lambda leading: n1(leading) + ' TL',
+    'Tf' : lambda font_name, font_size: font_name + ' ' + n1(font_size) + ' Tf',
+    'Tr' : lambda text_rendering_mode: '{:d} Tr'.format(text_rendering_mode),
+    'Ts' : lambda rise: n1(rise) + ' Ts',
     # Text positioning
-    'Td' : lambda tx, ty: '{:.4f} {:.4f} Td'.format(tx, ty),
-    'TD' : lambda tx, ty: '{:.4f} {:.4f} TD'.format(tx, ty),
-    'Tm' : lambda a, b, c, d, e, f: \
-                (('{:.4f} ' * 6) + 'Tm').format(a, b, c, d, e, f),
+    'Td' : lambda tx, ty: n2(tx, ty) + ' Td',
+    'TD' : lambda tx, ty: n2(tx, ty) + ' TD',
+    'Tm' : lambda a, b, c, d, e, f: n6(a, b, c, d, e, f) + ' Tm',
     'T*' : lambda : 'T*',
     # Text showing
     'Tj' : lambda string_: '(' + string_ + ') Tj',
     'TJ' : lambda array_: '[' + ' '.join(['(' + i + ')' if type(i) is str else\
-                          '{:.2f}'.format(i) for i in array_]) + '] TJ',
+                          kerning(i) for i in array_]) + '] TJ',
     "'"  : lambda string_: string_ + ' \'',
     '"'  : lambda word_space, char_space, string_: \
-                '{:.4f} {:.4f} '.format(word_space, char_space) + string_+' "',
+                n2(word_space, char_space) + ' ' + string_ + ' "',
     # Type 3 fonts
     'd0' : lambda horizontal_displacement: \
-                '{:.4f} 0 d0'.format(horizontal_displacement),
+                n1(horizontal_displacement) + ' 0 d0',
     'd1' : lambda horizontal_displacement, \
                   lower_left_x, lower_left_y, \
                   upper_right_x, upper_right_y: \
-                '{:.4f} 0 {:.4f} {:.4f} {:.4f} d0'\
-                .format(horizontal_displacement, \
-                lower_left_x, lower_left_y, upper_right_x, upper_right_y),
+                n1(horizontal_displacement) + ' 0 ' + \
+                n4(lower_left_x, lower_left_y, upper_right_x, upper_right_y) + \
+                ' d1',
     # Color
-    'CS' : lambda color_space: color_space + ' CS' if color_space in \
-                               ['/DeviceGray', '/DeviceRGB', '/DeviceCMYK', \
-                                '/Pattern'] else \
-                               raiseNotImplementedError('color space: ' + \
-                                                       color_space+' in "CS"'),
-    'cs' : lambda color_space: color_space + ' cs' if color_space in \
-                               ['/DeviceGray', '/DeviceRGB', '/DeviceCMYK', \
-                                '/Pattern'] else \
-                               raiseNotImplementedError('color space: ' + \
-                                                       color_space+' in "cs"'),
-    'SC' : lambda *x: ' '.join(['{:.4f}'.format(i) for i in x]) + ' SC' \
-                      if len(x) in [1,3,4] else raiseValueError('"SC"', x),
-    'SCN': lambda *x: _setColorNamedToString(x)[0] + ' SCN' \
-                      if _setColorNamedToString(x)[1] in [1, 3, 4] else \
-                      raiseValueError('"SCN"', x),
-    'sc' : lambda *x: ' '.join(['{:.4f}'.format(i) for i in x]) + ' sc' \
-                      if len(x) in [1,3,4] else raiseValueError('"sc"', x),
-    'scn': lambda *x: _setColorNamedToString(x)[0] + ' scn' \
-                      if _setColorNamedToString(x)[1] in [1, 3, 4] else \
-                      raiseValueError('"scn"', x),
-    'G'  : lambda gray: '{:.4f} G'.format(gray) \
-                        if isWithinLimits(gray) else \
-                        raiseValueError('gray', gray),
-    'g'  : lambda gray: '{:.4f} g'.format(gray) \
-                        if isWithinLimits(gray) else \
-                        raiseValueError('gray', gray),
-    'RG' : lambda r, g, b: '{:.4f} {:.4f} {:.4f} RG'.format(r, g, b) \
-                           if isWithinLimits([r, g, b]) else \
-                           raiseValueError('RGB', [r, g, b]),
-    'rg' : lambda r, g, b: '{:.4f} {:.4f} {:.4f} rg'.format(r, g, b) \
-                           if isWithinLimits([r, g, b]) else \
-                           raiseValueError('RGB', [r, g, b]),
-    'K'  : lambda c, m, y, k: '{:.4f} {:.4f} {:.4f} {:.4f} K'.format(c,m,y,k) \
-                              if isWithinLimits([c, m, y, k]) else \
-                              raiseValueError('CMYK', [c, m, y, k]),
-    'k'  : lambda c, m, y, k: '{:.4f} {:.4f} {:.4f} {:.4f} k'.format(c,m,y,k) \
-                              if isWithinLimits([c, m, y, k]) else \
-                              raiseValueError('CMYK', [c, m, y, k]),
+    'CS' : lambda color_space: color_space + ' CS',
+    'cs' : lambda color_space: color_space + ' cs',
+    'SC' : lambda *x: n(x) + ' SC',
+    'SCN': lambda *x: _setColorNamedToString(x, n) + ' SCN',
+    'sc' : lambda *x: n(x) + ' sc',
+    'scn': lambda *x: _setColorNamedToString(x, n) + ' scn',
+    'G'  : lambda gray: n1(gray) + ' G',
+    'g'  : lambda gray: n1(gray) + ' g',
+    'RG' : lambda r, g, b: n3(r, g, b) + ' RG',
+    'rg' : lambda r, g, b: n3(r, g, b) + ' rg',
+    'K'  : lambda c, m, y, k: n4(c, m, y, k) + ' K',
+    'k'  : lambda c, m, y, k: n4(c, m, y, k) + ' k',
     # Shading patterns
     'sh' : lambda name: name + ' sh',
     # Inline images
-    'BI' : lambda : 'BI',
-    'ID' : lambda : 'ID',
+    'BI' : lambda image_dictionary={}: ' '.join(['BI'] + \
+                [key + ' ' + value for key, value in image_dictionary.items()]),
+    'ID' : lambda image_data=None: 'ID' if image_data is None else \
+                                   'ID ' + image_data,
     'EI' : lambda : 'EI',
     # XObjects
     'Do' : lambda name: name + ' Do',
@@ -236,42 +218,483 @@ pdf_operator = {
     # Compatibility
     'BX' : lambda : 'BX',
     'EX' : lambda : 'EX'
-}
+    }
+    if not check_values:
+        return operators
+
+    def checked(operator, is_valid, item):
+        format_ = operators[operator]
+        return lambda *x: format_(*x) if is_valid(*x) else \
+                          raiseValueError(item, x[0] if len(x) == 1 \
+                                                else list(x))
+    def checkedColorSpace(operator):
+        format_ = operators[operator]
+        return lambda color_space: format_(color_space) if color_space in \
+                   ['/DeviceGray', '/DeviceRGB', '/DeviceCMYK', '/Pattern'] \
+                   else raiseNotImplementedError('color space: ' + \
+                                                color_space + ' in "' + \
+                                                operator + '"')
+    def checkedColor(operator):
+        format_ = operators[operator]
+        return lambda *x: format_(*x) if _colorCount(x) in [1, 3, 4] else \
+                          raiseValueError('"' + operator + '"', x)
+    operators.update({
+    'J'  : checked('J', lambda line_cap: line_cap in [0,1,2], '"line cap"'),
+    'j'  : checked('j', lambda line_join: line_join in [0,1,2], '"line join"'),
+    'ri' : checked('ri', lambda intent: intent in \
+                       ['AbsoluteColorimetric', 'RelativeColorimetric', \
+                        'Saturation', 'Perceptual'], '"rendering intent"'),
+    'i'  : checked('i', lambda flatness: flatness in range(101), '"flatness"'),
+    'Tr' : checked('Tr', lambda text_rendering_mode: \
+                             text_rendering_mode in range(8), \
+                   '"text rendering mode"'),
+    'CS' : checkedColorSpace('CS'),
+    'cs' : checkedColorSpace('cs'),
+    'SC' : checkedColor('SC'),
+    'SCN': checkedColor('SCN'),
+    'sc' : checkedColor('sc'),
+    'scn': checkedColor('scn'),
+    'G'  : checked('G', lambda gray: isWithinLimits(gray), 'gray'),
+    'g'  : checked('g', lambda gray: isWithinLimits(gray), 'gray'),
+    'RG' : checked('RG', lambda *rgb: isWithinLimits(list(rgb)), 'RGB'),
+    'rg' : checked('rg', lambda *rgb: isWithinLimits(list(rgb)), 'RGB'),
+    'K'  : checked('K', lambda *cmyk: isWithinLimits(list(cmyk)), 'CMYK'),
+    'k'  : checked('k', lambda *cmyk: isWithinLimits(list(cmyk)), 'CMYK'),
+    })
+    return operators
+
+pdf_operator = pdfOperatorTable()
+# Same as pdf_operator, without the checks on operator parameter values
+pdf_operator_unchecked = pdfOperatorTable(check_values=False)
+
+_pdf_operator_tables = {(4, False, True): pdf_operator,
+                        (4, False, False): pdf_operator_unchecked}
+
+def _pdfOperatorTable(number_format, check_values):
+    # One table for each number format and check, made when first used
+    key = (number_format.precision, number_format.strip_zeros, check_values)
+    if key not in _pdf_operator_tables:
+        _pdf_operator_tables[key] = pdfOperatorTable(number_format, \
+                                                     check_values)
+    return _pdf_operator_tables[key]
+
+def _compileOperatorTransitions(operator_state):
+    '''{(state, operator): new_state} for every operator allowed in a state.
+States that end with None (shading and external objects) are left right away,
+so their start operators keep the current state. Operators of no state
+(compatibility sections, Type 3 glyph metrics) are allowed in any state.'''
+    transitions = {}
+    for state, state_info in operator_state.items():
+        for operator in state_info['allowed']:
+            transitions[(state, operator)] = state
+        for operator, new_state in state_info['end'].items():
+            if operator is None:
+                continue
+            if None in operator_state[new_state]['end'].keys():
+                new_state = state
+            transitions[(state, operator)] = new_state
+    stateful_operators = set(operator for _, operator in transitions)
+    for state in operator_state.keys():
+        for operator in compatibility_operators + type_3_fonts_operators:
+            if operator not in stateful_operators:
+                transitions[(state, operator)] = state
+    return transitions
+
+pdf_operator_transition = _compileOperatorTransitions(pdf_operator_state)
+
+# Operators taking a fixed number of numbers only: these can be formatted in
+# bulk (PdfStream.appendArray)
+numeric_operator_operand_count = {
+    'w': 1, 'M': 1, 'cm': 6, 'm': 2, 'l': 2, 'c': 6, 'v': 4, 'y': 4, 're': 4,
+    'Tc': 1, 'Tw': 1, 'Tz': 1, 'TL': 1, 'Ts': 1, 'Td': 2, 'TD': 2, 'Tm': 6,
+    'G': 1, 'g': 1, 'RG': 3, 'rg': 3, 'K': 4, 'k': 4}
+
+_color_value_names = {'G': 'gray', 'g': 'gray', 'RG': 'RGB', 'rg': 'RGB', \
+                      'K': 'CMYK', 'k': 'CMYK'}
+
+def _numericOperandsCheck(operator, n_operands, check_values):
+    # Takes the place of the formatter of a numeric operator in a compact
+    # PdfStream: the same checks, no formatting (returns None)
+    def check(*x):
+        if len(x) != n_operands:
+            raise TypeError('"' + operator + '" takes ' + str(n_operands) + \
+                            ' operands. Got ' + str(len(x)))
+        if check_values and operator in _color_value_names and \
+           not isWithinLimits(list(x)):
+            raiseValueError(_color_value_names[operator], \
+                            x[0] if len(x) == 1 else list(x))
+    return check
+
+_compact_operator_tables = {}
+
+def _compactOperatorTable(number_format, check_values):
+    # Operator table of a compact PdfStream: numeric operators are formatted
+    # later, in bulk, from CompactCommands
+    key = (number_format.precision, number_format.strip_zeros, check_values)
+    if key not in _compact_operator_tables:
+        operators = dict(_pdfOperatorTable(number_format, check_values))
+        for operator, n_operands in numeric_operator_operand_count.items():
+            operators[operator] = _numericOperandsCheck(operator, n_operands, \
+                                                        check_values)
+        _compact_operator_tables[key] = operators
+    return _compact_operator_tables[key]
+
+# strict: check operators, state transitions and operator parameter values
+# transitions: check operators and state transitions only
+# off: no checks, for trusted generators
+validation_levels = ['strict', 'transitions', 'off']
+
+class _ContentSink:
+    # Takes the place of PdfStream.content in a streaming PdfStream: the lines
+    # are written to sink, encoded (and compressed if compress_level is not
+    # None), about buffer_size bytes at a time
+
+    def __init__(self, sink, buffer_size, compress_level=None):
+        if hasattr(sink, 'write'):
+            self._write = sink.write
+        elif hasattr(sink, 'send'):
+            if inspect.isgenerator(sink) and \
+               inspect.getgeneratorstate(sink) == inspect.GEN_CREATED:
+                # Run to its first yield, where it can be sent the chunks
+                next(sink)
+            self._write = sink.send
+        else:
+            self._write = sink
+        self.buffer_size = buffer_size
+        self.compressor = None if compress_level is None else \
+                          zlib.compressobj(compress_level)
+        self.buffer = []
+        self.buffer_length = 0
+        self.has_content = False
+        self.n_bytes_written = 0
+
+    def append(self, line):
+        self.buffer.append(line)
+        self.buffer_length += len(line) + 1
+        if self.buffer_length >= self.buffer_size:
+            self.flush()
+
+    def extend(self, lines):
+        self.buffer.extend(lines)
+        self.buffer_length += sum(map(len, lines)) + len(lines)
+        if self.buffer_length >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            chunk = '\n'.join(self.buffer)
+            if self.has_content:
+                chunk = '\n' + chunk
+            self.has_content = True
+            chunk = chunk.encode('latin-1')
+            if self.compressor is not None:
+                chunk = self.compressor.compress(chunk)
+            self._writeChunk(chunk)
+            self.buffer = []
+            self.buffer_length = 0
+
+    def close(self):
+        self.flush()
+        if self.compressor is not None:
+            self._writeChunk(self.compressor.flush())
+            self.compressor = None
+
+    def _writeChunk(self, chunk):
+        if len(chunk) > 0:
+            self._write(chunk)
+            self.n_bytes_written += len(chunk)
+
+    def __iter__(self):
+        raise ValueError('The content of a streaming PdfStream is written ' + \
+                         'to its sink')
+
+class _NoCommands(list):
+    # Takes the place of PdfStream.commands when they are not kept
+    def append(self, command):
+        pass
+
+    def extend(self, commands):
+        pass
+
+class CompactCommands:
+    '''Commands of a compact PdfStream: an opcode for each command, the
+operands of numeric operators (see numeric_operator_operand_count) in one
+float64 buffer with the offset of the first operand of each command, and the
+content line and command of the other (less frequent) commands. Read only,
+it can be used like the list of commands of a PdfStream, each command being
+[operator, operands] (with the numbers as floats for numeric operators).'''
+    __slots__ = ('operators', 'operator_codes', 'opcodes', 'operands', \
+                 'offsets', 'other_commands', 'number_format', '_line')
+
+    def __init__(self, number_format=default_number_format):
+        self.operators = []
+        self.operator_codes = {}
+        self.opcodes = array('H')
+        self.operands = array('d')
+        self.offsets = array('q', [0])
+        # {command index: (content line or None, command)}
+        self.other_commands = {}
+        self.number_format = number_format
+        self._line = None
+
+    def _opcode(self, operator):
+        if operator not in self.operator_codes:
+            self.operator_codes[operator] = len(self.operators)
+            self.operators.append(operator)
+        return self.operator_codes[operator]
+
+    def append(self, command):
+        # Used by PdfStream, after the content line (None for numeric
+        # operators, formatted later) is given to _CompactContent
+        operator = command[0]
+        if self._line is None and operator in numeric_operator_operand_count:
+            self.operands.extend(command[1])
+        else:
+            self.other_commands[len(self.opcodes)] = (self._line, command)
+            self._line = None
+        self.opcodes.append(self._opcode(operator))
+        self.offsets.append(len(self.operands))
+
+    def extend(self, commands):
+        for command in commands:
+            self.append(command)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index in self.other_commands:
+            return self.other_commands[index][1]
+        return [self.operators[self.opcodes[index]], \
+                tuple(self.operands[self.offsets[index]:\
+                                    self.offsets[index + 1]])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return list(self).__repr__()
+
+    def contentLines(self):
+        '''Content lines of all commands, formatting the numeric operators in
+one pass from the operand buffer'''
+        n_commands = len(self.opcodes)
+        lines = [None] * n_commands
+        is_numeric = numpy.ones(n_commands, dtype=bool)
+        for i, (line, _) in self.other_commands.items():
+            lines[i] = line
+            is_numeric[i] = False
+        if numpy.any(is_numeric):
+            offsets = numpy.frombuffer(self.offsets, dtype=numpy.int64)
+            operators = numpy.array(self.operators)\
+                [numpy.frombuffer(self.opcodes, dtype=numpy.uint16)[is_numeric]]
+            numeric_lines = self.number_format.formatOperations(\
+                numpy.frombuffer(self.operands, dtype=numpy.float64), \
+                numpy.diff(offsets)[is_numeric], operators)\
+                .decode('latin-1').split('\n')
+            for i, line in zip(numpy.flatnonzero(is_numeric).tolist(), \
+                               numeric_lines):
+                lines[i] = line
+        return [line for line in lines if line is not None]
+
+class _CompactContent:
+    # Takes the place of PdfStream.content in a compact PdfStream: the
+    # content is made from its CompactCommands when it is read
+    __slots__ = ('commands',)
+
+    def __init__(self, commands):
+        self.commands = commands
+
+    def append(self, line):
+        self.commands._line = line
+
+    def __iter__(self):
+        return iter(self.commands.contentLines())
+
+    def __len__(self):
+        return len(self.commands.contentLines())
 
 class PdfStream:
 
-    def __init__(self):
+    def __init__(self, validation='strict', number_format=None, \
+                 sink=None, buffer_size=65536, keep_commands=True, \
+                 compress_level=None, compact=False, track_bbox=False, \
+                 resource_pool=None):
+        '''validation: one of validation_levels
+number_format: PdfNumberFormat, usually shared by all streams of a document
+               (default: 4 digits after the decimal point, zeros kept)
+sink: binary file-like object, generator (sent the chunks, started here if
+      it is not yet) or function to stream the content to, encoded, in
+      chunks of about buffer_size bytes, instead of keeping it in content.
+      Call close() after the last append.
+keep_commands: keep the history of appended commands in commands
+compress_level: zlib level (0-9) to Flate compress the content with in
+                toPdfDict and when streaming to sink, None to not compress
+compact: keep the commands in a CompactCommands and make the content from it
+         when it is read (str, bytes, toPdfDict), instead of keeping a list
+         of commands and a list of content lines (not with sink)
+track_bbox: keep the bounding box of what is painted up to date in
+            bbox_tracker (see BoundingBoxTracker and bbox)
+resource_pool: PdfResourcePool naming the resources of this stream, shared
+               by all pages and forms of a document (by default, one of this
+               stream only, interning XObjects only by identity)'''
+        if validation not in validation_levels:
+            raiseValueError('validation', validation)
+        self.validation = validation
+        if number_format is None:
+            number_format = default_number_format
+        self.number_format = number_format
+        self._operator_formatter = _pdfOperatorTable(number_format, \
+                                                     validation == 'strict')
         self.current_state = 'PageDescriptionLevel'
-        self.content = []
-        self.commands = []
+        self.compress_level = compress_level
+        self.content = [] if sink is None else \
+                       _ContentSink(sink, buffer_size, compress_level)
+        self.commands = [] if keep_commands else _NoCommands()
+        if compact:
+            if sink is not None or not keep_commands:
+                raise ValueError('A compact PdfStream keeps its commands ' + \
+                                 'and can not stream to a sink')
+            self._operator_formatter = _compactOperatorTable(\
+                number_format, validation == 'strict')
+            self.commands = CompactCommands(number_format)
+            self.content = _CompactContent(self.commands)
         self.last_point = None
+        # {resource type: {name: object}} of the resources used by name (see
+        # useResource), to add to the page or form (see addResourcesTo)
+        self.resources = {}
+        self._resource_names = {}
+        self.resource_pool = PdfResourcePool(intern_xobjects=False) \
+                             if resource_pool is None else resource_pool
+        self.bbox_tracker = BoundingBoxTracker() if track_bbox else None
+
+    def flush(self):
+        '''Write the buffered content of a streaming PdfStream to its sink'''
+        if isinstance(self.content, _ContentSink):
+            self.content.flush()
+
+    def close(self):
+        '''Write the rest of the content of a streaming PdfStream to its sink,
+ending the compressed data if compressed'''
+        if isinstance(self.content, _ContentSink):
+            self.content.close()
+
+    def toPdfDict(self, **kwargs):
+        '''pdfrw.PdfDict(**kwargs) with this content as its stream (e.g. for
+page.Contents), Flate compressed if compress_level is not None'''
+        pdf_dict = pdfrw.PdfDict(**kwargs)
+        if self.compress_level is None:
+            pdf_dict.stream = str(self)
+        else:
+            pdf_dict.stream = flateCompress(str(self), self.compress_level)
+            pdf_dict.Filter = pdfrw.PdfName('FlateDecode')
+        return pdf_dict
+
+    def useResource(self, resource_type, resource, name=None):
+        '''PDF name ("/Name") for resource (e.g. a PdfXObjectForm for
+resource_type 'XObject') in this stream: name if given, else the name it
+already has or its name in resource_pool (where an equal resource already
+there is used instead of it, see PdfResourcePool)'''
+        if name is None:
+            name = self._resource_names.get((resource_type, id(resource)))
+        if name is not None:
+            name = name.lstrip('/')
+        resources = self.resources.setdefault(resource_type, {})
+        if name is None:
+            name, resource = self.resource_pool.intern(resource_type, resource)
+            if resources.get(name, resource) is not resource:
+                # Taken here by a resource named explicitly
+                i = len(resources) + 1
+                while resource_name_prefix.get(resource_type, 'R') + \
+                      str(i) in resources:
+                    i += 1
+                name = resource_name_prefix.get(resource_type, 'R') + str(i)
+        else:
+            _, resource = self.resource_pool.intern(resource_type, resource)
+            if name in resources and resources[name] is not resource:
+                raise ValueError('Another resource is already named ' + \
+                                 name + ' in ' + resource_type)
+        resources[name] = resource
+        # resource is kept alive in resources, so its id stays its own
+        self._resource_names[(resource_type, id(resource))] = name
+        return '/' + name
+
+    def appendExtGState(self, stroke_alpha=None, fill_alpha=None, \
+                        blend_mode=None, line_width=None, **entries):
+        '''Append "gs" with a graphics state parameter dictionary of these
+parameters (see pdfresources.extGState), one object and name for all equal
+ones in resource_pool'''
+        self.append('gs', self.useResource('ExtGState', extGState(\
+            stroke_alpha, fill_alpha, blend_mode, line_width, **entries)))
+
+    def toPdfPage(self, size=[0, 0, mm2pt(210), mm2pt(297)]):
+        '''New page (see newPdfPage) with this content (see toPdfDict) and
+the resources it uses'''
+        page = newPdfPage(size)
+        page.Contents = self.toPdfDict()
+        self.addResourcesTo(page)
+        return page
+
+    def addResourcesTo(self, pdf_dict):
+        '''Add the resources used by name in this stream (see useResource) to
+the Resources of pdf_dict, a page or form XObject'''
+        return addResources(pdf_dict, self.resources)
 
     def isOperatorAllowed(self, operator):
-        all_allowed_operators = pdf_operator_state[self.current_state]\
-                                    ['allowed'] + \
-                                list(pdf_operator_state[self.current_state]\
-                                     ['end'].keys())
-        return operator in all_allowed_operators
+        return (self.current_state, operator) in pdf_operator_transition
 
     def append(self, operator, *operator_parameters):
-        if operator not in pdf_operator.keys():
+        try:
+            operator_formatter = self._operator_formatter[operator]
+        except (KeyError, TypeError):
             raise ValueError('Illegal PDF operator: ' + str(operator))
-        if self.isOperatorAllowed(operator):
-            self.content.append(pdf_operator[operator](*operator_parameters))
-            new_state = self.current_state
-            if operator in pdf_operator_state[self.current_state]['end'].keys():
-                new_state = pdf_operator_state[self.current_state]['end'][operator]
-                if None in pdf_operator_state[new_state]['end'].keys():
-                    new_state = self.current_state
-            self.current_state = new_state
-            if new_state == 'PathObject':
-                self.last_point = operator_parameters[-2:]
-            else:
-                self.last_point = None
+        if self.validation == 'off':
+            new_state = pdf_operator_transition.get(\
+                            (self.current_state, operator), self.current_state)
         else:
-            raise ValueError('The PDF operator ' + operator + \
-                             ' is not allowed here.')
+            try:
+                new_state = pdf_operator_transition[(self.current_state, \
+                                                     operator)]
+            except KeyError:
+                raise ValueError('The PDF operator ' + operator + \
+                                 ' is not allowed here.')
+        if operator in resource_operators and \
+           len(operator_parameters) > 0 and \
+           not isinstance(operator_parameters[0], str):
+            # A resource object instead of its name
+            operator_parameters = (self.useResource(\
+                resource_operators[operator], operator_parameters[0]),) + \
+                operator_parameters[1:]
+        self.content.append(operator_formatter(*operator_parameters))
+        self.current_state = new_state
+        if new_state == 'PathObject':
+            self.last_point = operator_parameters[-2:]
+        else:
+            self.last_point = None
         self.commands.append([operator, operator_parameters])
+        if self.bbox_tracker is not None:
+            self.bbox_tracker.update(operator, operator_parameters, \
+                                     self.resources)
+
+    @property
+    def bbox(self):
+        '''[x_min, y_min, x_max, y_max] of what is painted so far (None if
+nothing is), for a PdfStream made with track_bbox=True and painting no text
+or shading (see BoundingBoxTracker)'''
+        if self.bbox_tracker is None:
+            raise ValueError('The bounding box of a PdfStream is only ' + \
+                             'tracked with track_bbox=True')
+        if len(self.bbox_tracker.unbounded_painted) > 0:
+            raise ValueError('The bounding box of text and shadings is ' + \
+                             'not tracked. Painted with: ' + \
+                             ' '.join(sorted(\
+                                 self.bbox_tracker.unbounded_painted)))
+        return self.bbox_tracker.bbox
 
     def appendCustomPath(self, path_type, *path_parameters, **path_kwargs):
         '''path_type should be one of ['Arc', 'ArcCenter', 'Ellipse', 'Circle']
@@ -279,7 +702,10 @@ path_parameters and path_kwargs for:
 Arc : x0, y0, x3, y3, rx, ry, x_axis_rotation=0, large_arc=True, sweep=True
 ArcCenter: cx, cy, rx, ry, theta_1, delta_theta, x_axis_rotation=0
 Ellipse: cx, cy, rx, ry, x_axis_rotation=0
-Circle: cx, cy, r'''
+Circle: cx, cy, r
+All of them also take tolerance=None, dpi=None: the largest distance allowed
+from the exact curve, in points or in device pixels at dpi, to use as few
+segments as possible ("l" where straight lines are enough).'''
         if path_type in custom_path_operator.keys():
             assert (self.current_state in \
                 custom_path_operator[path_type]['allowed']), \
@@ -294,21 +720,349 @@ Circle: cx, cy, r'''
             if custom_path_operator[path_type]['prepend_move_to']:
                 self.append('m', *cubic[0][0])
             for cubic_segment in cubic:
-                self.append('c', *cubic_segment[1], *cubic_segment[2], \
-                            *cubic_segment[3],)
+                if len(cubic_segment) == 2:
+                    self.append('l', *cubic_segment[1])
+                else:
+                    self.append('c', *cubic_segment[1], *cubic_segment[2], \
+                                *cubic_segment[3],)
             self.commands.append([path_type + ':End'])
         else:
             raise NotImplementedError('PDF custom path of type: ' + \
                                       path_type + ' is not implemented')
 
+    def appendCustomPaths(self, path_type, *path_parameters, **path_kwargs):
+        '''Bulk version of appendCustomPath
+path_parameters and path_kwargs are the same as for appendCustomPath, but each
+may be a sequence or numpy array (broadcast against each other). One custom
+path is appended per element, with the same result as calling
+appendCustomPath for each of them in order.'''
+        if path_type not in custom_path_operator.keys():
+            raise NotImplementedError('PDF custom path of type: ' + \
+                                      path_type + ' is not implemented')
+        path_operator = custom_path_operator[path_type]
+        assert (self.current_state in path_operator['allowed']), \
+            'Custom path of type "' + path_type + \
+            '" is not allowed in the current state: ' + self.current_state
+        # Unset keyword arguments (e.g. tolerance=None) are not broadcast
+        none_kwargs = {name: value for name, value in path_kwargs.items() \
+                       if value is None}
+        path_kwargs = {name: value for name, value in path_kwargs.items() \
+                       if value is not None}
+        kwarg_names = list(path_kwargs.keys())
+        values = numpy.broadcast_arrays(*[numpy.asarray(value) for value in \
+                                          path_parameters + \
+                                          tuple(path_kwargs.values())])
+        values = [value.ravel().tolist() for value in values]
+        path_parameters = values[:len(path_parameters)]
+        path_kwargs_list = values[len(path_parameters):]
+        n_paths = len(values[0]) if len(values) > 0 else 0
+        if n_paths == 0:
+            return
+        if path_operator['send_last_point_to_function']:
+            # Each path starts where the previous one ended
+            x0 = [self.last_point[0]] + path_parameters[0][:-1]
+            y0 = [self.last_point[1]] + path_parameters[1][:-1]
+            path_parameters = [x0, y0] + path_parameters
+        cubic, n_segments = path_operator['to_cubic_array_function']\
+            (*path_parameters, **dict(zip(kwarg_names, path_kwargs_list)), \
+             **none_kwargs)
+        if self.bbox_tracker is not None:
+            self.bbox_tracker.updateCubics(cubic, \
+                cubic[-int(n_segments[-1]), 0].tolist() \
+                if path_operator['prepend_move_to'] else None)
+        # Operations of all paths in order: "m" (if prepended) and "c"s, or
+        # "l"s for straight line segments
+        n_operations = n_segments + path_operator['prepend_move_to']
+        first_operation = numpy.cumsum(n_operations) - n_operations
+        is_move_to = numpy.zeros(n_operations.sum(), dtype=bool)
+        if path_operator['prepend_move_to']:
+            is_move_to[first_operation] = True
+        is_line_segment = numpy.all((cubic[:, 1] == cubic[:, 0]) & \
+                                    (cubic[:, 2] == cubic[:, 3]), axis=-1)
+        is_line_to = numpy.zeros(len(is_move_to), dtype=bool)
+        is_line_to[~is_move_to] = is_line_segment
+        is_curve_to = ~is_move_to & ~is_line_to
+        counts = numpy.where(is_curve_to, 6, 2)
+        values = numpy.empty(counts.sum())
+        first_value = numpy.cumsum(counts) - counts
+        values[first_value[is_curve_to, None] + numpy.arange(6)] = \
+            cubic[~is_line_segment, 1:, :].reshape(-1, 6)
+        values[first_value[is_line_to, None] + numpy.arange(2)] = \
+            cubic[is_line_segment, 3, :]
+        if path_operator['prepend_move_to']:
+            values[first_value[is_move_to, None] + numpy.arange(2)] = \
+                cubic[numpy.cumsum(n_segments) - n_segments, 0, :]
+        operators = numpy.where(is_move_to, 'm', \
+                                numpy.where(is_line_to, 'l', 'c'))
+        operands = self._extendContent(operators, values, counts)
+        operators = operators.tolist()
+        for i, first_operation_i in enumerate(first_operation.tolist()):
+            self.commands.append([path_type + ':Start', \
+                                  tuple(value[i] for value in path_parameters), \
+                                  dict({name: value[i] for name, value in \
+                                        zip(kwarg_names, path_kwargs_list)}, \
+                                       **none_kwargs)])
+            for operation in range(first_operation_i, \
+                                   first_operation_i + int(n_operations[i])):
+                self.commands.append([operators[operation], \
+                                      operands[operation]])
+            self.commands.append([path_type + ':End'])
+        self.current_state = 'PathObject'
+        self.last_point = operands[-1][-2:]
+
+    def appendArray(self, operator, operands):
+        '''Append operator once for each row of operands, an array of shape
+(number of operations, number of operands of operator), formatting the numbers
+of all operations in one pass. For operators with only numeric operands, e.g.
+stream.appendArray('l', xy) for a polyline.'''
+        operands = numpy.asarray(operands, dtype=float)
+        if operands.ndim == 1:
+            operands = operands[:, None]
+        if len(operands) == 0:
+            return
+        self.append(operator, *operands[0].tolist())
+        operands = operands[1:]
+        if (numeric_operator_operand_count.get(operator) != \
+                operands.shape[1]) or \
+           (pdf_operator_transition.get((self.current_state, operator)) != \
+                self.current_state) or \
+           (self.validation == 'strict' and operator in color_operators and \
+                not numpy.all((operands >= 0) & (operands <= 1))):
+            # Not a bulk operation: let append check and raise as usual
+            for row in operands.tolist():
+                self.append(operator, *row)
+            return
+        if len(operands) == 0:
+            return
+        operands = self._extendContent(operator, operands.ravel(), \
+                                       numpy.full(len(operands), \
+                                                  operands.shape[1]))
+        self.commands.extend([[operator, row] for row in operands])
+        if self.current_state == 'PathObject':
+            self.last_point = operands[-1][-2:]
+        if self.bbox_tracker is not None:
+            self.bbox_tracker.updateArray(operator, operands, self.resources)
+
+    def appendPolyline(self, xy, tolerance=None, dpi=None, clip_box=None, \
+                       margin=0, method='rdp'):
+        '''Append the polyline xy (shape (n, 2)) as "m" and "l"s, with fewer
+vertices where that is not visible (see reducePolyline), before any number is
+formatted.
+tolerance, dpi: the largest distance allowed from xy, in points or in device
+                pixels at dpi, e.g. tolerance=0.5, dpi=300 (not decimated if
+                None). In user space: scale it by any "cm" in effect.
+clip_box: [x_min, y_min, x_max, y_max] outside which nothing is drawn (e.g.
+          the MediaBox of the page, in user space): segments that can not be
+          seen are left out, splitting the polyline into subpaths. Only for
+          stroked polylines, grown by margin (e.g. half the line width).
+method: 'rdp' (Ramer-Douglas-Peucker) or 'minmax' (binning, for monotonic x)
+Returns the number of subpaths appended: with clip_box it can be 0, when no
+path is started and the caller should not paint it (e.g. with "S").'''
+        if tolerance is not None:
+            tolerance = toleranceInPoints(tolerance, dpi)
+        subpaths = reducePolyline(xy, tolerance, clip_box, margin, method)
+        for subpath in subpaths:
+            self.append('m', *subpath[0].tolist())
+            self.appendArray('l', subpath[1:])
+        return len(subpaths)
+
+    def appendText(self, text, x, y, font, size, width=None, leading=None, \
+                   name=None, metrics=None, kerning=True):
+        '''Append text at (x, y) (the baseline of its first line) in a text
+object: "BT", "Tf", "Td" and, for each line, one "TJ" with its kerning (or
+"Tj" if there is none), escaped, then "ET".
+font: font dictionary or standard 14 font name (see pdftext.standardFont),
+      added to the resources of this stream (see useResource), as name if
+      given
+width: break lines at spaces to fit in width (lines are only broken at
+       newlines if None)
+leading: distance between baselines (1.2 * size by default)
+metrics: FontMetrics of font (from pdftext.fontMetrics by default)
+Raises a ValueError for text with characters not in WinAnsiEncoding.'''
+        # Checked before anything is appended
+        encodeText(text)
+        if metrics is None:
+            metrics = fontMetrics(font)
+        if isinstance(font, str):
+            font = standardFont(font)
+        font_name = self.useResource('Font', font, name)
+        if width is None:
+            lines = text.split('\n')
+        else:
+            lines = metrics.breakLines(text, size, width, kerning)
+        self.append('BT')
+        self.append('Tf', font_name, size)
+        if len(lines) > 1:
+            self.append('TL', 1.2 * size if leading is None else leading)
+        self.append('Td', x, y)
+        for i, line in enumerate(lines):
+            if i > 0:
+                self.append('T*')
+            run = metrics.kernedRun(line) if kerning else [escapeString(line)]
+            if len(run) == 1:
+                self.append('Tj', run[0])
+            else:
+                self.append('TJ', run)
+        self.append('ET')
+
+    def appendImage(self, image, x, y, width, height, name=None):
+        '''Draw image (e.g. a PdfXObjectImage) in the rectangle from (x, y)
+of width and height, as "q cm /Name Do Q". image is added to the resources
+of this stream (see useResource), as name if given.'''
+        name = self.useResource('XObject', image, name)
+        self.append('q')
+        self.append('cm', width, 0, 0, height, x, y)
+        self.append('Do', name)
+        self.append('Q')
+
+    def appendInstances(self, form, x, y, scale=1, rotation=0, colors=None, \
+                        name=None, inline=None):
+        '''Place an instance of form (e.g. a marker drawn once in a
+PdfXObjectForm) at each (x, y), as "q cm /Name Do Q". x, y, scale and rotation
+(in radians, counterclockwise) may be numbers or arrays (broadcast against
+each other). colors: nonstroking color of each instance, for forms that do
+not set it, an array of shape (n,) for gray, (n, 3) for RGB or (n, 4) for
+CMYK. form is added to the resources of this stream (see useResource), as
+name if given.
+inline: write the content of form (a PdfXObjectForm) itself instead of "Do"
+        (without clipping to its BBox). By default, when that is smaller.'''
+        x, y, scale, rotation = [value.ravel() for value in \
+            numpy.broadcast_arrays(*[numpy.asarray(value, dtype=float) \
+                                     for value in (x, y, scale, rotation)])]
+        n_instances = len(x)
+        if n_instances == 0:
+            return
+        if not self.isOperatorAllowed('q'):
+            raise ValueError('The PDF operator q is not allowed here.')
+        cos_rotation, sin_rotation = numpy.cos(rotation), numpy.sin(rotation)
+        tm = numpy.stack([scale * cos_rotation, scale * sin_rotation, \
+                          0 - scale * sin_rotation, scale * cos_rotation, \
+                          x, y], axis=1)
+        color_operator = None
+        if colors is not None:
+            colors = numpy.asarray(colors, dtype=float)
+            if colors.ndim < 2:
+                colors = colors.reshape(-1, 1)
+            colors = numpy.broadcast_to(colors, \
+                                        (n_instances, colors.shape[-1]))
+            color_operator = {1: 'g', 3: 'rg', 4: 'k'}.get(colors.shape[-1])
+            if color_operator is None:
+                raiseValueError('colors', 'shape ' + str(colors.shape))
+            if self.validation == 'strict' and \
+               not numpy.all((colors >= 0) & (colors <= 1)):
+                raiseValueError('colors', 'outside [0, 1]')
+
+        form_tm = tm
+        if form.Matrix is not None:
+            # What Do does: form matrix, then the instance matrix
+            a, b, c, d, e, f = [float(value) for value in form.Matrix]
+            form_tm = numpy.stack([a * tm[:, 0] + b * tm[:, 2], \
+                                   a * tm[:, 1] + b * tm[:, 3], \
+                                   c * tm[:, 0] + d * tm[:, 2], \
+                                   c * tm[:, 1] + d * tm[:, 3], \
+                                   e * tm[:, 0] + f * tm[:, 2] + tm[:, 4], \
+                                   e * tm[:, 1] + f * tm[:, 3] + tm[:, 5]], \
+                                  axis=1)
+
+        form_stream = getattr(form, 'pdf_stream', None)
+        if inline is None:
+            inline = form_stream is not None and \
+                     form.Resources is None and \
+                     len(str(form_stream)) <= len(name or 'X1') + 4
+        if inline:
+            if form_stream is None:
+                raise ValueError('Only a PdfXObjectForm can be inlined')
+            body_lines = list(form_stream.content)
+            # Without the custom path start and end, which have no line
+            body_commands = [command for command in form_stream.commands \
+                             if command[0] in pdf_operator]
+            if form.Resources is not None:
+                for resource_type, resources in form.Resources.iteritems():
+                    for resource_name, resource in resources.iteritems():
+                        self.useResource(resource_type.lstrip('/'), \
+                                         resource, resource_name)
+            tm = form_tm
+        else:
+            name = self.useResource('XObject', form, name)
+            body_lines = None
+            body_commands = [['Do', (name,)]]
+
+        if isinstance(self.content, _CompactContent):
+            # Numbers are formatted later by CompactCommands anyway
+            for i in range(n_instances):
+                self.append('q')
+                self.append('cm', *tm[i].tolist())
+                if color_operator is not None:
+                    self.append(color_operator, *colors[i].tolist())
+                for operator, operands in body_commands:
+                    self.append(operator, *operands)
+                self.append('Q')
+            return
+
+        # Lines (and commands) of all instances, interleaved. "q", "Do" and
+        # "Q" are formatted for each instance, like with append.
+        format_ = self._operator_formatter
+        n_lines = 3 + (color_operator is not None) + len(body_commands)
+        lines = [None] * (n_lines * n_instances)
+        commands = [None] * (n_lines * n_instances)
+        lines[0::n_lines] = [format_['q']() for _ in range(n_instances)]
+        commands[0::n_lines] = [['q', ()] for _ in range(n_instances)]
+        lines[1::n_lines] = self._formatOperations(\
+            'cm', tm.ravel(), numpy.full(n_instances, 6))
+        commands[1::n_lines] = [['cm', tuple(row)] for row in tm.tolist()]
+        first_body_line = 2
+        if color_operator is not None:
+            lines[2::n_lines] = self._formatOperations(\
+                color_operator, colors.ravel(), \
+                numpy.full(n_instances, colors.shape[-1]))
+            commands[2::n_lines] = [[color_operator, tuple(row)] \
+                                    for row in colors.tolist()]
+            first_body_line = 3
+        if body_lines is None:
+            lines[first_body_line::n_lines] = [format_['Do'](name) \
+                                               for _ in range(n_instances)]
+            commands[first_body_line::n_lines] = body_commands * n_instances
+        else:
+            for i, (line, command) in enumerate(zip(body_lines, \
+                                                    body_commands)):
+                lines[first_body_line + i::n_lines] = [line] * n_instances
+                commands[first_body_line + i::n_lines] = \
+                    [command] * n_instances
+        lines[n_lines - 1::n_lines] = [format_['Q']() \
+                                       for _ in range(n_instances)]
+        commands[n_lines - 1::n_lines] = [['Q', ()] \
+                                          for _ in range(n_instances)]
+        self.content.extend(lines)
+        self.commands.extend(commands)
+        self.last_point = None
+        if self.bbox_tracker is not None and form.BBox is not None:
+            self.bbox_tracker.updateInstances(form.BBox, form_tm)
+
+    def _extendContent(self, operators, values, counts):
+        # Formats many operations with numeric operands in one pass, adds them
+        # to content and returns the operands of each operation as a tuple
+        if not isinstance(self.content, _CompactContent):
+            self.content.extend(self._formatOperations(operators, values, \
+                                                       counts))
+        values = values.tolist()
+        ends = numpy.cumsum(counts).tolist()
+        return [tuple(values[start:end]) \
+                for start, end in zip([0] + ends[:-1], ends)]
+
+    def _formatOperations(self, operators, values, counts):
+        # Content lines of many operations, see _extendContent
+        return self.number_format.formatOperations(\
+            values, counts, operators).decode('latin-1').split('\n')
+
     def __repr__(self):
         return self.commands.__repr__()
 
     def __str__(self):
-        #return '\n'.join([' '.join([nums.strip('0') for nums in contentlet.split(' ')]) for contentlet in self.content])
-        #return_string = '\n'.join(self.content)
         return '\n'.join(self.content)
 
+    def __bytes__(self):
+        return str(self).encode('latin-1')
+
     def append_multiple_operations(self, operations):
         assert (type(operations) is list)
         for stream_command in operations:
@@ -325,6 +1079,12 @@ Circle: cx, cy, r'''
             if type(operation_parameters) is not list:
                 operation_parameters = [operation_parameters]
             if operation_type in custom_path_operator:  # ['Arc', 'ArcCenter', 'Ellipse', 'Circle']:
-                self.appendCustomPath(operation_type, *operation_parameters)
+                if any(isNumpyArray(parameter) \
+                       for parameter in operation_parameters):
+                    self.appendCustomPaths(operation_type, \
+                                           *operation_parameters)
+                else:
+                    self.appendCustomPath(operation_type, \
+                                          *operation_parameters)
             else:
                 self.append(operation_type, *operation_parameters)
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Font metrics, string widths, escaping, kerning and line breaking of text
+# runs for the text showing operators
+# From PDF 1.7 file format specification sections 5.3.2, 5.5.1 and 5.9 and
+# the Adobe Font Metrics (AFM) file format specification 4.1
+
+from collections import OrderedDict
+
+from ._lazy import numpy, pdfrw
+
+
+# Widths (in 1/1000 of the font size) of the codes from 32 (space) to 255 of
+# the standard 14 fonts, from their AFM files: in WinAnsiEncoding (see
+# standardFont), except Symbol and ZapfDingbats in their built-in encoding.
+# None for codes without a glyph.
+_helvetica_widths = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278,
+    278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584,
+    584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556,
+    833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278,
+    278, 278, 469, 556, 333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222,
+    500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500,
+    500, 334, 260, 334, 584, None, 556, None, 222, 556, 333, 1000, 556, 556,
+    333, 1000, 667, 333, 1000, None, 611, None, None, 222, 222, 333, 333, 350,
+    556, 1000, 333, 1000, 500, 333, 944, None, 500, 667, 278, 333, 556, 556,
+    556, 556, 260, 556, 333, 737, 370, 556, 584, 333, 737, 333, 400, 584, 333,
+    333, 333, 556, 537, 278, 333, 333, 365, 556, 834, 834, 834, 611, 667, 667,
+    667, 667, 667, 667, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278, 722,
+    722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556, 278, 278, 278,
+    278, 556, 556, 556, 556, 556, 556, 556, 584, 611, 556, 556, 556, 556, 500,
+    556, 500]
+_helvetica_bold_widths = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278,
+    278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584,
+    584, 611, 975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611,
+    833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333,
+    278, 333, 584, 556, 333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278,
+    556, 278, 889, 611, 611, 611, 611, 389, 556, 333, 611, 556, 778, 556, 556,
+    500, 389, 280, 389, 584, None, 556, None, 278, 556, 500, 1000, 556, 556,
+    333, 1000, 667, 333, 1000, None, 611, None, None, 278, 278, 500, 500, 350,
+    556, 1000, 333, 1000, 556, 333, 944, None, 500, 667, 278, 333, 556, 556,
+    556, 556, 280, 556, 333, 737, 370, 556, 584, 333, 737, 333, 400, 584, 333,
+    333, 333, 611, 556, 278, 333, 333, 365, 556, 834, 834, 834, 611, 722, 722,
+    722, 722, 722, 722, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278, 722,
+    722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 556, 556, 556, 556, 556, 278, 278, 278,
+    278, 611, 611, 611, 611, 611, 611, 611, 584, 611, 611, 611, 611, 611, 556,
+    611, 556]
+_times_roman_widths = [
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250,
+    278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564,
+    564, 444, 921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611,
+    889, 722, 722, 556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333,
+    278, 333, 469, 500, 333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278,
+    500, 278, 778, 500, 500, 500, 500, 333, 389, 278, 500, 500, 722, 500, 500,
+    444, 480, 200, 480, 541, None, 500, None, 333, 500, 444, 1000, 500, 500,
+    333, 1000, 556, 333, 889, None, 611, None, None, 333, 333, 444, 444, 350,
+    500, 1000, 333, 980, 389, 333, 722, None, 444, 722, 250, 333, 500, 500,
+    500, 500, 200, 500, 333, 760, 276, 500, 564, 333, 760, 333, 400, 564, 300,
+    300, 333, 500, 453, 250, 333, 300, 310, 500, 750, 750, 750, 444, 722, 722,
+    722, 722, 722, 722, 889, 667, 611, 611, 611, 611, 333, 333, 333, 333, 722,
+    722, 722, 722, 722, 722, 722, 564, 722, 722, 722, 722, 722, 722, 556, 500,
+    444, 444, 444, 444, 444, 444, 667, 444, 444, 444, 444, 444, 278, 278, 278,
+    278, 500, 500, 500, 500, 500, 500, 500, 564, 500, 500, 500, 500, 500, 500,
+    500, 500]
+_times_bold_widths = [
+    250, 333, 555, 500, 500, 1000, 833, 278, 333, 333, 500, 570, 250, 333, 250,
+    278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570,
+    570, 500, 930, 722, 667, 722, 722, 667, 611, 778, 778, 389, 500, 778, 667,
+    944, 722, 778, 611, 778, 722, 556, 667, 722, 722, 1000, 722, 722, 667, 333,
+    278, 333, 581, 500, 333, 500, 556, 444, 556, 444, 333, 500, 556, 278, 333,
+    556, 278, 833, 556, 500, 556, 556, 444, 389, 333, 556, 500, 722, 500, 500,
+    444, 394, 220, 394, 520, None, 500, None, 333, 500, 500, 1000, 500, 500,
+    333, 1000, 556, 333, 1000, None, 667, None, None, 333, 333, 500, 500, 350,
+    500, 1000, 333, 1000, 389, 333, 722, None, 444, 722, 250, 333, 500, 500,
+    500, 500, 220, 500, 333, 747, 300, 500, 570, 333, 747, 333, 400, 570, 300,
+    300, 333, 556, 540, 250, 333, 300, 330, 500, 750, 750, 750, 500, 722, 722,
+    722, 722, 722, 722, 1000, 722, 667, 667, 667, 667, 389, 389, 389, 389, 722,
+    722, 778, 778, 778, 778, 778, 570, 778, 722, 722, 722, 722, 722, 611, 556,
+    500, 500, 500, 500, 500, 500, 722, 444, 444, 444, 444, 444, 278, 278, 278,
+    278, 500, 556, 500, 500, 500, 500, 500, 570, 500, 556, 556, 556, 556, 500,
+    556, 500]
+_times_italic_widths = [
+    250, 333, 420, 500, 500, 833, 778, 214, 333, 333, 500, 675, 250, 333, 250,
+    278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 675, 675,
+    675, 500, 920, 611, 611, 667, 722, 611, 611, 722, 722, 333, 444, 667, 556,
+    833, 667, 722, 611, 722, 611, 500, 556, 722, 611, 833, 611, 556, 556, 389,
+    278, 389, 422, 500, 333, 500, 500, 444, 500, 444, 278, 500, 500, 278, 278,
+    444, 278, 722, 500, 500, 500, 500, 389, 389, 278, 500, 444, 667, 444, 444,
+    389, 400, 275, 400, 541, None, 500, None, 333, 500, 556, 889, 500, 500,
+    333, 1000, 500, 333, 944, None, 556, None, None, 333, 333, 556, 556, 350,
+    500, 889, 333, 980, 389, 333, 667, None, 389, 556, 250, 389, 500, 500, 500,
+    500, 275, 500, 333, 760, 276, 500, 675, 333, 760, 333, 400, 675, 300, 300,
+    333, 500, 523, 250, 333, 300, 310, 500, 750, 750, 750, 500, 611, 611, 611,
+    611, 611, 611, 889, 667, 611, 611, 611, 611, 333, 333, 333, 333, 722, 667,
+    722, 722, 722, 722, 722, 675, 722, 722, 722, 722, 722, 556, 611, 500, 500,
+    500, 500, 500, 500, 500, 667, 444, 444, 444, 444, 444, 278, 278, 278, 278,
+    500, 500, 500, 500, 500, 500, 500, 675, 500, 500, 500, 500, 500, 444, 500,
+    444]
+_times_bold_italic_widths = [
+    250, 389, 555, 500, 500, 833, 778, 278, 333, 333, 500, 570, 250, 333, 250,
+    278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570,
+    570, 500, 832, 667, 667, 667, 722, 667, 667, 722, 778, 389, 500, 667, 611,
+    889, 722, 722, 611, 722, 667, 556, 611, 722, 667, 889, 667, 611, 611, 333,
+    278, 333, 570, 500, 333, 500, 500, 444, 500, 444, 333, 500, 556, 278, 278,
+    500, 278, 778, 556, 500, 500, 500, 389, 389, 278, 556, 444, 667, 500, 444,
+    389, 348, 220, 348, 570, None, 500, None, 333, 500, 500, 1000, 500, 500,
+    333, 1000, 556, 333, 944, None, 611, None, None, 333, 333, 500, 500, 350,
+    500, 1000, 333, 1000, 389, 333, 722, None, 389, 611, 250, 389, 500, 500,
+    500, 500, 220, 500, 333, 747, 266, 500, 606, 333, 747, 333, 400, 570, 300,
+    300, 333, 576, 500, 250, 333, 300, 300, 500, 750, 750, 750, 500, 667, 667,
+    667, 667, 667, 667, 944, 667, 667, 667, 667, 667, 389, 389, 389, 389, 722,
+    722, 722, 722, 722, 722, 722, 570, 722, 722, 722, 722, 722, 611, 611, 500,
+    500, 500, 500, 500, 500, 500, 722, 444, 444, 444, 444, 444, 278, 278, 278,
+    278, 500, 556, 500, 500, 500, 500, 500, 570, 500, 556, 556, 556, 556, 444,
+    500, 444]
+_symbol_widths = [
+    250, 333, 713, 500, 549, 833, 778, 439, 333, 333, 500, 549, 250, 549, 250,
+    278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 549, 549,
+    549, 444, 549, 722, 667, 722, 612, 611, 763, 603, 722, 333, 631, 722, 686,
+    889, 722, 722, 768, 741, 556, 592, 611, 690, 439, 768, 645, 795, 611, 333,
+    863, 333, 658, 500, 500, 631, 549, 549, 494, 439, 521, 411, 603, 329, 603,
+    549, 549, 576, 521, 549, 549, 521, 549, 603, 439, 576, 713, 686, 493, 686,
+    494, 480, 200, 480, 549, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, None,
+    None, 750, 620, 247, 549, 167, 713, 500, 753, 753, 753, 753, 1042, 987,
+    603, 987, 603, 400, 549, 411, 549, 549, 713, 494, 460, 549, 549, 549, 549,
+    1000, 603, 1000, 658, 823, 686, 795, 987, 768, 768, 823, 768, 768, 713,
+    713, 713, 713, 713, 713, 713, 768, 713, 790, 790, 890, 823, 549, 250, 713,
+    603, 603, 1042, 987, 603, 987, 603, 494, 329, 790, 790, 786, 713, 384, 384,
+    384, 384, 384, 384, 494, 494, 494, 494, None, 329, 274, 686, 686, 686, 384,
+    384, 384, 384, 384, 384, 494, 494, 494, None]
+_zapf_dingbats_widths = [
+    278, 974, 961, 974, 980, 719, 789, 790, 791, 690, 960, 939, 549, 855, 911,
+    933, 911, 945, 974, 755, 846, 762, 761, 571, 677, 763, 760, 759, 754, 494,
+    552, 537, 577, 692, 786, 788, 788, 790, 793, 794, 816, 823, 789, 841, 823,
+    833, 816, 831, 923, 744, 723, 749, 790, 792, 695, 776, 768, 792, 759, 707,
+    708, 682, 701, 826, 815, 789, 789, 707, 687, 696, 689, 786, 787, 713, 791,
+    785, 791, 873, 761, 762, 762, 759, 759, 892, 892, 788, 784, 438, 138, 277,
+    415, 392, 392, 668, 668, None, 390, 390, 317, 317, 276, 276, 509, 509, 410,
+    410, 234, 234, 334, 334, None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, None, None, None, None, 732, 544,
+    544, 910, 667, 760, 760, 776, 595, 694, 626, 788, 788, 788, 788, 788, 788,
+    788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788,
+    788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788, 788,
+    788, 788, 788, 788, 894, 838, 1016, 458, 748, 924, 748, 918, 927, 928, 928,
+    834, 873, 828, 924, 924, 917, 930, 931, 463, 883, 836, 836, 867, 867, 696,
+    696, 874, None, 874, 760, 946, 771, 865, 771, 888, 967, 888, 831, 873, 927,
+    970, 918, None]
+# Codes not defined in WinAnsiEncoding
+_win_ansi_undefined = [0x7f, 0x81, 0x8d, 0x8f, 0x90, 0x9d]
+_courier_widths = [None if code in _win_ansi_undefined else 600 \
+                   for code in range(32, 256)]
+
+standard_font_widths = {
+    'Helvetica': _helvetica_widths,
+    'Helvetica-Oblique': _helvetica_widths,
+    'Helvetica-Bold': _helvetica_bold_widths,
+    'Helvetica-BoldOblique': _helvetica_bold_widths,
+    'Times-Roman': _times_roman_widths,
+    'Times-Italic': _times_italic_widths,
+    'Times-Bold': _times_bold_widths,
+    'Times-BoldItalic': _times_bold_italic_widths,
+    'Courier': _courier_widths,
+    'Courier-Bold': _courier_widths,
+    'Courier-Oblique': _courier_widths,
+    'Courier-BoldOblique': _courier_widths,
+    'Symbol': _symbol_widths,
+    'ZapfDingbats': _zapf_dingbats_widths,
+}
+# Standard 14 fonts with their own built-in encoding
+_symbolic_fonts = ['Symbol', 'ZapfDingbats']
+
+# The characters of WinAnsiEncoding (cp1252) that are not latin-1, e.g. the
+# euro sign, curly quotes and dashes, as their codes: text is taken as
+# latin-1 after this
+_win_ansi_codes = {bytes([code]).decode('cp1252'): chr(code) \
+                   for code in range(0x80, 0xa0) \
+                   if code not in _win_ansi_undefined}
+
+_win_ansi_table = str.maketrans(_win_ansi_codes)
+_escape_table = str.maketrans(dict({'\\': '\\\\', '(': '\\(', ')': '\\)', \
+                                    '\r': '\\r'}, **_win_ansi_codes))
+
+def escapeString(string_):
+    '''string_ escaped for a PDF literal string (without the parentheses), as
+for the operands of "Tj" and "TJ", with the characters of WinAnsiEncoding
+that are not latin-1 (e.g. the euro sign) as their codes'''
+    return string_.translate(_escape_table)
+
+def encodeText(string_):
+    '''string_ in WinAnsiEncoding (bytes), raising a ValueError for the
+characters it does not have'''
+    try:
+        return string_.translate(_win_ansi_table).encode('latin-1')
+    except UnicodeEncodeError as error:
+        raise ValueError('Not in WinAnsiEncoding: ' + \
+                         repr(string_[error.start:error.end])) from None
+
+def _codes(string_):
+    # Character codes of string_ in a simple font (one byte per character),
+    # in WinAnsiEncoding
+    return numpy.frombuffer(encodeText(string_), dtype=numpy.uint8)
+
+
+class FontMetrics:
+    '''Widths (in 1/1000 of the font size) and kerning of the 256 character
+codes of a simple font (one byte per character, text taken as
+WinAnsiEncoding).
+widths: {code: width} or a sequence of the widths of the codes from
+        first_code on; the other codes have missing_width
+kerning: {(code_1, code_2): adjustment}, added to the width of code_1 when
+         followed by code_2 (negative to bring them closer, as in AFM KPX)'''
+
+    def __init__(self, widths, kerning={}, first_code=0, missing_width=0):
+        self.widths = numpy.full(256, float(missing_width))
+        if isinstance(widths, dict):
+            for code, width in widths.items():
+                self.widths[code] = width
+        else:
+            self.widths[first_code:first_code + len(widths)] = widths
+        self.kerning = dict(kerning)
+        self.kerning_table = None
+        if len(self.kerning) > 0:
+            self.kerning_table = numpy.zeros((256, 256))
+            for (code_1, code_2), adjustment in self.kerning.items():
+                self.kerning_table[code_1, code_2] = adjustment
+
+    @classmethod
+    def fromFontDict(cls, font):
+        '''Metrics of a simple font from its FirstChar, Widths and MissingWidth
+(in its FontDescriptor), or of a standard 14 font without them'''
+        if font.Widths is not None:
+            missing_width = 0
+            if font.FontDescriptor is not None and \
+               font.FontDescriptor.MissingWidth is not None:
+                missing_width = float(font.FontDescriptor.MissingWidth)
+            return cls([float(width) for width in font.Widths], \
+                       first_code=int(font.FirstChar or 0), \
+                       missing_width=missing_width)
+        return cls.standardFont(str(font.BaseFont).lstrip('/'))
+
+    @classmethod
+    def standardFont(cls, base_font):
+        '''Metrics of one of standard_font_widths, without kerning'''
+        if base_font not in standard_font_widths:
+            raise ValueError('No metrics for the font: ' + str(base_font) + \
+                             ', use FontMetrics.fromAFM')
+        widths = {code: width for code, width in \
+                  zip(range(32, 256), standard_font_widths[base_font]) \
+                  if width is not None}
+        return cls(widths, missing_width=widths[ord('n')])
+
+    @classmethod
+    def fromAFM(cls, afm_text):
+        '''Metrics from the text of an AFM file: widths (WX) of the encoded
+characters and kerning pairs (KPX) between them, by their code in the AFM'''
+        widths, codes, kerning = {}, {}, {}
+        for line in afm_text.splitlines():
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            if fields[0] == 'C':
+                entries = dict(entry.split(None, 1) for entry in \
+                               line.split(';') if len(entry.split()) >= 2)
+                code = int(entries['C'])
+                if 0 <= code < 256 and 'WX' in entries:
+                    widths[code] = float(entries['WX'])
+                    if 'N' in entries:
+                        codes[entries['N'].strip()] = code
+            elif fields[0] == 'KPX' and len(fields) >= 4:
+                if fields[1] in codes and fields[2] in codes:
+                    kerning[(codes[fields[1]], codes[fields[2]])] = \
+                        float(fields[3])
+        return cls(widths, kerning)
+
+    def stringWidths(self, strings, size=1, kerning=True):
+        '''Widths of each of strings (an array) at font size, all at once'''
+        if len(strings) == 0:
+            return numpy.zeros(0)
+        lengths = numpy.array([len(string_) for string_ in strings])
+        codes = _codes(''.join(strings))
+        widths = self.widths[codes]
+        if kerning and self.kerning_table is not None and len(codes) > 1:
+            adjustments = self.kerning_table[codes[:-1], codes[1:]]
+            # No kerning across two strings
+            boundaries = numpy.cumsum(lengths)[:-1] - 1
+            adjustments[boundaries[(boundaries >= 0) & \
+                                   (boundaries < len(adjustments))]] = 0
+            widths[:-1] += adjustments
+        ends = numpy.cumsum(lengths)
+        totals = numpy.concatenate([[0], numpy.cumsum(widths)])
+        return (totals[ends] - totals[ends - lengths]) * size / 1000
+
+    def stringWidth(self, string_, size=1, kerning=True):
+        '''Width of string_ at font size'''
+        return float(self.stringWidths([string_], size, kerning)[0])
+
+    def kernedRun(self, string_):
+        '''Operand of "TJ" showing string_ with its kerning: escaped strings
+between the (non-zero) adjustments'''
+        if self.kerning_table is None or len(string_) < 2:
+            return [escapeString(string_)]
+        codes = _codes(string_)
+        adjustments = self.kerning_table[codes[:-1], codes[1:]]
+        splits = numpy.nonzero(adjustments)[0]
+        run = []
+        start = 0
+        for split, adjustment in zip(splits.tolist(), \
+                                     adjustments[splits].tolist()):
+            # TJ numbers move the next glyph back: the opposite of kerning
+            run += [escapeString(string_[start:split + 1]), -adjustment]
+            start = split + 1
+        run.append(escapeString(string_[start:]))
+        return run
+
+    def breakLines(self, text, size, width, kerning=True):
+        '''Lines of text (split at spaces, and at every newline) that are at
+most width wide at font size, filled greedily. A word wider than width is
+a line of its own.'''
+        lines = []
+        space_width = self.stringWidth(' ', size)
+        for paragraph in text.split('\n'):
+            words = paragraph.split(' ')
+            word_widths = self.stringWidths(words, size, kerning).tolist()
+            line = [words[0]]
+            line_width = word_widths[0]
+            for word, word_width in zip(words[1:], word_widths[1:]):
+                if line_width + space_width + word_width > width:
+                    lines.append(' '.join(line))
+                    line, line_width = [word], word_width
+                else:
+                    line.append(word)
+                    line_width += space_width + word_width
+            lines.append(' '.join(line))
+        return lines
+
+
+class FontMetricsCache:
+    '''FontMetrics of fonts (font dictionaries or standard 14 font names),
+made once and kept for the max_size most recently used fonts'''
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self._metrics = OrderedDict()
+
+    def get(self, font):
+        if isinstance(font, FontMetrics):
+            return font
+        # A font dictionary is kept with its metrics, so its id stays its own
+        key = font if isinstance(font, str) else id(font)
+        if key in self._metrics:
+            self._metrics.move_to_end(key)
+            return self._metrics[key][1]
+        if isinstance(font, str):
+            metrics = FontMetrics.standardFont(font)
+        else:
+            metrics = FontMetrics.fromFontDict(font)
+        self._metrics[key] = (font, metrics)
+        if len(self._metrics) > self.max_size:
+            self._metrics.popitem(last=False)
+        return metrics
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def clear(self):
+        self._metrics.clear()
+
+font_metrics_cache = FontMetricsCache()
+
+def fontMetrics(font):
+    '''FontMetrics of font (a font dictionary, a standard 14 font name or
+FontMetrics), from font_metrics_cache'''
+    return font_metrics_cache.get(font)
+
+_standard_fonts = {}
+
+def standardFont(base_font):
+    '''Font dictionary of the standard 14 font base_font (e.g. 'Helvetica'),
+with WinAnsiEncoding (Symbol and ZapfDingbats with their built-in encoding),
+the same object every time'''
+    if base_font not in _standard_fonts:
+        font = pdfrw.PdfDict(Type=pdfrw.PdfName('Font'), \
+                             Subtype=pdfrw.PdfName('Type1'), \
+                             BaseFont=pdfrw.PdfName(base_font))
+        if base_font not in _symbolic_fonts:
+            font.Encoding = pdfrw.PdfName('WinAnsiEncoding')
+        _standard_fonts[base_font] = font
+    return _standard_fonts[base_font]
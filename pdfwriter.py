@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Writing a document page by page, with the objects of each page written as
+# soon as it is added, so memory does not grow with the number of pages
+# From PDF 1.7 file format specification sections 3.4 and 3.6.2
+
+import asyncio
+import weakref
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from ._lazy import pdfrw
+
+from .pdfcompress import flateCompress
+
+
+_catalog_number = 1
+_pages_number = 2
+
+
+class PdfStreamingWriter:
+    '''Writes pages to file (a path or binary file object) as they are added
+with addPage: each page and the objects it uses are written right away, and
+only their offsets and the numbers of the pages are kept until close()
+writes the page tree, cross-reference table and trailer.
+Indirect objects (e.g. shared by PdfResourcePool or PdfFormRegistry) and
+objects with a stream are written once, the first time a page uses them,
+and known again only while they are alive elsewhere (they are not kept by
+the writer): memory does not grow with pages whose objects are dropped
+after addPage.
+compress_level: Flate compress the streams without a Filter when writing
+                them (the objects are not changed)
+info: document information dictionary (Title, Author, ...)
+With asyncio, addPageAsync and closeAsync write in a thread, in order,
+while the next pages are made: awaiting each one keeps at most one page
+waiting to be written.'''
+
+    def __init__(self, file, version='1.4', compress_level=None, info=None):
+        self._own_file = isinstance(file, str)
+        self.file = open(file, 'wb') if self._own_file else file
+        self.version = version
+        self.compress_level = compress_level
+        self.info = info
+        # Offsets of the objects by number (0 for the free object 0, and
+        # until written), 8 bytes per object
+        self.offsets = array('q', [0, 0, 0])
+        self.page_numbers = array('q')
+        self._position = 0
+        # {id: (number, weak reference)} of the objects written so far
+        self._written = {}
+        self._executor = None
+        self.closed = False
+        self._write('%PDF-' + version + '\n%\xe2\xe3\xcf\xd3\n')
+
+    def __len__(self):
+        return len(self.page_numbers)
+
+    def _write(self, string_):
+        data = string_.encode('latin-1')
+        self.file.write(data)
+        self._position += len(data)
+
+    def _newNumber(self):
+        self.offsets.append(0)
+        return len(self.offsets) - 1
+
+    def _forget(self, key):
+        return lambda _: self._written.pop(key, None)
+
+    def _reference(self, obj, to_write):
+        # "n 0 R" for an indirect object, numbered (and queued in to_write)
+        # the first time
+        key = id(obj)
+        written = self._written.get(key)
+        if written is not None:
+            return str(written[0]) + ' 0 R'
+        number = self._newNumber()
+        try:
+            # Forgotten when obj is, so its id can be another object's later
+            reference = weakref.ref(obj, self._forget(key))
+        except TypeError:
+            reference = obj
+        self._written[key] = (number, reference)
+        to_write[key] = (number, obj)
+        return str(number) + ' 0 R'
+
+    def _format(self, obj, to_write):
+        if isinstance(obj, pdfrw.PdfDict):
+            if obj.indirect or obj.stream is not None:
+                return self._reference(obj, to_write)
+            return self._formatDict(obj, to_write)
+        if isinstance(obj, dict):
+            return self._formatDict(pdfrw.PdfDict(obj), to_write)
+        if isinstance(obj, (list, tuple)):
+            return '[' + ' '.join([self._format(value, to_write) \
+                                   for value in obj]) + ']'
+        if getattr(obj, 'indirect', False) is True:
+            return self._reference(obj, to_write)
+        if obj is None:
+            return 'null'
+        if isinstance(obj, bool):
+            return 'true' if obj else 'false'
+        if hasattr(obj, 'indirect'):
+            # PdfName, PdfString, PdfObject
+            return str(getattr(obj, 'encoded', None) or obj)
+        return pdfrw.pdfwriter.user_fmt(obj)
+
+    def _formatDict(self, obj, to_write, replace={}):
+        # The stream is read first: a PdfXObjectForm makes it (and its
+        # Length) when it is read
+        stream = obj.stream
+        entries = dict(obj.iteritems())
+        entries.update(replace)
+        if stream is not None:
+            if self.compress_level is not None and obj.Filter is None:
+                stream = flateCompress(stream, self.compress_level)
+                entries[pdfrw.PdfName('Filter')] = \
+                    pdfrw.PdfName('FlateDecode')
+            entries[pdfrw.PdfName('Length')] = len(stream)
+        result = '<<' + ' '.join([str(key) + ' ' + \
+                                  self._format(value, to_write) \
+                                  for key, value in entries.items()]) + '>>'
+        if stream is not None:
+            result += '\nstream\n' + stream + '\nendstream'
+        return result
+
+    def _writeObject(self, number, body):
+        self.offsets[number] = self._position
+        self._write(str(number) + ' 0 obj\n' + body + '\nendobj\n')
+
+    def _writeObjects(self, to_write):
+        # Objects referenced while writing are queued in to_write too
+        written = set()
+        while len(written) < len(to_write):
+            for key, (number, obj) in list(to_write.items()):
+                if key not in written:
+                    written.add(key)
+                    self._writeObject(number, \
+                        self._formatDict(obj, to_write) \
+                        if isinstance(obj, pdfrw.PdfDict) else \
+                        self._format(obj, {}))
+
+    def addPage(self, page):
+        '''Write page (e.g. from newPdfPage or PdfStream.toPdfPage) and the
+objects it uses that are not written yet'''
+        if self.closed:
+            raise ValueError('The writer is already closed')
+        number = self._newNumber()
+        to_write = {}
+        # Parent is the page tree of this document, whatever it was before
+        body = self._formatDict(page, to_write, replace={
+            pdfrw.PdfName('Type'): pdfrw.PdfName('Page'),
+            pdfrw.PdfName('Parent'): pdfrw.PdfObject(str(_pages_number) + \
+                                                     ' 0 R')})
+        self._writeObject(number, body)
+        self._writeObjects(to_write)
+        self.page_numbers.append(number)
+
+    def close(self):
+        '''Write the page tree, cross-reference table and trailer, and close
+file if it was given as a path'''
+        if self.closed:
+            return
+        kids = ' '.join([str(number) + ' 0 R' for number in self.page_numbers])
+        self._writeObject(_pages_number, '<</Type /Pages /Count ' + \
+                          str(len(self.page_numbers)) + ' /Kids [' + kids + \
+                          ']>>')
+        self._writeObject(_catalog_number, '<</Type /Catalog /Pages ' + \
+                          str(_pages_number) + ' 0 R>>')
+        trailer = '/Root ' + str(_catalog_number) + ' 0 R'
+        if self.info is not None:
+            to_write = {}
+            trailer += ' /Info ' + self._reference(self.info, to_write)
+            self._writeObjects(to_write)
+        xref_offset = self._position
+        self._write('xref\n0 ' + str(len(self.offsets)) + \
+                    '\n0000000000 65535 f \n' + \
+                    ''.join(['{:010d} 00000 n \n'.format(offset) \
+                             for offset in self.offsets[1:]]))
+        self._write('trailer\n<</Size ' + str(len(self.offsets)) + ' ' + \
+                    trailer + '>>\nstartxref\n' + str(xref_offset) + \
+                    '\n%%EOF\n')
+        self.closed = True
+        self.file.flush()
+        if self._own_file:
+            self.file.close()
+        self._written.clear()
+
+    def _runAsync(self, function, *args):
+        # One thread, so pages are written in the order they are added
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1)
+        return asyncio.get_running_loop().run_in_executor(self._executor, \
+                                                          function, *args)
+
+    async def addPageAsync(self, page):
+        '''addPage in a thread: await it to overlap making the next page
+with writing this one'''
+        await self._runAsync(self.addPage, page)
+
+    async def closeAsync(self):
+        await self._runAsync(self.close)
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.closeAsync()
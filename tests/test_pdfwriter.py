@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Author: Umesh Mohan (moh@nume.sh)
+# Round trips of PdfStreamingWriter through pdfrw.PdfReader
+
+import asyncio
+import gc
+import io
+import re
+import zlib
+
+import pdfrw
+
+from ..pdfwriter import PdfStreamingWriter
+from ..pdfstream import PdfStream
+from ..pdf_special_dicts import PdfXObjectForm
+
+
+def _page(i, form=None):
+    stream = PdfStream()
+    stream.appendText('Page ' + str(i), 72, 72, 'Helvetica', 12)
+    if form is not None:
+        stream.appendInstances(form, 100, 100, inline=False)
+    return stream.toPdfPage()
+
+def _write(pages, **kwargs):
+    output = io.BytesIO()
+    with PdfStreamingWriter(output, **kwargs) as writer:
+        for page in pages:
+            writer.addPage(page)
+    return output.getvalue()
+
+def _checkXref(data):
+    # Every offset of the cross-reference table is that of its object
+    xref_offset = int(re.search(br'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[xref_offset:xref_offset + 5] == b'xref\n'
+    lines = data[xref_offset:].split(b'\n')
+    n_objects = int(lines[1].split()[1])
+    entries = lines[2:2 + n_objects]
+    assert entries[0] == b'0000000000 65535 f '
+    for number, entry in enumerate(entries[1:], 1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(str(number).encode() + b' 0 obj\n')
+    return n_objects
+
+def test_round_trip_xref_offsets():
+    data = _write([_page(i) for i in range(3)])
+    n_objects = _checkXref(data)
+    reader = pdfrw.PdfReader(fdata=data)
+    assert len(reader.pages) == 3
+    assert int(reader.Size) == n_objects
+    for i, page in enumerate(reader.pages):
+        assert '(Page ' + str(i) + ') Tj' in page.Contents.stream
+
+def test_shared_objects_written_once():
+    form = PdfXObjectForm(b_box=[0, 0, 10, 10], \
+                          stream_commands=[('re', [0, 0, 10, 10]), 'f'])
+    data = _write([_page(i, form) for i in range(3)])
+    _checkXref(data)
+    # The font of appendText (one object for all pages) and the form
+    assert data.count(b'/BaseFont /Helvetica') == 1
+    assert data.count(b'/Subtype /Form') == 1
+    reader = pdfrw.PdfReader(fdata=data)
+    fonts = [page.Resources.Font.F1 for page in reader.pages]
+    forms = [page.Resources.XObject.X1 for page in reader.pages]
+    assert all(font is fonts[0] for font in fonts)
+    assert all(form_ is forms[0] for form_ in forms)
+    assert forms[0].stream.strip() == '0.0000 0.0000 10.0000 10.0000 re\nf'
+
+def test_dropped_objects_are_forgotten():
+    output = io.BytesIO()
+    writer = PdfStreamingWriter(output)
+    form = PdfXObjectForm(b_box=[0, 0, 1, 1], stream_commands=['q', 'Q'])
+    writer.addPage(_page(0, form))
+    n_objects = len(writer.offsets)
+    writer.addPage(_page(1, form))
+    # Known while alive: only the page and its content are new
+    assert id(form) in writer._written
+    assert len(writer.offsets) == n_objects + 2
+    form_id = id(form)
+    del form
+    gc.collect()
+    assert form_id not in writer._written
+    writer.close()
+    data = output.getvalue()
+    _checkXref(data)
+    assert data.count(b'/Subtype /Form') == 1
+
+def test_compress_level():
+    page = _page(0)
+    content = page.Contents.stream
+    data = _write([page], compress_level=6)
+    _checkXref(data)
+    # The objects themselves are not changed
+    assert page.Contents.stream == content and page.Contents.Filter is None
+    contents = pdfrw.PdfReader(fdata=data).pages[0].Contents
+    assert contents.Filter == '/FlateDecode'
+    assert zlib.decompress(contents.stream.encode('latin-1')) \
+           .decode('latin-1') == content
+
+def test_add_page_async_order():
+    output = io.BytesIO()
+
+    async def write():
+        async with PdfStreamingWriter(output) as writer:
+            for i in range(5):
+                await writer.addPageAsync(_page(i))
+
+    asyncio.run(write())
+    data = output.getvalue()
+    _checkXref(data)
+    reader = pdfrw.PdfReader(fdata=data)
+    assert ['(Page ' + str(i) + ') Tj' in page.Contents.stream \
+            for i, page in enumerate(reader.pages)] == [True] * 5